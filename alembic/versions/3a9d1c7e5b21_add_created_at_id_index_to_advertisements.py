@@ -0,0 +1,30 @@
+"""add (created_at, id) index to advertisements
+
+Revision ID: 3a9d1c7e5b21
+Revises: ec6b78ddb33f
+Create Date: 2026-10-18 10:02:11.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a9d1c7e5b21'
+down_revision: Union[str, None] = 'ec6b78ddb33f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Курсор пагинации строится из created_at: строки без даты считаем самыми старыми
+    op.execute("UPDATE advertisements SET created_at = '1970-01-01' WHERE created_at IS NULL")
+    op.alter_column('advertisements', 'created_at', existing_type=sa.DateTime(), nullable=False)
+    op.create_index('ix_advertisements_created_at_id', 'advertisements', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_advertisements_created_at_id', table_name='advertisements')
+    op.alter_column('advertisements', 'created_at', existing_type=sa.DateTime(), nullable=True)
@@ -0,0 +1,46 @@
+"""add full-text search to advertisements
+
+Revision ID: 7c4e2f9a8d13
+Revises: 3a9d1c7e5b21
+Create Date: 2026-10-18 11:20:47.902113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c4e2f9a8d13'
+down_revision: Union[str, None] = '3a9d1c7e5b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # Конфигурация 'russian' должна совпадать с TS_CONFIG в app/search.py
+    op.add_column('advertisements', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('russian', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+    ))
+    op.create_index('ix_advertisements_search_vector', 'advertisements', ['search_vector'],
+                    unique=False, postgresql_using='gin')
+    op.create_index('ix_advertisements_title_trgm', 'advertisements', ['title'],
+                    unique=False, postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+    op.create_index('ix_advertisements_description_trgm', 'advertisements', ['description'],
+                    unique=False, postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_advertisements_description_trgm', table_name='advertisements')
+    op.drop_index('ix_advertisements_title_trgm', table_name='advertisements')
+    op.drop_index('ix_advertisements_search_vector', table_name='advertisements')
+    op.drop_column('advertisements', 'search_vector')
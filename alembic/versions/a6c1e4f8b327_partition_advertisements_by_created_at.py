@@ -0,0 +1,131 @@
+"""partition advertisements by created_at
+
+Revision ID: a6c1e4f8b327
+Revises: f3a8d2e6b190
+Create Date: 2026-10-18 19:52:37.118406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c1e4f8b327'
+down_revision: Union[str, None] = 'f3a8d2e6b190'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Все индексы advertisements на момент миграции: (имя, колонки, параметры create_index)
+INDEXES = (
+    ('ix_advertisements_id', ['id'], {}),
+    ('ix_advertisements_title', ['title'], {}),
+    ('ix_advertisements_created_at_id', ['created_at', 'id'], {}),
+    ('ix_advertisements_owner_id_created_at_id', ['owner_id', 'created_at', 'id'], {}),
+    ('ix_advertisements_category_price', ['category', 'price'], {}),
+    ('ix_advertisements_category_location_price', ['category', 'location', 'price'], {}),
+    ('ix_advertisements_location_price', ['location', 'price'], {}),
+    ('ix_advertisements_type_category', ['type', 'category'], {}),
+    ('ix_advertisements_search_vector', ['search_vector'], {'postgresql_using': 'gin'}),
+    ('ix_advertisements_title_trgm', ['title'],
+     {'postgresql_using': 'gin', 'postgresql_ops': {'title': 'gin_trgm_ops'}}),
+    ('ix_advertisements_description_trgm', ['description'],
+     {'postgresql_using': 'gin', 'postgresql_ops': {'description': 'gin_trgm_ops'}}),
+)
+# Колонки без генерируемой search_vector - для переноса строк
+COLUMNS = "id, title, description, owner_id, type, category, price, price_raw, location, created_at, updated_at"
+# Партиции на месяцы вперед; дальше их создает python -m app.partitions
+MONTHS_AHEAD = 3
+# Настройка сессии с границей партиции legacy
+BOUNDARY_SETTING = 'migration.advertisements_partition_boundary'
+
+
+def _create_indexes() -> None:
+    for name, columns, options in INDEXES:
+        op.create_index(name, 'advertisements', columns, unique=False, **options)
+
+
+def upgrade() -> None:
+    # Все существующие строки остаются в одной партиции advertisements_legacy без копирования:
+    # таблица подключается к новой секционированной как партиция [MINVALUE, граница). Граница
+    # считается в SQL и хранится в настройке сессии - так миграция работает и в режиме --sql
+    op.execute(
+        f"SELECT set_config('{BOUNDARY_SETTING}', ("
+        "SELECT (date_trunc('month', greatest(localtimestamp, coalesce(max(created_at), localtimestamp))) "
+        "+ interval '1 month')::text FROM advertisements), false)"
+    )
+
+    # Долгие шаги - без блокировки записи, каждый в своей транзакции: уникальный индекс (id, created_at)
+    # под будущий первичный ключ партиции строится CONCURRENTLY, CHECK с границей добавляется NOT VALID
+    # и проверяется отдельно (VALIDATE не мешает записи). created_at уже NOT NULL (3a9d1c7e5b21),
+    # а проверенный CHECK избавляет ATTACH PARTITION от полного сканирования
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS advertisements_id_created_at_key "
+            "ON advertisements (id, created_at)"
+        )
+        op.execute("ALTER TABLE advertisements DROP CONSTRAINT IF EXISTS advertisements_legacy_range")
+        op.execute(
+            "DO $$ BEGIN EXECUTE format("
+            "'ALTER TABLE advertisements ADD CONSTRAINT advertisements_legacy_range "
+            "CHECK (created_at IS NOT NULL AND created_at < %L) NOT VALID', "
+            f"current_setting('{BOUNDARY_SETTING}')); END $$"
+        )
+        op.execute("ALTER TABLE advertisements VALIDATE CONSTRAINT advertisements_legacy_range")
+
+    # Дальше - только переименования и подключения без перестроения данных
+    op.rename_table('advertisements', 'advertisements_legacy')
+    op.execute("ALTER TABLE advertisements_legacy RENAME CONSTRAINT advertisements_pkey TO advertisements_legacy_pkey")
+    for name, _, _ in INDEXES:
+        op.execute(f"ALTER INDEX {name} RENAME TO {name}_legacy")
+    # Ключ партиции должен совпадать с ключом родителя (id, created_at): ATTACH подключает его
+    # к родительскому, а ключ по одному id дал бы второй первичный ключ. Индекс уже построен
+    op.execute(
+        "ALTER TABLE advertisements_legacy DROP CONSTRAINT advertisements_legacy_pkey, "
+        "ADD CONSTRAINT advertisements_legacy_pkey PRIMARY KEY USING INDEX advertisements_id_created_at_key"
+    )
+
+    op.execute(
+        "CREATE TABLE advertisements (LIKE advertisements_legacy INCLUDING DEFAULTS INCLUDING GENERATED "
+        "INCLUDING STORAGE) PARTITION BY RANGE (created_at)"
+    )
+    # Уникальность в секционированной таблице только с ключом секционирования; id по-прежнему из одной последовательности
+    op.create_primary_key('advertisements_pkey', 'advertisements', ['id', 'created_at'])
+    _create_indexes()
+    # Иначе последовательность id удалится вместе с партицией legacy
+    op.execute("ALTER SEQUENCE advertisements_id_seq OWNED BY advertisements.id")
+
+    # Совпадающие индексы и внешний ключ legacy подключаются к родительским, а не строятся заново;
+    # за границей - партиции на MONTHS_AHEAD месяцев вперед
+    op.execute(
+        "DO $$ DECLARE "
+        f"boundary timestamp := current_setting('{BOUNDARY_SETTING}')::timestamp; "
+        "month_start timestamp := boundary; "
+        "BEGIN "
+        "EXECUTE format('ALTER TABLE advertisements ATTACH PARTITION advertisements_legacy "
+        "FOR VALUES FROM (MINVALUE) TO (%L)', boundary); "
+        f"FOR i IN 1..{MONTHS_AHEAD} LOOP "
+        "EXECUTE format('CREATE TABLE %I PARTITION OF advertisements FOR VALUES FROM (%L) TO (%L)', "
+        "'advertisements_p' || to_char(month_start, 'YYYY_MM'), month_start, month_start + interval '1 month'); "
+        "month_start := month_start + interval '1 month'; "
+        "END LOOP; "
+        "END $$"
+    )
+    op.create_foreign_key('fk_advertisements_owner_id_users', 'advertisements', 'users', ['owner_id'], ['id'])
+    # Страховка на случай, если обслуживание не создало партицию вовремя
+    op.execute("CREATE TABLE advertisements_default PARTITION OF advertisements DEFAULT")
+
+
+def downgrade() -> None:
+    # Обратно - обычная таблица; строки копируются из всех партиций
+    op.execute(
+        "CREATE TABLE advertisements_plain (LIKE advertisements INCLUDING DEFAULTS INCLUDING GENERATED "
+        "INCLUDING STORAGE)"
+    )
+    op.execute(f"INSERT INTO advertisements_plain ({COLUMNS}) SELECT {COLUMNS} FROM advertisements")
+    op.execute("ALTER SEQUENCE advertisements_id_seq OWNED BY advertisements_plain.id")
+    op.drop_table('advertisements')
+    op.rename_table('advertisements_plain', 'advertisements')
+    op.create_primary_key('advertisements_pkey', 'advertisements', ['id'])
+    _create_indexes()
+    op.create_foreign_key('fk_advertisements_owner_id_users', 'advertisements', 'users', ['owner_id'], ['id'])
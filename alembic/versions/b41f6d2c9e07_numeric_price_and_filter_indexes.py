@@ -0,0 +1,97 @@
+"""numeric price and filter indexes on advertisements
+
+Revision ID: b41f6d2c9e07
+Revises: 7c4e2f9a8d13
+Create Date: 2026-10-18 13:05:32.614720
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41f6d2c9e07'
+down_revision: Union[str, None] = '7c4e2f9a8d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+# Разбор цены: пробелы и разделители тысяч ("1 000", "1.000,50", "1,000.50"), валюта ("руб", "р.", "₽").
+# Что не разобралось ("договорная"), дает NULL. Функция во временной схеме - живет до конца сессии
+PARSE_PRICE = r"""
+CREATE FUNCTION pg_temp.parse_price(raw text) RETURNS numeric(12, 2) LANGUAGE plpgsql IMMUTABLE AS $$
+DECLARE
+    value text := regexp_replace(lower(raw), '(руб(лей|ля|ль)?|rub|р|₽)\.?', '', 'g');
+BEGIN
+    value := regexp_replace(value, '[\s\u00a0\u202f'']', '', 'g');
+    IF value ~ '^[0-9]{1,3}(\.[0-9]{3})+(,[0-9]{1,2})?$' THEN
+        value := replace(replace(value, '.', ''), ',', '.');
+    ELSIF value ~ '^[0-9]{1,3}(,[0-9]{3})+(\.[0-9]{1,2})?$' THEN
+        value := replace(value, ',', '');
+    ELSIF value ~ '^[0-9]+([.,][0-9]{1,2})?$' THEN
+        value := replace(value, ',', '.');
+    ELSE
+        RETURN NULL;
+    END IF;
+    -- numeric(12, 2): не больше 10 цифр до точки
+    IF length(split_part(value, '.', 1)) > 10 THEN
+        RETURN NULL;
+    END IF;
+    RETURN value::numeric(12, 2);
+END
+$$
+"""
+UNPARSED = "SELECT count(*) FROM advertisements WHERE price_raw IS NOT NULL"
+
+
+def upgrade() -> None:
+    # Неразобранная строка цены остается в price_raw: ее можно разобрать вручную, downgrade вернет ее в price
+    op.add_column('advertisements', sa.Column('price_raw', sa.String(), nullable=True))
+    op.execute(PARSE_PRICE)
+    op.execute(
+        "UPDATE advertisements SET price_raw = price "
+        "WHERE btrim(price) <> '' AND pg_temp.parse_price(price) IS NULL"
+    )
+    op.alter_column(
+        'advertisements', 'price',
+        existing_type=sa.String(),
+        type_=sa.Numeric(12, 2),
+        existing_nullable=True,
+        postgresql_using="pg_temp.parse_price(price)",
+    )
+    op.execute("DROP FUNCTION pg_temp.parse_price(text)")
+    if context.is_offline_mode():
+        op.execute(
+            f"DO $$ DECLARE unparsed bigint; BEGIN {UNPARSED} INTO unparsed; "
+            "IF unparsed > 0 THEN RAISE WARNING '% prices are not numbers, kept in advertisements.price_raw', "
+            "unparsed; END IF; END $$"
+        )
+    else:
+        unparsed = op.get_bind().scalar(sa.text(UNPARSED))
+        if unparsed:
+            logger.warning("%d prices are not numbers, kept in advertisements.price_raw", unparsed)
+    op.create_index('ix_advertisements_category_price', 'advertisements', ['category', 'price'], unique=False)
+    op.create_index('ix_advertisements_category_location_price', 'advertisements',
+                    ['category', 'location', 'price'], unique=False)
+    op.create_index('ix_advertisements_location_price', 'advertisements', ['location', 'price'], unique=False)
+    op.create_index('ix_advertisements_type_category', 'advertisements', ['type', 'category'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_advertisements_type_category', table_name='advertisements')
+    op.drop_index('ix_advertisements_location_price', table_name='advertisements')
+    op.drop_index('ix_advertisements_category_location_price', table_name='advertisements')
+    op.drop_index('ix_advertisements_category_price', table_name='advertisements')
+    op.alter_column(
+        'advertisements', 'price',
+        existing_type=sa.Numeric(12, 2),
+        type_=sa.String(),
+        existing_nullable=True,
+        postgresql_using='coalesce(price::text, price_raw)',
+    )
+    op.drop_column('advertisements', 'price_raw')
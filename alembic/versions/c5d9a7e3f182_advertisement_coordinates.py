@@ -0,0 +1,35 @@
+"""advertisements.latitude/longitude for the gazetteer
+
+Revision ID: c5d9a7e3f182
+Revises: a6c1e4f8b327
+Create Date: 2026-10-18 21:07:44.530912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d9a7e3f182'
+down_revision: Union[str, None] = 'a6c1e4f8b327'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('advertisements', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('advertisements', sa.Column('longitude', sa.Float(), nullable=True))
+
+    # Координаты существующих строк заполняет python -m app.backfill_coordinates: миграция не зависит
+    # от справочника населенных пунктов и GAZETTEER_PATH
+
+    # Индекс на секционированной таблице создается и на всех партициях
+    op.create_index('ix_advertisements_latitude_longitude', 'advertisements', ['latitude', 'longitude'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_advertisements_latitude_longitude', table_name='advertisements')
+    op.drop_column('advertisements', 'longitude')
+    op.drop_column('advertisements', 'latitude')
@@ -0,0 +1,47 @@
+"""owner foreign key, owner feed index and users.advertisement_count
+
+Revision ID: d8e3a5f1c264
+Revises: b41f6d2c9e07
+Create Date: 2026-10-18 15:42:08.203117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8e3a5f1c264'
+down_revision: Union[str, None] = 'b41f6d2c9e07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Обьявления несуществующих пользователей остаются, но без владельца - иначе FK не создать
+    op.execute(
+        "UPDATE advertisements SET owner_id = NULL "
+        "WHERE owner_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM users WHERE users.id = advertisements.owner_id)"
+    )
+    # NOT VALID + VALIDATE: проверка существующих строк не блокирует запись в таблицу
+    op.create_foreign_key(
+        'fk_advertisements_owner_id_users', 'advertisements', 'users', ['owner_id'], ['id'],
+        postgresql_not_valid=True,
+    )
+    op.execute("ALTER TABLE advertisements VALIDATE CONSTRAINT fk_advertisements_owner_id_users")
+    op.create_index('ix_advertisements_owner_id_created_at_id', 'advertisements',
+                    ['owner_id', 'created_at', 'id'], unique=False)
+
+    op.add_column('users', sa.Column('advertisement_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE users SET advertisement_count = counts.total "
+        "FROM (SELECT owner_id, count(*) AS total FROM advertisements GROUP BY owner_id) AS counts "
+        "WHERE counts.owner_id = users.id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'advertisement_count')
+    op.drop_index('ix_advertisements_owner_id_created_at_id', table_name='advertisements')
+    op.drop_constraint('fk_advertisements_owner_id_users', 'advertisements', type_='foreignkey')
@@ -0,0 +1,45 @@
+"""advertisement_stats aggregate table
+
+Revision ID: e2b7c9d4a615
+Revises: d8e3a5f1c264
+Create Date: 2026-10-18 17:21:46.380512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b7c9d4a615'
+down_revision: Union[str, None] = 'd8e3a5f1c264'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'advertisement_stats',
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('type', sa.String(), nullable=False),
+        sa.Column('location', sa.String(), nullable=False),
+        sa.Column('count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('price_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('price_sum', sa.Numeric(20, 2), server_default='0', nullable=False),
+        sa.Column('price_min', sa.Numeric(12, 2), nullable=True),
+        sa.Column('price_max', sa.Numeric(12, 2), nullable=True),
+        sa.PrimaryKeyConstraint('category', 'type', 'location'),
+    )
+    op.execute(
+        "INSERT INTO advertisement_stats "
+        "(category, type, location, count, price_count, price_sum, price_min, price_max) "
+        "SELECT coalesce(category, ''), coalesce(type, ''), coalesce(location, ''), "
+        "count(*), count(price), coalesce(sum(price), 0), min(price), max(price) "
+        "FROM advertisements "
+        "GROUP BY coalesce(category, ''), coalesce(type, ''), coalesce(location, '')"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('advertisement_stats')
@@ -0,0 +1,28 @@
+"""advertisements.updated_at
+
+Revision ID: f3a8d2e6b190
+Revises: e2b7c9d4a615
+Create Date: 2026-10-18 18:34:12.905143
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a8d2e6b190'
+down_revision: Union[str, None] = 'e2b7c9d4a615'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('advertisements', sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True))
+    # Старые строки не менялись с момента создания
+    op.execute("UPDATE advertisements SET updated_at = created_at WHERE created_at IS NOT NULL")
+
+
+def downgrade() -> None:
+    op.drop_column('advertisements', 'updated_at')
@@ -0,0 +1,200 @@
+# admission.py
+import json
+import threading
+import time
+from typing import Dict, Optional
+
+from config import settings
+from .metrics import registry
+
+ROUTE_CLASSES = ("auth", "reads", "writes", "search")
+# Маршруты вне классов (документация, /metrics, выгрузка) не ограничиваются:
+# выгрузка и лента событий держат соединение минутами, и их задержка ничего не говорит о нагрузке
+_UNLIMITED_PREFIXES = (
+    "/docs", "/api/v1/openapi.json", "/metrics", "/advertisements/export/", "/advertisements/events/",
+)
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    if path.startswith(_UNLIMITED_PREFIXES):
+        return None
+    if path in ("/sign-in", "/sign-up"):
+        return "auth"
+    if path.startswith(("/advertisements/search/", "/advertisements/nearby/")):
+        return "search"
+    if method in ("GET", "HEAD"):
+        return "reads"
+    return "writes"
+
+
+# Сглаживание задержки: короткая EWMA - последние десятки запросов, длинная - последние сотни
+SHORT_ALPHA = 0.1
+LONG_ALPHA = 0.002
+WARMUP_SAMPLES = 50
+
+
+# Общий бюджет классов: пределы классов адаптивные и в сумме могут превышать пул, а одновременно
+# в работе запросов не больше, чем соединений. Один нагруженный класс может занять весь бюджет
+class SharedBudget:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+
+class AdaptiveLimiter:
+    # AIMD по градиенту задержки: короткая средняя сравнивается с длинной (в одном классе
+    # смешаны попадания в кэш и запросы к БД, поэтому абсолютный минимум не годится).
+    # Пока короткая не превышает длинную в tolerance раз и предел выбран, он растет на 1
+    # за "окно" из limit запросов; при перегрузке или 5xx умножается на backoff, не чаще
+    # раза за окно. Лишние запросы отклоняются сразу, не вставая в очередь за пулом
+    def __init__(self, name: str, initial: float, min_limit: float, max_limit: float,
+                 tolerance: float = 2.0, backoff: float = 0.9, budget: Optional[SharedBudget] = None):
+        self.name = name
+        self.budget = budget
+        self.limit = float(initial)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.in_flight = 0
+        self.rejected = 0
+        self.samples = 0
+        self.short_latency: Optional[float] = None
+        self.long_latency: Optional[float] = None
+        self._since_decrease = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.in_flight >= int(self.limit) or (self.budget is not None and not self.budget.try_acquire()):
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency: float, failed: bool = False) -> None:
+        with self._lock:
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            if self.budget is not None:
+                self.budget.release()
+            self.samples += 1
+            self._since_decrease += 1
+            if self.short_latency is None:
+                self.short_latency = self.long_latency = latency
+            else:
+                self.short_latency += (latency - self.short_latency) * SHORT_ALPHA
+                self.long_latency += (latency - self.long_latency) * LONG_ALPHA
+            congested = failed or (
+                self.samples >= WARMUP_SAMPLES and self.short_latency > self.long_latency * self.tolerance
+            )
+            if congested:
+                if self._since_decrease >= self.limit:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._since_decrease = 0
+            elif saturated:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+
+class AdmissionController:
+    def __init__(self, enabled: bool, initial: float, min_limit: float, max_limit: float, tolerance: float,
+                 total_limit: int = 0):
+        self.enabled = enabled
+        self.budget = SharedBudget(total_limit) if total_limit else None
+        self.limiters: Dict[str, AdaptiveLimiter] = {
+            name: AdaptiveLimiter(name, initial, min_limit, max_limit, tolerance, budget=self.budget)
+            for name in ROUTE_CLASSES
+        }
+
+    def limiter_for(self, method: str, path: str) -> Optional[AdaptiveLimiter]:
+        if not self.enabled:
+            return None
+        route_class = classify(method, path)
+        return self.limiters[route_class] if route_class is not None else None
+
+    def stats(self) -> dict:
+        return {
+            name: {"limit": limiter.limit, "in_flight": limiter.in_flight, "rejected": limiter.rejected}
+            for name, limiter in self.limiters.items()
+        }
+
+
+admission = AdmissionController(
+    enabled=settings.ADMISSION_ENABLED,
+    initial=settings.ADMISSION_INITIAL_LIMIT,
+    min_limit=settings.ADMISSION_MIN_LIMIT,
+    max_limit=settings.ADMISSION_MAX_LIMIT,
+    tolerance=settings.ADMISSION_LATENCY_TOLERANCE,
+    total_limit=settings.ADMISSION_TOTAL_LIMIT,
+)
+
+registry.gauge("admission_limit", "Текущий предел одновременных запросов класса",
+               lambda: {(name,): limiter.limit for name, limiter in admission.limiters.items()}, ("route_class",))
+registry.gauge("admission_in_flight", "Запросы класса в обработке",
+               lambda: {(name,): limiter.in_flight for name, limiter in admission.limiters.items()}, ("route_class",))
+registry.gauge("admission_budget_in_flight", "Запросы всех классов в обработке (общий предел ADMISSION_TOTAL_LIMIT)",
+               lambda: admission.budget.in_flight if admission.budget is not None else 0)
+registry.counter("admission_rejected_total", "Запросы, отклоненные с 503 сверх предела",
+                 lambda: {(name,): limiter.rejected for name, limiter in admission.limiters.items()}, ("route_class",))
+
+_OVERLOADED_BODY = json.dumps({"detail": "Сервис перегружен, повторите попытку позже"}, ensure_ascii=False).encode()
+
+
+class AdmissionMiddleware:
+    # Задержка - время до начала ответа (http.response.start): для обычных маршрутов это
+    # ожидание пула и запросы к БД; запрос занимает место в пределе до конца отдачи тела
+    def __init__(self, app, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        limiter = None
+        if scope["type"] == "http":
+            limiter = self.controller.limiter_for(scope["method"], scope["path"])
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+        if not limiter.try_acquire():
+            await self._reject(send)
+            return
+
+        started = time.perf_counter()
+        latency: Optional[float] = None
+        failed = True
+
+        async def timed_send(message):
+            nonlocal latency, failed
+            if message["type"] == "http.response.start":
+                latency = time.perf_counter() - started
+                failed = message["status"] >= 500
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            limiter.release(latency if latency is not None else time.perf_counter() - started, failed)
+
+    @staticmethod
+    async def _reject(send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(_OVERLOADED_BODY)).encode()),
+                (b"retry-after", b"1"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": _OVERLOADED_BODY})
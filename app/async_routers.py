@@ -0,0 +1,270 @@
+# async_routers.py
+# Асинхронные версии маршрутов из routers.py: AsyncSession на asyncpg вместо потока из пула на каждый запрос
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import OAuth2PasswordRequestForm
+from datetime import timedelta
+from decimal import Decimal
+from typing import List, Literal, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db, get_async_primary_read_db, get_async_read_db
+from models.models import User, Advertisement
+from .schemas import AdvertisementFilterPage, AdvertisementNearbyPage, AdvertisementOut, AdvertisementStatsGroup, Principal, UserBase, UserCreate, UserOut, Token, AdvertisementBase
+from .auth import ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token, get_current_user_async
+from .filters import SORTS, AdvertisementFilters, build_facets_statement, build_items_statement, facets_from_rows, paginate
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, apply_filters, apply_keyset, encode_cursor
+from .serialization import ADVERTISEMENT_COLUMNS, advertisement_to_dict, rows_to_dicts, user_to_dict
+from .streaming import stream_ndjson_async
+from .search import search_backend
+from .geo import MAX_DISTANCE_KM, nearby_page, resolve_point
+from .hooks import notify_advertisement_change
+from .read_cache import advertisement_key, fill_session, read_cache, user_advertisements_key, user_key
+from .hashing import password_hasher
+from .instrumentation import InstrumentedRoute
+from .owner_feed import build_owner_feed_statement, owner_feed_headers, owner_feed_page
+from .stats import STAT_DIMENSIONS, build_stats_statement, stats_from_rows
+from .compression import index_page
+from .conditional import advertisements_etag, conditional_json, last_modified
+from .write_batcher import WriteOperation, run_write_async
+
+# Инициализация нового экземпляра APIRouter
+router = APIRouter(route_class=InstrumentedRoute)
+
+
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await db.scalar(select(User).where(User.username == username))
+    if not user:
+        return False
+    valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
+        return False
+    # Стоимость хэширования изменилась - перехэшируем пароль при успешном входе
+    if new_hash is not None:
+        user.hashed_password = new_hash
+        await db.commit()
+    return user
+
+#РЕГИСТРАЦИЯ ПОЛЬЗОВАТЕЛЯ
+@router.post("/sign-up", response_model=UserBase)
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    hashed_password = await password_hasher.hash(user.password)
+    db_user = User(username=user.username, hashed_password=hashed_password, email=user.email)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+#АВТОРИЗАЦИЯ .. ВОЗВРАЩАЕТ ТОКЕН
+@router.post("/sign-in", response_model=Token)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(db, form_data.username, form_data.password)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Неверное имя или пароль",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": user.username}, expires_delta=access_token_expires
+    )
+    return {"access_token": access_token, "token_type": "bearer"}
+
+
+#ДОБАВИТЬ ОБЬЯВЛЕНИЕ .. ТРЕБУЕТСЯ ТОКЕН
+@router.post("/advertisements/", response_model=AdvertisementBase)
+async def create_advertisement(
+    advertisement: AdvertisementBase,
+    current_user: Principal = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    result = await run_write_async(db, WriteOperation("created", current_user.id, values=advertisement.model_dump()))
+    notify_advertisement_change(result.action, result.current, result.previous)
+    return result.current
+
+#HOME PAGE .. ИЗ ПАМЯТИ, УЖЕ СЖАТАЯ
+@router.get("/")
+async def main(request: Request):
+    return index_page.response(request)
+
+
+#УДАЛЕНИЕ ОБЬЯВЛЕНИЯ .. УДАЛИТЬ ОБЬЯВЛЕНИЕ МОЖЕТ ТОЛЬКО СОЗДАТЕЛЬ
+@router.delete("/advertisements/{advertisement_id}")
+async def delete_advertisement(
+    advertisement_id: int,
+    current_user: Principal = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    result = await run_write_async(db, WriteOperation("deleted", current_user.id, advertisement_id))
+    notify_advertisement_change(result.action, result.current, result.previous)
+    return {"detail": "Объявление успешно удалено"}
+
+#ПОИСК ПОЛЬЗОВАТЕЛЯ
+@router.get("/users/{user_id}", response_model=UserOut)
+async def read_user(user_id: int, db: AsyncSession = Depends(get_async_read_db),
+                    primary: AsyncSession = Depends(get_async_primary_read_db)):
+    async def load():
+        user = await fill_session(db, primary).get(User, user_id)
+        return user_to_dict(user) if user is not None else None
+
+    user = await read_cache.get_or_load_async(user_key(user_id), load)
+    if user is None:
+        raise HTTPException(status_code=404, detail="Пользователь  не найден")
+    return user
+
+#ПОИСК КОНКРЕТНОГО ОБЬЯВЛЕНИЯ ПО ID
+@router.get("/advertisements/{advertisement_id}", response_model=AdvertisementOut)
+async def read_advertisement(advertisement_id: int, request: Request, db: AsyncSession = Depends(get_async_read_db),
+                             primary: AsyncSession = Depends(get_async_primary_read_db)):
+    async def load():
+        advertisement = await fill_session(db, primary).get(Advertisement, advertisement_id)
+        return advertisement_to_dict(advertisement) if advertisement is not None else None
+
+    advertisement = await read_cache.get_or_load_async(advertisement_key(advertisement_id), load)
+    if advertisement is None:
+        raise HTTPException(status_code=404, detail="Обьявление не найдено")
+    return conditional_json(request, advertisement, advertisements_etag([advertisement]), last_modified(advertisement))
+
+#ПОЛУЧИТЬ СПИСОК ОБЬЯВЛЕНИЙ .. KEYSET-ПАГИНАЦИЯ, КУРСОР СЛЕДУЮЩЕЙ СТРАНИЦЫ В ЗАГОЛОВКЕ X-Next-Cursor
+#stream=true ОТДАЕТ ВСЕ ОСТАВШИЕСЯ СТРОКИ В NDJSON ЧЕРЕЗ СЕРВЕРНЫЙ КУРСОР (limit ИГНОРИРУЕТСЯ)
+@router.get("/advertisements/", response_model=List[AdvertisementOut])
+async def read_advertisements(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    type: Optional[str] = None,
+    location: Optional[str] = None,
+    owner_id: Optional[int] = None,
+    stream: bool = False,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    if stream:
+        statement = select(*ADVERTISEMENT_COLUMNS)
+        statement = apply_filters(statement, category, type, location, owner_id)
+        statement = apply_keyset(statement, cursor)
+        return StreamingResponse(stream_ndjson_async(statement), media_type="application/x-ndjson")
+
+    statement = apply_filters(select(*ADVERTISEMENT_COLUMNS), category, type, location, owner_id)
+    rows = (await db.execute(apply_keyset(statement, cursor).limit(limit + 1))).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1].created_at, rows[-1].id)
+    items = rows_to_dicts(rows)
+    return conditional_json(request, items, advertisements_etag(items, headers.get("X-Next-Cursor")), headers=headers)
+
+
+#РЕДАКТИРОВАНИЕ ОБЬЯВЛЕНИЙ .. РЕДАКТИРОВАТЬ МОЖЕТ ТОЛЬКО СОЗДАТЕЛЬ .. ТРЕБУЕТСЯ ТОКЕН
+@router.put("/advertisements/{advertisement_id}", response_model=AdvertisementBase)
+async def update_advertisement(
+    advertisement_id: int,
+    updated_advertisement: AdvertisementBase,
+    current_user: Principal = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    operation = WriteOperation("updated", current_user.id, advertisement_id, updated_advertisement.model_dump())
+    result = await run_write_async(db, operation)
+    notify_advertisement_change(result.action, result.current, result.previous)
+    return result.current
+
+
+# ПОИСК ОБЬЯВЛЕНИЙ КОНКРЕТНОГО ПОЛЬЗОВАТЕЛЯ .. KEYSET-ПАГИНАЦИЯ, ВСЕГО ОБЬЯВЛЕНИЙ В ЗАГОЛОВКЕ X-Total-Count
+@router.get("/users/{user_id}/advertisements/", response_model=List[AdvertisementOut])
+async def read_user_advertisements(
+    user_id: int,
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    primary: AsyncSession = Depends(get_async_primary_read_db)
+):
+    async def load(session: AsyncSession):
+        return owner_feed_page(await session.execute(build_owner_feed_statement(user_id, cursor, limit)), limit)
+
+    # В кэше только первая страница стандартного размера - ее сбрасывают хуки записи
+    if cursor is None and limit == DEFAULT_PAGE_SIZE:
+        page = await read_cache.get_or_load_async(user_advertisements_key(user_id),
+                                                  lambda: load(fill_session(db, primary)))
+    else:
+        page = await load(db)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    headers = owner_feed_headers(page)
+    etag = advertisements_etag(page["items"], page["count"], page["next_cursor"])
+    return conditional_json(request, page["items"], etag, headers=headers)
+
+
+#ПОИСК ОБЬЯВЛЕНИЯ ПО КЛЮЧЕВЫМ СЛОВАМ .. ПО ЗАГОЛОВКУ И ОПИСАНИЮ, С РАНЖИРОВАНИЕМ И ПОИСКОМ С ОПЕЧАТКАМИ
+@router.get("/advertisements/search/", response_model=List[AdvertisementOut])
+async def search_advertisements(
+    request: Request,
+    query: str = Query(..., min_length=1),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    # Бэкенды поиска написаны для синхронной Session - run_sync выполняет их поверх того же соединения
+    rows = await db.run_sync(
+        lambda session: search_backend.search(session, query, limit=limit, offset=offset)
+    )
+    items = rows_to_dicts(rows)
+    return conditional_json(request, items, advertisements_etag(items))
+
+
+#ПОИСК БЛИЖАЙШИХ ОБЬЯВЛЕНИЙ .. К ТОЧКЕ lat/lon ИЛИ К НАСЕЛЕННОМУ ПУНКТУ near, В РАДИУСЕ radius_km ИЛИ k БЛИЖАЙШИХ
+#С ФИЛЬТРОМ ПО КАТЕГОРИИ/ТИПУ, СТРАНИЦЫ ПО ВОЗРАСТАНИЮ РАССТОЯНИЯ (КУРСОР next_cursor)
+@router.get("/advertisements/nearby/", response_model=AdvertisementNearbyPage)
+async def nearby_advertisements(
+    request: Request,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    near: Optional[str] = Query(None, min_length=1),
+    radius_km: Optional[float] = Query(None, gt=0, le=MAX_DISTANCE_KM),
+    category: Optional[str] = None,
+    type: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    point = resolve_point(lat, lon, near)
+    page = await db.run_sync(
+        lambda session: nearby_page(session, point, limit, cursor, radius_km, category, type)
+    )
+    return conditional_json(request, page, advertisements_etag(page["items"], page["next_cursor"]))
+
+
+#ФИЛЬТР ОБЬЯВЛЕНИЙ .. КАТЕГОРИЯ/ТИП/ЛОКАЦИЯ/ДИАПАЗОН ЦЕН, СОРТИРОВКА И СЧЕТЧИКИ ПО КАЖДОМУ ИЗМЕРЕНИЮ
+@router.get("/advertisements/filter/", response_model=AdvertisementFilterPage)
+async def filter_advertisements(
+    category: Optional[str] = None,
+    type: Optional[str] = None,
+    location: Optional[str] = None,
+    price_min: Optional[Decimal] = Query(None, ge=0),
+    price_max: Optional[Decimal] = Query(None, ge=0),
+    sort: Literal[SORTS] = "newest",
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    filters = AdvertisementFilters(category, type, location, price_min, price_max)
+    advertisements = list(await db.scalars(build_items_statement(filters, sort, cursor, limit + 1)))
+    facets = facets_from_rows(await db.execute(build_facets_statement(filters)))
+    advertisements, next_cursor = paginate(advertisements, sort, limit)
+    return {"items": advertisements, "facets": facets, "next_cursor": next_cursor}
+
+
+#СТАТИСТИКА ПО КАТЕГОРИЯМ/ТИПАМ/ЛОКАЦИЯМ .. ЧИСЛО ОБЬЯВЛЕНИЙ И ЦЕНЫ, ИЗ ТАБЛИЦЫ АГРЕГАТОВ (O(ЧИСЛА ГРУПП))
+#group_by=category&group_by=location - РАЗБИВКА ПО НЕСКОЛЬКИМ ИЗМЕРЕНИЯМ
+@router.get("/advertisements/stats/", response_model=List[AdvertisementStatsGroup])
+async def advertisement_stats(
+    group_by: List[Literal[STAT_DIMENSIONS]] = Query(["category"]),
+    category: Optional[str] = None,
+    type: Optional[str] = None,
+    location: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    group_by = list(dict.fromkeys(group_by))
+    rows = await db.execute(build_stats_statement(group_by, category, type, location))
+    return stats_from_rows(rows, group_by)
@@ -0,0 +1,184 @@
+# auth.py
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import Depends, Header, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError, jwt
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import get_async_db, get_db
+from models.models import User
+from .cache import MemoryCacheBackend, create_cache_backend, register_cache
+from .events import publish_invalidation
+from .hooks import on_remote_invalidation, on_remote_reset
+from .schemas import Principal
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+
+# JWT
+load_dotenv()
+
+SECRET_KEY = os.getenv("SECRET_KEY")
+ALGORITHM = os.getenv("ALGORITHM")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+
+# Декодированные токены: токен неизменяем, поэтому кэш всегда локальный и живет не дольше exp
+token_cache = register_cache(
+    "auth_tokens", MemoryCacheBackend(max_size=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL)
+)
+# Пользователи по username: сбрасываются при любом изменении User через ORM
+principal_cache = register_cache(
+    "auth_principals", create_cache_backend("auth:principal", settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)
+)
+# Ключи сброса в ленте событий - общей с read_cache, поэтому с префиксом; * - весь кэш
+PRINCIPAL_KEY_PREFIX = "principal:"
+ALL_PRINCIPALS = PRINCIPAL_KEY_PREFIX + "*"
+
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    to_encode = data.copy()
+    if expires_delta:
+        expire = datetime.utcnow() + expires_delta
+    else:
+        expire = datetime.utcnow() + timedelta(minutes=15)
+    to_encode.update({"exp": expire})
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return encoded_jwt
+
+
+def _credentials_exception():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Не удалось проверить учетные данные",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def decode_username(token: Optional[str]) -> str:
+    if not token:
+        raise _credentials_exception()
+    key = hashlib.sha256(token.encode()).hexdigest()
+    username = token_cache.get(key)
+    if username is not None:
+        return username
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise _credentials_exception()
+    username = payload.get("sub")
+    if username is None:
+        raise _credentials_exception()
+    ttl = settings.AUTH_CACHE_TTL
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        token_cache.set(key, username, ttl)
+    return username
+
+
+def _cached_principal(username: str) -> Optional[Principal]:
+    data = principal_cache.get(username)
+    return Principal(**data) if data is not None else None
+
+
+def _remember(user: Optional[User]) -> Principal:
+    if user is None:
+        raise _credentials_exception()
+    principal = Principal(id=user.id, username=user.username)
+    principal_cache.set(user.username, principal.model_dump())
+    return principal
+
+
+def get_principal(token: Optional[str], db: Session) -> Principal:
+    username = decode_username(token)
+    principal = _cached_principal(username)
+    if principal is None:
+        principal = _remember(db.query(User).filter(User.username == username).first())
+    return principal
+
+
+async def get_principal_async(token: Optional[str], db: AsyncSession) -> Principal:
+    username = decode_username(token)
+    principal = _cached_principal(username)
+    if principal is None:
+        principal = _remember(await db.scalar(select(User).where(User.username == username)))
+    return principal
+
+
+# Единая зависимость авторизации для всех маршрутов, принимающих заголовок token
+def get_current_user(
+    token: Optional[str] = Header(None, description="Authorization token"),
+    db: Session = Depends(get_db),
+) -> Principal:
+    return get_principal(token, db)
+
+
+async def get_current_user_async(
+    token: Optional[str] = Header(None, description="Authorization token"),
+    db: AsyncSession = Depends(get_async_db),
+) -> Principal:
+    return await get_principal_async(token, db)
+
+
+# Кэш в памяти у каждого воркера свой: сброс уходит остальным через ленту событий, как в read_cache.
+# Redis общий, его сбрасывает записавший процесс
+def invalidate_user(username: str) -> None:
+    principal_cache.delete(username)
+    if isinstance(principal_cache, MemoryCacheBackend):
+        publish_invalidation(PRINCIPAL_KEY_PREFIX + username)
+
+
+def invalidate_all_users() -> None:
+    principal_cache.clear()
+    if isinstance(principal_cache, MemoryCacheBackend):
+        publish_invalidation(ALL_PRINCIPALS)
+
+
+# Сбрасывать нужно и прежнее имя: active_history загружает его перед присваиванием, даже если
+# атрибут истек после commit - иначе history.deleted пуст
+@event.listens_for(User.username, "set", active_history=True)
+def _keep_previous_username(target, value, oldvalue, initiator):
+    pass
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    usernames = {target.username, *inspect(target).attrs.username.history.deleted}
+    for username in usernames:
+        if username:
+            invalidate_user(username)
+
+
+# Массовые update(User)/delete(User) идут мимо after_update/after_delete, а затронутые имена
+# заранее неизвестны - сбрасывается весь кэш
+@event.listens_for(Session, "do_orm_execute")
+def _invalidate_bulk_users(orm_execute_state):
+    if ((orm_execute_state.is_update or orm_execute_state.is_delete)
+            and orm_execute_state.bind_mapper is User.__mapper__):
+        invalidate_all_users()
+
+
+def _invalidate_remote(keys) -> None:
+    for key in keys:
+        if key == ALL_PRINCIPALS:
+            principal_cache.clear()
+        elif key.startswith(PRINCIPAL_KEY_PREFIX):
+            principal_cache.delete(key[len(PRINCIPAL_KEY_PREFIX):])
+
+
+if isinstance(principal_cache, MemoryCacheBackend):
+    on_remote_invalidation(_invalidate_remote)
+    on_remote_reset(lambda db: principal_cache.clear())
+
+
+def cache_stats() -> dict:
+    return {"tokens": token_cache.stats(), "principals": principal_cache.stats()}
@@ -0,0 +1,178 @@
+# autocomplete.py
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import APIRouter, Query
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from config import settings
+from models.models import Advertisement
+from .hooks import on_advertisement_change, on_remote_advertisement_change, on_remote_reset
+from .instrumentation import InstrumentedRoute
+from .metrics import registry
+from .search import tokenize
+from .serialization import FastJSONResponse
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 40
+MAX_SUGGESTIONS = 20
+# Для коротких префиксов диапазон терминов велик: их топ кэшируется и правится при записи.
+# Кэшируется с запасом, чтобы падение веса терминов из топа не сбрасывало кэш каждый раз
+CACHED_PREFIX_LENGTH = 2
+CACHED_TOP_DEPTH = 4 * MAX_SUGGESTIONS
+
+
+def title_terms(title: Optional[str]) -> Set[str]:
+    return {term for term in tokenize(title) if MIN_TERM_LENGTH <= len(term) <= MAX_TERM_LENGTH}
+
+
+class PrefixIndex:
+    # Отсортированный массив терминов заголовков + вес (в скольких заголовках встречается).
+    # Префикс - это диапазон массива, его ищет bisect; вставка/удаление термина - insort/del.
+    # Не больше max_terms терминов: при пересборке остаются самые частые, новые термины
+    # сверх предела не добавляются до следующей пересборки
+    def __init__(self, max_terms: int):
+        self.max_terms = max_terms
+        self.dropped = 0
+        self._terms: List[str] = []
+        self._weights: Dict[str, int] = {}
+        self._top: Dict[str, List[Tuple[str, int]]] = {}
+        # Префиксы, у которых в кэше весь диапазон терминов
+        self._exhaustive: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def _adjust(self, term: str, delta: int) -> None:
+        weight = self._weights.get(term)
+        if weight is None:
+            if delta <= 0:
+                return
+            if len(self._terms) >= self.max_terms:
+                self.dropped += 1
+                return
+            insort(self._terms, term)
+            self._weights[term] = delta
+        elif weight + delta <= 0:
+            del self._weights[term]
+            del self._terms[bisect_left(self._terms, term)]
+        else:
+            self._weights[term] = weight + delta
+        for length in range(1, CACHED_PREFIX_LENGTH + 1):
+            self._update_top(term[:length], term, self._weights.get(term, 0))
+
+    # Закэшированный топ префикса правится на месте. Список - точные первые n терминов
+    # диапазона; термин, опустившийся ниже последнего, из него выпадает. Когда точных
+    # терминов остается меньше MAX_SUGGESTIONS, список сбрасывается и при чтении строится заново
+    def _update_top(self, prefix: str, term: str, weight: int) -> None:
+        top = self._top.get(prefix)
+        if top is None:
+            return
+        exhaustive = prefix in self._exhaustive
+        for position, (cached, _) in enumerate(top):
+            if cached == term:
+                del top[position]
+                break
+        if weight > 0 and (exhaustive or (top and (-weight, term) < (-top[-1][1], top[-1][0]))):
+            top.append((term, weight))
+            top.sort(key=lambda item: (-item[1], item[0]))
+            if len(top) > CACHED_TOP_DEPTH:
+                del top[CACHED_TOP_DEPTH:]
+                self._exhaustive.discard(prefix)
+        if not exhaustive and len(top) < MAX_SUGGESTIONS:
+            del self._top[prefix]
+
+    def update(self, old_title: Optional[str], new_title: Optional[str]) -> None:
+        old, new = title_terms(old_title), title_terms(new_title)
+        if old == new:
+            return
+        with self._lock:
+            for term in old - new:
+                self._adjust(term, -1)
+            for term in new - old:
+                self._adjust(term, 1)
+
+    def rebuild(self, titles: Iterable[Optional[str]]) -> None:
+        counts: Counter = Counter()
+        for title in titles:
+            counts.update(title_terms(title))
+        weights = dict(counts.most_common(self.max_terms))
+        terms = sorted(weights)
+        with self._lock:
+            self._weights, self._terms, self._top, self._exhaustive = weights, terms, {}, set()
+            self.dropped = 0
+
+    def _range_top(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        start = bisect_left(self._terms, prefix)
+        end = bisect_left(self._terms, prefix + "\uffff", start)
+        weights = self._weights
+        candidates = (self._terms[i] for i in range(start, end))
+        best = heapq.nsmallest(limit, candidates, key=lambda term: (-weights[term], term))
+        return [(term, weights[term]) for term in best]
+
+    # Термины с префиксом prefix по убыванию веса
+    def complete(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        with self._lock:
+            if len(prefix) > CACHED_PREFIX_LENGTH:
+                return self._range_top(prefix, limit)
+            top = self._top.get(prefix)
+            if top is None:
+                top = self._top[prefix] = self._range_top(prefix, CACHED_TOP_DEPTH)
+                if len(top) < CACHED_TOP_DEPTH:
+                    self._exhaustive.add(prefix)
+                else:
+                    self._exhaustive.discard(prefix)
+            return top[:limit]
+
+
+autocomplete_index = PrefixIndex(settings.AUTOCOMPLETE_MAX_TERMS)
+
+registry.gauge("autocomplete_terms", "Терминов в индексе подсказок", lambda: len(autocomplete_index))
+registry.counter("autocomplete_dropped_terms_total", "Новые термины, не вошедшие в индекс подсказок из-за предела",
+                 lambda: autocomplete_index.dropped)
+
+
+def rebuild_autocomplete(db: Session) -> None:
+    rows = db.execute(select(Advertisement.title).execution_options(yield_per=5000))
+    autocomplete_index.rebuild(title for title, in rows)
+
+
+# Индекс в памяти каждого воркера; заголовки, измененные другими воркерами, приходят из ленты событий
+@on_advertisement_change
+@on_remote_advertisement_change
+def _update_autocomplete(action: str, current: Optional[dict], previous: Optional[dict]) -> None:
+    autocomplete_index.update(
+        previous["title"] if previous is not None else None,
+        current["title"] if current is not None else None,
+    )
+
+
+on_remote_reset(rebuild_autocomplete)
+
+
+def suggest(query: str, limit: int) -> List[dict]:
+    tokens = tokenize(query)
+    # Запрос кончается пробелом - последнее слово уже введено, дописывать нечего
+    if not tokens or not query[-1:].isalnum():
+        return []
+    context = " ".join(tokens[:-1])
+    return [
+        {"text": f"{context} {term}" if context else term, "count": count}
+        for term, count in autocomplete_index.complete(tokens[-1], limit)
+    ]
+
+
+#ПОДСКАЗКИ ДЛЯ ПОИСКОВОЙ СТРОКИ .. ДОПИСЫВАЕТ ПОСЛЕДНЕЕ СЛОВО ПО ЧАСТОТЕ В ЗАГОЛОВКАХ ОБЬЯВЛЕНИЙ, БЕЗ ЗАПРОСА К БД
+@router.get("/advertisements/autocomplete/")
+async def autocomplete(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=MAX_SUGGESTIONS),
+):
+    return FastJSONResponse(suggest(q, limit))
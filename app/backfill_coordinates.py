@@ -0,0 +1,49 @@
+# backfill_coordinates.py
+# Координаты (latitude, longitude) для строк без них: записанных до миграции c5d9a7e3f182 или с
+# location, которого не было в справочнике. Новые и измененные объявления получают координаты при записи
+# (app/geo.py, with_coordinates). Миграция справочник не читает: схема не зависит от GAZETTEER_PATH.
+#
+#   python -m app.backfill_coordinates
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from database import engine
+from .events import publish_reset
+from .gazetteer import gazetteer
+
+logger = logging.getLogger(__name__)
+
+
+# Различных значений location немного: по одному UPDATE (и транзакции) на каждое найденное в справочнике
+def backfill(bind: Engine) -> int:
+    with bind.connect() as conn:
+        locations = conn.execute(text(
+            "SELECT DISTINCT location FROM advertisements WHERE location IS NOT NULL AND latitude IS NULL"
+        )).scalars().all()
+    updated = 0
+    for location in locations:
+        point = gazetteer.lookup(location)
+        if point is None:
+            continue
+        with bind.begin() as conn:
+            updated += conn.execute(
+                text("UPDATE advertisements SET latitude = :latitude, longitude = :longitude "
+                     "WHERE location = :location AND latitude IS NULL"),
+                {"latitude": point[0], "longitude": point[1], "location": location},
+            ).rowcount
+    return updated
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    updated = backfill(engine)
+    if updated:
+        # UPDATE мимо хуков: сетки ближайших в памяти запущенных воркеров строятся заново
+        publish_reset()
+    logger.info("coordinates backfilled for %d advertisements", updated)
+
+
+if __name__ == "__main__":
+    main()
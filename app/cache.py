@@ -0,0 +1,144 @@
+# cache.py
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import settings
+from .metrics import registry
+
+
+class CacheBackend:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def _record(self, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+# LRU с TTL в памяти процесса; значения не копируются, хранить нужно неизменяемые обьекты
+class MemoryCacheBackend(CacheBackend):
+    def __init__(self, max_size: int, ttl: float):
+        super().__init__()
+        self.max_size = max_size
+        self.ttl = ttl
+        self.evictions = 0
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] > time.monotonic():
+                self._items.move_to_end(key)
+                self._record(True)
+                return item[1]
+            if item is not None:
+                del self._items[key]
+            self._record(False)
+            return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._items[key] = (expires_at, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update(size=len(self._items), max_size=self.max_size, evictions=self.evictions)
+        return stats
+
+
+# Общий для всех воркеров gunicorn кэш; значения хранятся в JSON
+class RedisCacheBackend(CacheBackend):
+    def __init__(self, url: str, namespace: str, ttl: float):
+        super().__init__()
+        import redis  # необязательная зависимость, нужна только при CACHE_BACKEND=redis
+
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key: str) -> Any:
+        raw = self.client.get(self._key(key))
+        self._record(raw is not None)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self._key(key), json.dumps(value), px=max(int(ttl * 1000), 1))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self._key(key))
+
+    # Только ключи своего пространства имен; SCAN, в отличие от KEYS, не блокирует Redis
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=self._key("*"), count=1000))
+        if keys:
+            self.client.delete(*keys)
+
+
+def create_cache_backend(namespace: str, max_size: int, ttl: float) -> CacheBackend:
+    if settings.CACHE_BACKEND == "memory":
+        return MemoryCacheBackend(max_size=max_size, ttl=ttl)
+    if settings.CACHE_BACKEND == "redis":
+        return RedisCacheBackend(settings.CACHE_URL, namespace=namespace, ttl=ttl)
+    raise ValueError(f"Unknown CACHE_BACKEND: {settings.CACHE_BACKEND}")
+
+
+# Кэши процесса по именам: их счетчики попадают в /metrics
+_backends: Dict[str, CacheBackend] = {}
+
+
+def register_cache(name: str, backend: CacheBackend) -> CacheBackend:
+    _backends[name] = backend
+    return backend
+
+
+registry.counter("cache_hits_total", "Попадания в кэш",
+                 lambda: {(name,): backend.hits for name, backend in _backends.items()}, ("cache",))
+registry.counter("cache_misses_total", "Промахи кэша",
+                 lambda: {(name,): backend.misses for name, backend in _backends.items()}, ("cache",))
+registry.gauge("cache_entries", "Число записей в кэше в памяти процесса",
+               lambda: {(name,): len(backend._items) for name, backend in _backends.items()
+                        if isinstance(backend, MemoryCacheBackend)}, ("cache",))
@@ -0,0 +1,168 @@
+# compression.py
+import gzip
+import hashlib
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from config import settings
+from .conditional import is_not_modified
+
+try:
+    import brotli
+except ImportError:  # без пакета Brotli отдаем только gzip
+    brotli = None
+
+# Что имеет смысл сжимать; уже сжатое (выгрузка с gzip=true) и SSE - нет:
+# поток событий должен уходить клиенту сразу, а не копиться в буфере компрессора
+COMPRESSIBLE_TYPES = ("text/html", "text/plain", "text/csv", "application/json", "application/x-ndjson")
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = _accepted_encodings(accept_encoding)
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    # finish=False - сбросить накопленное, чтобы клиент получил кусок потока сразу
+    def compress(self, data: bytes, finish: bool) -> bytes:
+        if self._brotli is not None:
+            output = self._brotli.process(data)
+            return output + (self._brotli.finish() if finish else self._brotli.flush())
+        output = self._zlib.compress(data)
+        return output + self._zlib.flush(zlib.Z_FINISH if finish else zlib.Z_SYNC_FLUSH)
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class CompressionMiddleware:
+    # Сжимает ответы не меньше minimum_size по Accept-Encoding (br, затем gzip). Ответ целиком
+    # сжимается один раз; потоковый (NDJSON, выгрузка CSV) - по кускам со сбросом буфера
+    def __init__(self, app, minimum_size: int = settings.COMPRESSION_MIN_SIZE,
+                 gzip_level: int = settings.COMPRESSION_GZIP_LEVEL,
+                 brotli_quality: int = settings.COMPRESSION_BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        encoding = None
+        if scope["type"] == "http":
+            encoding = choose_encoding(Request(scope).headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[dict] = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = list(start["headers"])
+                if not self._should_compress(start["status"], headers, body, more_body):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers = [(key, value) for key, value in headers if key.lower() != b"content-length"]
+                headers += [(b"content-encoding", encoding.encode()), (b"vary", b"Accept-Encoding")]
+                body = compressor.compress(body, finish=not more_body)
+                if not more_body:
+                    headers.append((b"content-length", str(len(body)).encode()))
+                await send({**start, "headers": headers})
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+            await send({"type": "http.response.body", "body": compressor.compress(body, finish=not more_body),
+                        "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
+
+    def _should_compress(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes, more_body: bool) -> bool:
+        if status < 200 or status in (204, 304) or _header(headers, b"content-encoding") is not None:
+            return False
+        content_type = (_header(headers, b"content-type") or b"").decode("latin-1")
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        return more_body or len(body) >= self.minimum_size
+
+
+class StaticPage:
+    # Статическая страница читается с диска один раз и хранится в памяти уже сжатой
+    # во всех поддерживаемых кодировках; ETag - хэш содержимого
+    def __init__(self, path: str, media_type: str = "text/html; charset=utf-8"):
+        self.path = path
+        self.media_type = media_type
+        self._variants: Optional[Dict[Optional[str], bytes]] = None
+        self.etag = ""
+
+    def _load(self) -> Dict[Optional[str], bytes]:
+        if self._variants is None:
+            with open(self.path, "rb") as file:
+                content = file.read()
+            variants = {None: content, "gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                variants["br"] = brotli.compress(content, quality=11)
+            self.etag = f'W/"{hashlib.blake2b(content, digest_size=16).hexdigest()}"'
+            self._variants = variants
+        return self._variants
+
+    def response(self, request: Request) -> Response:
+        variants = self._load()
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if is_not_modified(request, self.etag):
+            return Response(status_code=304, headers=headers)
+        encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(variants[encoding], media_type=self.media_type, headers=headers)
+
+
+index_page = StaticPage("templates/index.html")
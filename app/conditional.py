@@ -0,0 +1,73 @@
+# conditional.py
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Iterable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .serialization import FastJSONResponse
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    # В базе время без зоны, в UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+# Слабый ETag из (id, updated_at) обьявлений и прочих частей ответа (курсор, счетчик):
+# считается по данным до сериализации. Слабый - потому что тело может отдаваться в gzip/br
+def advertisements_etag(items: Iterable[dict], *extra: Any) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for item in items:
+        digest.update(f"{item['id']}:{item.get('updated_at') or item['created_at']};".encode())
+    for value in extra:
+        digest.update(f"|{value}".encode())
+    return f'W/"{digest.hexdigest()}"'
+
+
+def last_modified(item: dict) -> Optional[datetime]:
+    # Снимки в кэше чтения, записанные до появления updated_at, его не содержат
+    return _as_datetime(item.get("updated_at") or item["created_at"])
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Сравнение слабое: W/"x" и "x" совпадают
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def is_not_modified(request: Request, etag: str, modified: Optional[datetime] = None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-Modified-Since при наличии If-None-Match не учитывается (RFC 9110)
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return modified.replace(microsecond=0) <= since
+
+
+# Ответ со списком или обьектом: 304 без сериализации тела, если у клиента актуальная версия.
+# Last-Modified передается только для отдельных обьектов: по максимуму updated_at списка
+# нельзя заметить удаление строки из него
+def conditional_json(request: Request, content: Any, etag: str, modified: Optional[datetime] = None,
+                     headers: Optional[dict] = None) -> Response:
+    validators = {"ETag": etag, "Cache-Control": "no-cache"}
+    if modified is not None:
+        validators["Last-Modified"] = format_datetime(modified, usegmt=True)
+    if is_not_modified(request, etag, modified):
+        return Response(status_code=304, headers={**(headers or {}), **validators})
+    return FastJSONResponse(content, headers={**(headers or {}), **validators})
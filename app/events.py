@@ -0,0 +1,427 @@
+# events.py
+import asyncio
+import json
+import logging
+import os
+import queue
+import select
+import socket
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, List, Optional, Set
+
+from fastapi import APIRouter, Header, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select as select_rows
+from sqlalchemy.exc import SQLAlchemyError
+
+from config import settings
+from database import SessionLocal
+from models.models import Advertisement
+from .hooks import (
+    notify_remote_advertisement_change,
+    notify_remote_invalidation,
+    notify_remote_reset,
+    on_advertisement_change,
+)
+from .instrumentation import InstrumentedRoute
+from .serialization import ADVERTISEMENT_COLUMNS, json_default, row_snapshot
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+CHANNEL = "advertisement_events"
+HEARTBEAT_SECONDS = 15
+SUBSCRIBER_QUEUE_SIZE = 1000
+# Сколько старт воркера ждет первого LISTEN и построения индексов в памяти
+LISTEN_READY_SECONDS = 60
+# Предел полезной нагрузки NOTIFY - 8000 байт; длинное описание в событие не попадает
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+
+# Процесс-отправитель события: свои изменения процесс уже применил в хуках до NOTIFY
+def _origin() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _event_key(event_id: str) -> tuple:
+    try:
+        return tuple(int(part) for part in event_id.split("-"))
+    except ValueError:
+        return ()
+
+
+class Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop, category: Optional[str], location: Optional[str]):
+        self.loop = loop
+        self.category = category
+        self.location = location
+        self.queue: "asyncio.Queue[Optional[dict]]" = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE + 1)
+        self.backlog: List[dict] = []
+        self.overflowed = False
+
+    def matches(self, event: dict) -> bool:
+        snapshots = [event.get("advertisement"), event.get("previous")]
+        return any(
+            snapshot is not None
+            and (self.category is None or snapshot.get("category") == self.category)
+            and (self.location is None or snapshot.get("location") == self.location)
+            for snapshot in snapshots
+        )
+
+    # Выполняется в цикле событий подписчика. Не успевает читать - получает None и отключается,
+    # после переподключения с Last-Event-ID дочитает пропущенное из буфера
+    def _put(self, event: dict) -> None:
+        if self.overflowed:
+            return
+        if self.queue.qsize() >= SUBSCRIBER_QUEUE_SIZE:
+            self.overflowed = True
+            self.queue.put_nowait(None)
+            return
+        self.queue.put_nowait(event)
+
+
+class EventBroker:
+    # Раздает события подписчикам процесса и хранит последние buffer_size событий для
+    # возобновления по Last-Event-ID. Сами события приходят из publish (memory) или из
+    # единственного в процессе слушателя LISTEN (postgres)
+    def __init__(self, buffer_size: int):
+        self._buffer: Deque[dict] = deque(maxlen=buffer_size)
+        self._subscribers: Set[Subscription] = set()
+        self._lock = threading.Lock()
+        self._sequence = 0
+
+    def next_id(self) -> str:
+        with self._lock:
+            self._sequence += 1
+            return f"{time.time_ns() // 1000}-{os.getpid()}-{self._sequence}"
+
+    def publish(self, event: dict) -> None:
+        self.dispatch(event)
+
+    def dispatch(self, event: dict) -> None:
+        with self._lock:
+            self._buffer.append(event)
+            subscribers = [subscription for subscription in self._subscribers if subscription.matches(event)]
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, event)
+            except RuntimeError:
+                # Цикл подписчика уже закрыт
+                self.unsubscribe(subscription)
+
+    def _backlog(self, last_event_id: str) -> List[dict]:
+        events = list(self._buffer)
+        for position, event in enumerate(events):
+            if event["id"] == last_event_id:
+                return events[position + 1:]
+        # Такого события в буфере нет: если оно старше всего буфера - часть событий потеряна
+        # (пустой буфер после перезапуска процесса тоже ничего не гарантирует)
+        key = _event_key(last_event_id)
+        if not key or not events or _event_key(events[0]["id"])[:1] > key[:1]:
+            return [{"id": events[-1]["id"] if events else last_event_id, "action": "reset"}]
+        return [event for event in events if _event_key(event["id"])[:1] > key[:1]]
+
+    # Регистрация и снимок буфера под одной блокировкой: ни одно событие не теряется и не дублируется
+    def subscribe(self, category: Optional[str] = None, location: Optional[str] = None,
+                  last_event_id: Optional[str] = None) -> Subscription:
+        subscription = Subscription(asyncio.get_running_loop(), category, location)
+        with self._lock:
+            if last_event_id:
+                subscription.backlog = [
+                    event for event in self._backlog(last_event_id)
+                    if event["action"] == "reset" or subscription.matches(event)
+                ]
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    # Строит ли брокер индексы и кэши в памяти сам при подключении к ленте (иначе - main.py при старте)
+    rebuilds_on_listen = False
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+class PostgresEventBroker(EventBroker):
+    # Публикация - NOTIFY из отдельного потока (хуки вызываются и из цикла событий, блокировать
+    # его запросом к БД нельзя); прием - один поток на процесс с LISTEN на отдельном соединении
+    def __init__(self, buffer_size: int, dsn: str):
+        super().__init__(buffer_size)
+        self.dsn = dsn
+        self._outgoing: "queue.Queue[dict]" = queue.Queue()
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._ready = threading.Event()
+
+    rebuilds_on_listen = True
+
+    def publish(self, event: dict) -> None:
+        self._outgoing.put(event)
+
+    # Возвращает, когда LISTEN уже слушает и индексы в памяти построены: изменения, сделанные
+    # между построением и LISTEN, не теряются
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stopped.clear()
+        self._ready.clear()
+        for target, name in ((self._listen, "events-listen"), (self._notify, "events-notify")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if not self._ready.wait(LISTEN_READY_SECONDS):
+            logger.warning("events listener is not ready after %s s, in-memory indexes may be empty",
+                           LISTEN_READY_SECONDS)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._threads = []
+
+    def _connect(self):
+        import psycopg2
+
+        connection = psycopg2.connect(self.dsn)
+        connection.autocommit = True
+        return connection
+
+    def publish_invalidation(self, keys: List[str]) -> None:
+        self._outgoing.put({"action": "invalidate", "keys": keys})
+
+    # Отправляется сразу, без потока: вызывается и из python -m app.partitions, где брокер не запущен
+    def publish_reset(self) -> None:
+        connection = self._connect()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", (CHANNEL, _payload({"action": "rebuild"})))
+        finally:
+            connection.close()
+
+    def _listen(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                connection = self._connect()
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                # Пока LISTEN не было (старт процесса, разрыв соединения), чужие изменения не доходили:
+                # кэши и индексы строятся по БД уже после LISTEN
+                _reset_local()
+                self._ready.set()
+                while not self._stopped.is_set():
+                    if select.select([connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self._receive(json.loads(connection.notifies.pop(0).payload))
+            except Exception:
+                logger.exception("events listener failed, reconnecting")
+                self._stopped.wait(1.0)
+
+    def _receive(self, event: dict) -> None:
+        remote = event.pop("origin", None) != _origin()
+        truncated = event.pop("truncated", False)
+        if event["action"] == "invalidate":
+            if remote:
+                notify_remote_invalidation(event["keys"])
+            return
+        # Перестройка нужна и отправителю: сам он мог и не держать индексов (python -m app.partitions)
+        if event["action"] == "rebuild":
+            _reset_local()
+            return
+        self.dispatch(event)
+        if remote:
+            _apply_remote(event, truncated)
+
+    def _send(self, connection, payloads: list):
+        if connection is None or connection.closed:
+            connection = self._connect()
+        with connection.cursor() as cursor:
+            cursor.executemany("SELECT pg_notify(%s, %s)", payloads)
+        return connection
+
+    # Неудачная отправка повторяется после переподключения. Не ушло и со второго раза - события
+    # получают подписчики этого процесса напрямую, а остальным процессам, как только соединение
+    # вернется, уходит rebuild: их кэши и индексы строятся заново
+    def _notify(self) -> None:
+        connection = None
+        lost = False
+        while not self._stopped.is_set():
+            events = []
+            try:
+                events.append(self._outgoing.get(timeout=1.0))
+            except queue.Empty:
+                if not lost:
+                    continue
+            # Все накопившиеся события уходят одним запросом
+            while not self._outgoing.empty() and len(events) < 1000:
+                events.append(self._outgoing.get_nowait())
+            payloads = [(CHANNEL, _payload(event)) for event in events]
+            if lost:
+                payloads.append((CHANNEL, _payload({"action": "rebuild"})))
+            for attempt in range(2):
+                try:
+                    connection = self._send(connection, payloads)
+                    lost = False
+                    break
+                except Exception:
+                    logger.exception("events notify failed (attempt %d), %d events", attempt + 1, len(events))
+                    connection = None
+                    self._stopped.wait(1.0)
+            else:
+                for event in events:
+                    if event["action"] not in ("invalidate", "rebuild"):
+                        self.dispatch(event)
+                lost = True
+
+
+def _payload(event: dict) -> str:
+    event = {**event, "origin": _origin()}
+    payload = json.dumps(event, default=json_default, ensure_ascii=False)
+    if len(payload.encode()) <= NOTIFY_PAYLOAD_LIMIT:
+        return payload
+    trimmed = {**event, "truncated": True}
+    for key in ("advertisement", "previous"):
+        if trimmed.get(key) is not None:
+            trimmed[key] = {**trimmed[key], "description": None}
+    return json.dumps(trimmed, default=json_default, ensure_ascii=False)
+
+
+# Чужое изменение - в кэши и индексы этого процесса. Снимок без описания (обрезан под предел
+# NOTIFY) перечитывается из БД, иначе поисковый индекс потеряет слова описания
+def _apply_remote(event: dict, truncated: bool) -> None:
+    if event["action"] == "deleted":
+        current, previous = None, event["advertisement"]
+    else:
+        current, previous = event["advertisement"], event["previous"]
+    if truncated and current is not None:
+        try:
+            with SessionLocal() as db:
+                row = db.execute(
+                    select_rows(*ADVERTISEMENT_COLUMNS).where(Advertisement.id == current["id"])
+                ).first()
+            if row is not None:
+                current = row_snapshot(row)
+        except SQLAlchemyError:
+            logger.exception("failed to reload advertisement %s, description is not indexed", current["id"])
+    notify_remote_advertisement_change(event["action"], current, previous)
+
+
+def _create_broker() -> EventBroker:
+    if settings.EVENTS_BACKEND == "memory":
+        return EventBroker(settings.EVENTS_BUFFER_SIZE)
+    if settings.EVENTS_BACKEND == "postgres":
+        return PostgresEventBroker(settings.EVENTS_BUFFER_SIZE, settings.POSTGRES_DATABASE_URLS)
+    raise ValueError(f"Unknown EVENTS_BACKEND: {settings.EVENTS_BACKEND}")
+
+
+broker = _create_broker()
+
+
+@on_advertisement_change
+def _publish_event(action: str, current: Optional[dict], previous: Optional[dict]) -> None:
+    broker.publish({
+        "id": broker.next_id(),
+        "action": action,
+        "advertisement": current if current is not None else previous,
+        "previous": previous if current is not None else None,
+    })
+
+
+# Сброс ключей кэша в остальных процессах; с EVENTS_BACKEND=memory процесс один и рассылать некому
+def publish_invalidation(*keys: str) -> None:
+    if isinstance(broker, PostgresEventBroker):
+        broker.publish_invalidation(list(keys))
+
+
+def _reset_local() -> None:
+    with SessionLocal() as db:
+        notify_remote_reset(db)
+
+
+# Строки изменились мимо хуков (например, отключена партиция): кэши и индексы в памяти всех
+# процессов строятся заново. С EVENTS_BACKEND=memory процесс один - перестраивается он сам
+def publish_reset() -> None:
+    if isinstance(broker, PostgresEventBroker):
+        broker.publish_reset()
+    else:
+        _reset_local()
+
+
+def format_sse(event: dict) -> bytes:
+    data = {key: value for key, value in event.items() if key not in ("id", "action")}
+    return (
+        f"id: {event['id']}\nevent: {event['action']}\n"
+        f"data: {json.dumps(data, default=json_default, ensure_ascii=False)}\n\n"
+    ).encode()
+
+
+async def _iter_events(subscription: Subscription) -> AsyncIterator[Optional[dict]]:
+    for event in subscription.backlog:
+        yield event
+    while True:
+        try:
+            event = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_SECONDS)
+        except asyncio.TimeoutError:
+            yield None
+            continue
+        if event is None:
+            return
+        yield event
+
+
+#ЛЕНТА ИЗМЕНЕНИЙ ОБЬЯВЛЕНИЙ .. SERVER-SENT EVENTS: created/updated/deleted, ФИЛЬТР ПО КАТЕГОРИИ И ЛОКАЦИИ
+#ПОСЛЕ ПЕРЕПОДКЛЮЧЕНИЯ ДОСЫЛАЕТ ПРОПУЩЕННОЕ ПО Last-Event-ID; event: reset - ПРОПУЩЕННОЕ ПОТЕРЯНО, НУЖНА ПЕРЕЗАГРУЗКА
+@router.get("/advertisements/events/")
+async def advertisement_events(
+    category: Optional[str] = None,
+    location: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None),
+    since: Optional[str] = Query(None, description="Last-Event-ID для клиентов без заголовков"),
+):
+    subscription = broker.subscribe(category, location, last_event_id or since)
+
+    async def body():
+        try:
+            yield b"retry: 3000\n\n"
+            async for event in _iter_events(subscription):
+                yield b": ping\n\n" if event is None else format_sse(event)
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+#ТА ЖЕ ЛЕНТА ЧЕРЕЗ WEBSOCKET: СООБЩЕНИЯ - JSON С ПОЛЯМИ id, action, advertisement, previous
+@router.websocket("/advertisements/events/ws")
+async def advertisement_events_ws(
+    websocket: WebSocket,
+    category: Optional[str] = None,
+    location: Optional[str] = None,
+    since: Optional[str] = None,
+):
+    await websocket.accept()
+    subscription = broker.subscribe(category, location, since)
+    try:
+        async for event in _iter_events(subscription):
+            if event is not None:
+                await websocket.send_text(json.dumps(event, default=json_default, ensure_ascii=False))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broker.unsubscribe(subscription)
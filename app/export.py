@@ -0,0 +1,61 @@
+# export.py
+from datetime import datetime
+from typing import Literal, Optional
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from config import settings
+from models.models import Advertisement
+from .instrumentation import InstrumentedRoute
+from .serialization import ADVERTISEMENT_COLUMNS
+from .streaming import ENCODERS, stream_rows, stream_rows_async
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+EXPORT_CHUNK_SIZE = 5000
+
+
+def build_export_statement(
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    id_from: Optional[int] = None,
+    id_to: Optional[int] = None,
+):
+    statement = select(*ADVERTISEMENT_COLUMNS)
+    if created_from is not None:
+        statement = statement.where(Advertisement.created_at >= created_from)
+    if created_to is not None:
+        statement = statement.where(Advertisement.created_at < created_to)
+    if id_from is not None:
+        statement = statement.where(Advertisement.id > id_from)
+    if id_to is not None:
+        statement = statement.where(Advertisement.id <= id_to)
+    # Порядок по первичному ключу: последний выгруженный id - точка старта следующей выгрузки
+    return statement.order_by(Advertisement.id)
+
+
+#ВЫГРУЗКА ВСЕХ ОБЬЯВЛЕНИЙ .. NDJSON/CSV ПОТОКОМ ИЗ СЕРВЕРНОГО КУРСОРА, ПО ЖЕЛАНИЮ В GZIP
+#ИНКРЕМЕНТАЛЬНО: id_from=<ПОСЛЕДНИЙ ВЫГРУЖЕННЫЙ id> ИЛИ ДИАПАЗОН created_from/created_to
+@router.get("/advertisements/export/")
+def export_advertisements(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    gzip: bool = False,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    id_from: Optional[int] = None,
+    id_to: Optional[int] = None,
+):
+    statement = build_export_statement(created_from, created_to, id_from, id_to)
+    encoder = ENCODERS[format]()
+    if settings.DB_MODE == "async":
+        body = stream_rows_async(statement, encoder, gzip=gzip, chunk_size=EXPORT_CHUNK_SIZE)
+    else:
+        body = stream_rows(statement, encoder, gzip=gzip, chunk_size=EXPORT_CHUNK_SIZE)
+    filename = f"advertisements.{encoder.extension}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        body,
+        media_type="application/gzip" if gzip else encoder.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
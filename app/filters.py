@@ -0,0 +1,99 @@
+# filters.py
+from decimal import Decimal
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import Numeric, String, cast, func, literal, null, select, union_all
+
+from models.models import Advertisement
+from .pagination import apply_keyset, apply_price_keyset, encode_cursor, encode_price_cursor
+
+SORTS = ("newest", "price_asc", "price_desc")
+FACET_DIMENSIONS = ("category", "type", "location")
+
+
+class AdvertisementFilters(NamedTuple):
+    category: Optional[str] = None
+    type: Optional[str] = None
+    location: Optional[str] = None
+    price_min: Optional[Decimal] = None
+    price_max: Optional[Decimal] = None
+
+
+# exclude - измерение, для которого считаются фасеты: его собственный фильтр не применяется,
+# чтобы клиент видел, сколько обьявлений даст выбор другого значения
+def _conditions(filters: AdvertisementFilters, exclude: Optional[str] = None) -> list:
+    conditions = []
+    for dimension in FACET_DIMENSIONS:
+        value = getattr(filters, dimension)
+        if value is not None and dimension != exclude:
+            conditions.append(getattr(Advertisement, dimension) == value)
+    if exclude != "price":
+        if filters.price_min is not None:
+            conditions.append(Advertisement.price >= filters.price_min)
+        if filters.price_max is not None:
+            conditions.append(Advertisement.price <= filters.price_max)
+    return conditions
+
+
+def build_items_statement(filters: AdvertisementFilters, sort: str, cursor: Optional[str], limit: int):
+    statement = select(Advertisement).where(*_conditions(filters))
+    if sort == "newest":
+        statement = apply_keyset(statement, cursor)
+    else:
+        statement = apply_price_keyset(statement, cursor, descending=sort == "price_desc")
+    return statement.limit(limit)
+
+
+# Берет limit + 1 строк, возвращает страницу и курсор следующей страницы
+def paginate(advertisements: List[Advertisement], sort: str, limit: int):
+    if len(advertisements) <= limit:
+        return advertisements, None
+    advertisements = advertisements[:limit]
+    last = advertisements[-1]
+    if sort == "newest":
+        return advertisements, encode_cursor(last.created_at, last.id)
+    return advertisements, encode_price_cursor(last.price, last.id)
+
+
+# Все фасеты одним запросом: UNION ALL группировок по каждому измерению + диапазон цен
+def build_facets_statement(filters: AdvertisementFilters):
+    price_type = Numeric(12, 2)
+    parts = []
+    for dimension in FACET_DIMENSIONS:
+        column = getattr(Advertisement, dimension)
+        parts.append(
+            select(
+                literal(dimension).label("dimension"),
+                column.label("value"),
+                func.count().label("count"),
+                cast(null(), price_type).label("min_price"),
+                cast(null(), price_type).label("max_price"),
+            )
+            .where(column.isnot(None), *_conditions(filters, exclude=dimension))
+            .group_by(column)
+        )
+    parts.append(
+        select(
+            literal("price").label("dimension"),
+            cast(null(), String).label("value"),
+            func.count().label("count"),
+            func.min(Advertisement.price).label("min_price"),
+            func.max(Advertisement.price).label("max_price"),
+        ).where(Advertisement.price.isnot(None), *_conditions(filters, exclude="price"))
+    )
+    return union_all(*parts)
+
+
+def facets_from_rows(rows) -> dict:
+    facets = {dimension: {} for dimension in FACET_DIMENSIONS}
+    facets["price"] = {"count": 0, "min": None, "max": None}
+    for dimension, value, count, min_price, max_price in rows:
+        if dimension == "price":
+            facets["price"] = {
+                "count": count,
+                "min": float(min_price) if min_price is not None else None,
+                "max": float(max_price) if max_price is not None else None,
+            }
+        else:
+            facets[dimension][value] = count
+    return facets
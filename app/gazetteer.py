@@ -0,0 +1,59 @@
+# gazetteer.py
+# Геокодирование location по локальному справочнику населенных пунктов, без внешних сервисов.
+# Файл - CSV с колонками name,latitude,longitude,aliases (синонимы через |)
+import csv
+import re
+from typing import Dict, Optional, Tuple
+
+from config import settings
+
+Point = Tuple[float, float]
+
+# "г. Москва", "город Бийск", "пгт ..." - тип пункта перед названием не важен
+_KIND_RE = re.compile(r"^(г|гор|город|пгт|пос|поселок|с|село|д|дер|деревня)\.?\s+")
+_SEPARATOR_RE = re.compile(r"[\s\-–—]+")
+
+
+def normalize_place(name: str) -> str:
+    value = name.lower().replace("ё", "е").strip(" .")
+    value = _KIND_RE.sub("", value)
+    return _SEPARATOR_RE.sub(" ", value).strip()
+
+
+class Gazetteer:
+    def __init__(self, places: Dict[str, Point]):
+        self._places = places
+
+    def __len__(self) -> int:
+        return len(self._places)
+
+    @classmethod
+    def load(cls, path: str) -> "Gazetteer":
+        places: Dict[str, Point] = {}
+        with open(path, encoding="utf-8", newline="") as file:
+            for row in csv.DictReader(file):
+                point = (float(row["latitude"]), float(row["longitude"]))
+                aliases = [alias for alias in (row.get("aliases") or "").split("|") if alias.strip()]
+                for name in (row["name"], *aliases):
+                    places.setdefault(normalize_place(name), point)
+        return cls(places)
+
+    def lookup(self, location: Optional[str]) -> Optional[Point]:
+        if not location:
+            return None
+        point = self._places.get(normalize_place(location))
+        if point is None and "," in location:
+            # "Барнаул, ул. Ленина 1" - адрес после названия пункта
+            point = self._places.get(normalize_place(location.split(",", 1)[0]))
+        return point
+
+
+gazetteer = Gazetteer.load(settings.GAZETTEER_PATH)
+
+
+# Координаты для записи через Core-запросы по словарю значений; пункт не найден - NULL
+def with_coordinates(values: dict) -> dict:
+    if "location" not in values:
+        return values
+    latitude, longitude = gazetteer.lookup(values["location"]) or (None, None)
+    return {**values, "latitude": latitude, "longitude": longitude}
@@ -0,0 +1,372 @@
+# geo.py
+import heapq
+import itertools
+import math
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import event, func, inspect, or_, select, tuple_
+from sqlalchemy.orm import Session
+
+from config import settings
+from models.models import Advertisement
+from .gazetteer import Point, gazetteer
+from .hooks import on_advertisement_change, on_remote_advertisement_change, on_remote_reset
+from .metrics import registry
+from .pagination import apply_filters, decode_distance_cursor, encode_distance_cursor
+from .search import _load_ordered
+from .serialization import rows_to_dicts
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+# k ближайших в БД ищутся в круге, который растет, пока не наберется страница
+INITIAL_RADIUS_KM = 50.0
+RADIUS_GROWTH = 4
+
+# (расстояние в км, id обьявления)
+Ranked = Tuple[float, int]
+
+
+def haversine_km(latitude1: float, longitude1: float, latitude2: float, longitude2: float) -> float:
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(longitude2 - longitude1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+# Та же формула в SQL - расстояние от точки запроса до обьявления
+def distance_expression(latitude: float, longitude: float):
+    phi = func.radians(Advertisement.latitude)
+    a = (func.power(func.sin((phi - math.radians(latitude)) / 2), 2)
+         + math.cos(math.radians(latitude)) * func.cos(phi)
+         * func.power(func.sin((func.radians(Advertisement.longitude) - math.radians(longitude)) / 2), 2))
+    return 2 * EARTH_RADIUS_KM * func.asin(func.least(1.0, func.sqrt(a)))
+
+
+# Прямоугольник, в котором лежат все точки не дальше radius_km: (юг, север, диапазоны долготы).
+# None вместо диапазонов - круг накрывает полюс, долгота не ограничена; через 180-й меридиан - два диапазона
+def bounding_box(latitude: float, longitude: float,
+                 radius_km: float) -> Tuple[float, float, Optional[List[Tuple[float, float]]]]:
+    angle = radius_km / EARTH_RADIUS_KM
+    south, north = latitude - math.degrees(angle), latitude + math.degrees(angle)
+    if south <= -90 or north >= 90:
+        return max(south, -90.0), min(north, 90.0), None
+    delta = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(latitude))))
+    west, east = longitude - delta, longitude + delta
+    if west < -180:
+        return south, north, [(west + 360, 180.0), (-180.0, east)]
+    if east > 180:
+        return south, north, [(west, 180.0), (-180.0, east - 360)]
+    return south, north, [(west, east)]
+
+
+class GeoBackend:
+    # Ближайшие к точке обьявления по возрастанию (расстояние, id), строго после after
+    def nearest(self, db: Session, latitude: float, longitude: float, limit: int, after: Optional[Ranked] = None,
+                radius_km: Optional[float] = None, category: Optional[str] = None,
+                type: Optional[str] = None) -> List[Ranked]:
+        raise NotImplementedError
+
+    # Хук записи: снимки после и до изменения
+    def update(self, current: Optional[dict], previous: Optional[dict]) -> None:
+        pass
+
+    def rebuild(self, db: Session) -> None:
+        pass
+
+
+class PostgresGeoBackend(GeoBackend):
+    # B-tree (latitude, longitude) отсекает строки вне описанного прямоугольника, точное
+    # расстояние, радиус и порядок считает запрос. Без радиуса круг растет, пока не наберется limit
+    def nearest(self, db: Session, latitude: float, longitude: float, limit: int, after: Optional[Ranked] = None,
+                radius_km: Optional[float] = None, category: Optional[str] = None,
+                type: Optional[str] = None) -> List[Ranked]:
+        bound = radius_km if radius_km is not None else MAX_DISTANCE_KM
+        radius = INITIAL_RADIUS_KM + (after[0] if after is not None else 0)
+        while True:
+            radius = min(radius, bound)
+            ranked = self._within(db, latitude, longitude, radius, limit, after, category, type)
+            if len(ranked) >= limit or radius >= bound:
+                return ranked
+            radius *= RADIUS_GROWTH
+
+    @staticmethod
+    def _within(db: Session, latitude: float, longitude: float, radius_km: float, limit: int,
+                after: Optional[Ranked], category: Optional[str], type: Optional[str]) -> List[Ranked]:
+        distance = distance_expression(latitude, longitude)
+        south, north, longitudes = bounding_box(latitude, longitude, radius_km)
+        statement = select(distance, Advertisement.id).where(
+            Advertisement.latitude.between(south, north), distance <= radius_km
+        )
+        if longitudes is not None:
+            statement = statement.where(or_(*(Advertisement.longitude.between(west, east) for west, east in longitudes)))
+        if after is not None:
+            statement = statement.where(tuple_(distance, Advertisement.id) > tuple_(*after))
+        statement = apply_filters(statement, category, type)
+        rows = db.execute(statement.order_by(distance, Advertisement.id).limit(limit))
+        return [(distance_km, advertisement_id) for distance_km, advertisement_id in rows]
+
+
+class _Site:
+    # Точка и все обьявления в ней. Координаты берутся из справочника, поэтому обьявления
+    # одного города делят одну точку; id отсортированы, категории и типы лежат параллельно
+    __slots__ = ("latitude", "longitude", "ids", "categories", "types")
+
+    def __init__(self, latitude: float, longitude: float):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.ids = array("q")
+        self.categories: List[Optional[str]] = []
+        self.types: List[Optional[str]] = []
+
+    def matching(self, start: Optional[int], category: Optional[str], type: Optional[str]) -> Iterator[int]:
+        position = bisect_right(self.ids, start) if start is not None else 0
+        for i in range(position, len(self.ids)):
+            if (category is None or self.categories[i] == category) and (type is None or self.types[i] == type):
+                yield self.ids[i]
+
+
+class GridGeoBackend(GeoBackend):
+    # Сетка cell_degrees x cell_degrees в памяти процесса: для тестов и окружений без Postgres.
+    # Ячейки просматриваются кольцами от ячейки запроса; точка выдается, как только все
+    # непросмотренные ячейки заведомо дальше нее
+    def __init__(self, cell_degrees: float):
+        self.cell = cell_degrees
+        self.rows = math.ceil(180 / cell_degrees)
+        self.columns = math.ceil(360 / cell_degrees)
+        self.size = 0
+        self._sites: Dict[Point, _Site] = {}
+        self._cells: Dict[Tuple[int, int], List[_Site]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _cell_of(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        row = min(int((latitude + 90) // self.cell), self.rows - 1)
+        return row, int((longitude + 180) // self.cell) % self.columns
+
+    def _site(self, sites: Dict[Point, _Site], cells: Dict[Tuple[int, int], List[_Site]],
+              latitude: float, longitude: float) -> _Site:
+        site = sites.get((latitude, longitude))
+        if site is None:
+            site = sites[latitude, longitude] = _Site(latitude, longitude)
+            cells.setdefault(self._cell_of(latitude, longitude), []).append(site)
+        return site
+
+    def _add(self, snapshot: dict) -> None:
+        site = self._site(self._sites, self._cells, snapshot["latitude"], snapshot["longitude"])
+        position = bisect_left(site.ids, snapshot["id"])
+        if position < len(site.ids) and site.ids[position] == snapshot["id"]:
+            site.categories[position], site.types[position] = snapshot["category"], snapshot["type"]
+            return
+        site.ids.insert(position, snapshot["id"])
+        site.categories.insert(position, snapshot["category"])
+        site.types.insert(position, snapshot["type"])
+        self.size += 1
+
+    def _discard(self, snapshot: dict) -> None:
+        key = (snapshot["latitude"], snapshot["longitude"])
+        site = self._sites.get(key)
+        if site is None:
+            return
+        position = bisect_left(site.ids, snapshot["id"])
+        if position == len(site.ids) or site.ids[position] != snapshot["id"]:
+            return
+        del site.ids[position], site.categories[position], site.types[position]
+        self.size -= 1
+        if not site.ids:
+            del self._sites[key]
+            cell = self._cell_of(*key)
+            self._cells[cell].remove(site)
+            if not self._cells[cell]:
+                del self._cells[cell]
+
+    def update(self, current: Optional[dict], previous: Optional[dict]) -> None:
+        with self._lock:
+            if previous is not None and previous.get("latitude") is not None:
+                self._discard(previous)
+            if current is not None and current.get("latitude") is not None:
+                self._add(current)
+
+    # Строки (id, latitude, longitude, category, type) в порядке возрастания id
+    def load(self, rows: Iterable[tuple]) -> None:
+        sites: Dict[Point, _Site] = {}
+        cells: Dict[Tuple[int, int], List[_Site]] = {}
+        size = 0
+        for advertisement_id, latitude, longitude, category, type in rows:
+            site = self._site(sites, cells, latitude, longitude)
+            site.ids.append(advertisement_id)
+            site.categories.append(category)
+            site.types.append(type)
+            size += 1
+        with self._lock:
+            self._sites, self._cells, self.size = sites, cells, size
+
+    def rebuild(self, db: Session) -> None:
+        statement = (
+            select(Advertisement.id, Advertisement.latitude, Advertisement.longitude,
+                   Advertisement.category, Advertisement.type)
+            .where(Advertisement.latitude.isnot(None), Advertisement.longitude.isnot(None))
+            .order_by(Advertisement.id)
+        )
+        self.load(db.execute(statement.execution_options(yield_per=5000)))
+
+    def _ring(self, row: int, column: int, radius: int) -> Iterator[Tuple[int, int]]:
+        for r in range(max(row - radius, 0), min(row + radius, self.rows - 1) + 1):
+            if abs(r - row) == radius:
+                columns: Iterable[int] = range(column - radius, column + radius + 1)
+            else:
+                columns = (column - radius, column + radius)
+            for c in columns:
+                yield r, c % self.columns
+
+    # Нижняя граница расстояния до любой ячейки вне квадрата из колец 0..radius. До параллели -
+    # разность широт; до меридиана на угле delta от точки - asin(cos(широты) * sin(delta))
+    def _bound(self, latitude: float, longitude: float, row: int, column: int, radius: int) -> float:
+        bounds = []
+        south = (row - radius) * self.cell - 90
+        north = (row + radius + 1) * self.cell - 90
+        if south > -90:
+            bounds.append((latitude - south) * KM_PER_DEGREE)
+        if north < 90:
+            bounds.append((north - latitude) * KM_PER_DEGREE)
+        if 2 * radius + 1 < self.columns:
+            west = (column - radius) * self.cell - 180
+            east = (column + radius + 1) * self.cell - 180
+            delta = math.radians(min(longitude - west, east - longitude, 90))
+            bounds.append(EARTH_RADIUS_KM * math.asin(math.cos(math.radians(latitude)) * math.sin(delta)))
+        return min(bounds, default=math.inf)
+
+    # Пары (граница, точки очередного кольца). Когда колец просмотрено больше, чем непустых
+    # ячеек, остальные непустые ячейки отдаются разом - дальние запросы не обходят пустой океан
+    def _rings(self, latitude: float, longitude: float) -> Iterator[Tuple[float, List[_Site]]]:
+        row, column = self._cell_of(latitude, longitude)
+        visited = set()
+        for radius in itertools.count():
+            sites: List[_Site] = []
+            for cell in self._ring(row, column, radius):
+                if cell not in visited:
+                    visited.add(cell)
+                    sites.extend(self._cells.get(cell, ()))
+            bound = self._bound(latitude, longitude, row, column, radius)
+            if bound != math.inf and len(visited) > len(self._cells):
+                sites.extend(site for cell, rest in self._cells.items() if cell not in visited for site in rest)
+                bound = math.inf
+            yield bound, sites
+            if bound == math.inf:
+                return
+
+    # Группы точек на одинаковом расстоянии по его возрастанию
+    def _by_distance(self, latitude: float, longitude: float,
+                     radius_km: Optional[float]) -> Iterator[Tuple[float, List[_Site]]]:
+        heap: List[Tuple[float, int, _Site]] = []
+        order = itertools.count()
+        for bound, sites in self._rings(latitude, longitude):
+            for site in sites:
+                distance = haversine_km(latitude, longitude, site.latitude, site.longitude)
+                if radius_km is None or distance <= radius_km:
+                    heapq.heappush(heap, (distance, next(order), site))
+            while heap and heap[0][0] < bound:
+                distance, _, site = heapq.heappop(heap)
+                group = [site]
+                while heap and heap[0][0] == distance:
+                    group.append(heapq.heappop(heap)[2])
+                yield distance, group
+            if radius_km is not None and bound > radius_km:
+                return
+
+    def nearest(self, db: Session, latitude: float, longitude: float, limit: int, after: Optional[Ranked] = None,
+                radius_km: Optional[float] = None, category: Optional[str] = None,
+                type: Optional[str] = None) -> List[Ranked]:
+        if not -180 <= longitude < 180:
+            longitude = (longitude + 180) % 360 - 180
+        ranked: List[Ranked] = []
+        with self._lock:
+            for distance, sites in self._by_distance(latitude, longitude, radius_km):
+                if after is not None and distance < after[0]:
+                    continue
+                start = after[1] if after is not None and distance == after[0] else None
+                streams = [site.matching(start, category, type) for site in sites]
+                for advertisement_id in streams[0] if len(streams) == 1 else heapq.merge(*streams):
+                    ranked.append((distance, advertisement_id))
+                    if len(ranked) == limit:
+                        return ranked
+        return ranked
+
+
+def _create_backend() -> GeoBackend:
+    if settings.GEO_BACKEND == "memory":
+        return GridGeoBackend(settings.GEO_CELL_DEGREES)
+    if settings.GEO_BACKEND == "postgres":
+        return PostgresGeoBackend()
+    raise ValueError(f"Unknown GEO_BACKEND: {settings.GEO_BACKEND}")
+
+
+geo_backend = _create_backend()
+
+if isinstance(geo_backend, GridGeoBackend):
+    registry.gauge("geo_index_advertisements", "Обьявлений в сетке поиска ближайших", lambda: len(geo_backend))
+
+
+def _geo_key(snapshot: Optional[dict]) -> Optional[tuple]:
+    if snapshot is None:
+        return None
+    return snapshot.get("latitude"), snapshot.get("longitude"), snapshot["category"], snapshot["type"]
+
+
+# Сетка своя у каждого воркера: записи других воркеров приходят из ленты событий
+@on_advertisement_change
+@on_remote_advertisement_change
+def _update_geo_index(action: str, current: Optional[dict], previous: Optional[dict]) -> None:
+    if _geo_key(current) != _geo_key(previous):
+        geo_backend.update(current, previous)
+
+
+on_remote_reset(geo_backend.rebuild)
+
+
+def _geocode(target: Advertisement) -> None:
+    target.latitude, target.longitude = gazetteer.lookup(target.location) or (None, None)
+
+
+# ORM-путь (сессии, заполнение данными) - координаты как у Core-записи (with_coordinates)
+@event.listens_for(Advertisement, "before_insert")
+def _geocode_on_insert(mapper, connection, target):
+    if target.latitude is None:
+        _geocode(target)
+
+
+@event.listens_for(Advertisement, "before_update")
+def _geocode_on_update(mapper, connection, target):
+    if inspect(target).attrs.location.history.has_changes():
+        _geocode(target)
+
+
+# Точка запроса: координаты или название пункта из справочника
+def resolve_point(lat: Optional[float], lon: Optional[float], near: Optional[str]) -> Point:
+    if near is not None:
+        point = gazetteer.lookup(near)
+        if point is None:
+            raise HTTPException(status_code=404, detail="Населенный пункт не найден в справочнике")
+        return point
+    if lat is None or lon is None:
+        raise HTTPException(status_code=400, detail="Нужны lat и lon или near")
+    return lat, lon
+
+
+def nearby_page(db: Session, point: Point, limit: int, cursor: Optional[str] = None,
+                radius_km: Optional[float] = None, category: Optional[str] = None,
+                type: Optional[str] = None) -> dict:
+    after = decode_distance_cursor(cursor) if cursor is not None else None
+    ranked = geo_backend.nearest(db, point[0], point[1], limit + 1, after, radius_km, category, type)
+    distances = {advertisement_id: distance for distance, advertisement_id in ranked}
+    items = rows_to_dicts(_load_ordered(db, [advertisement_id for _, advertisement_id in ranked[:limit]]))
+    for item in items:
+        item["distance_km"] = round(distances[item["id"]], 3)
+    next_cursor = encode_distance_cursor(*ranked[limit - 1]) if len(ranked) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,124 @@
+# hashing.py
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from config import settings
+from .metrics import registry
+
+
+@lru_cache(maxsize=None)
+def _context(rounds: int) -> CryptContext:
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+# Выполняются в процессах пула: возвращают результат и время начала/конца работы
+def _hash(password: str, rounds: int) -> Tuple[str, float, float]:
+    started = time.time()
+    hashed = _context(rounds).hash(password)
+    return hashed, started, time.time()
+
+
+def _verify_and_update(password: str, hashed: str, rounds: int) -> Tuple[Tuple[bool, Optional[str]], float, float]:
+    started = time.time()
+    # new_hash не None, если хэш создан с другой стоимостью или устаревшей схемой
+    result = _context(rounds).verify_and_update(password, hashed)
+    return result, started, time.time()
+
+
+class PasswordHasher:
+    # bcrypt в отдельном пуле процессов с собственной очередью: вход/регистрация
+    # не занимают потоки запросов и не тормозят чтение
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.pending = 0
+        self.rejected = 0
+        self.queue_wait = registry.histogram(
+            "password_hash_queue_wait_seconds", "Ожидание задачи bcrypt в очереди пула процессов").labels()
+        self.hash_time = registry.histogram(
+            "password_hash_seconds", "Время вычисления bcrypt в процессе пула").labels()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    # Пул создается лениво: gunicorn форкает воркеры после импорта приложения
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Сервис перегружен, повторите попытку позже",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+
+    def _submit(self, fn, *args) -> Future:
+        self._admit()
+        submitted = time.time()
+        future = self._get_executor().submit(fn, *args)
+        future.add_done_callback(lambda f: self._finish(f, submitted))
+        return future
+
+    def _finish(self, future: Future, submitted: float) -> None:
+        with self._lock:
+            self.pending -= 1
+        if future.cancelled() or future.exception() is not None:
+            return
+        _, started, finished = future.result()
+        self.queue_wait.observe(max(started - submitted, 0.0))
+        self.hash_time.observe(finished - started)
+
+    def hash_sync(self, password: str) -> str:
+        return self._submit(_hash, password, self.rounds).result()[0]
+
+    def verify_and_update_sync(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        return self._submit(_verify_and_update, password, hashed, self.rounds).result()[0]
+
+    async def hash(self, password: str) -> str:
+        future = self._submit(_hash, password, self.rounds)
+        return (await asyncio.wrap_future(future))[0]
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        future = self._submit(_verify_and_update, password, hashed, self.rounds)
+        return (await asyncio.wrap_future(future))[0]
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+            "hash_seconds": self.hash_time.snapshot(),
+        }
+
+
+password_hasher = PasswordHasher(
+    workers=settings.HASH_WORKERS,
+    max_pending=settings.HASH_MAX_PENDING,
+    rounds=settings.BCRYPT_ROUNDS,
+)
+
+registry.gauge("password_hash_queue_depth", "Задачи bcrypt в очереди и в работе",
+               lambda: password_hasher.pending)
+registry.counter("password_hash_rejected_total", "Отказы 503 из-за переполненной очереди bcrypt",
+                 lambda: password_hasher.rejected)
@@ -0,0 +1,76 @@
+# hooks.py
+import logging
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Слушатель получает действие (created/updated/deleted) и снимки обьявления
+# после и до изменения (см. serialization.advertisement_to_dict)
+AdvertisementListener = Callable[[str, Optional[dict], Optional[dict]], None]
+
+_advertisement_listeners: List[AdvertisementListener] = []
+
+
+def on_advertisement_change(listener: AdvertisementListener) -> AdvertisementListener:
+    _advertisement_listeners.append(listener)
+    return listener
+
+
+# Вызывается маршрутами после коммита; ошибка слушателя не должна ломать уже записанный ответ
+def notify_advertisement_change(action: str, current: Optional[dict], previous: Optional[dict] = None) -> None:
+    for listener in _advertisement_listeners:
+        try:
+            listener(action, current, previous)
+        except Exception:
+            logger.exception("advertisement listener %r failed", listener)
+
+
+# Изменения, записанные другими процессами (приходят по LISTEN из ленты событий, app/events.py).
+# На них подписываются кэши и индексы в памяти процесса - те же снимки, что и после своей записи
+_remote_listeners: List[AdvertisementListener] = []
+# Вызываются, когда часть чужих изменений могла потеряться (разрыв соединения LISTEN):
+# состояние в памяти строится заново по сессии БД
+_reset_listeners: List[Callable[[Session], None]] = []
+# Ключи кэшей, сброшенные в другом процессе не по изменению обьявления (например, профиль пользователя)
+_invalidation_listeners: List[Callable[[List[str]], None]] = []
+
+
+def on_remote_advertisement_change(listener: AdvertisementListener) -> AdvertisementListener:
+    _remote_listeners.append(listener)
+    return listener
+
+
+def on_remote_reset(listener: Callable[[Session], None]) -> Callable[[Session], None]:
+    _reset_listeners.append(listener)
+    return listener
+
+
+def on_remote_invalidation(listener: Callable[[List[str]], None]) -> Callable[[List[str]], None]:
+    _invalidation_listeners.append(listener)
+    return listener
+
+
+def notify_remote_advertisement_change(action: str, current: Optional[dict], previous: Optional[dict]) -> None:
+    for listener in _remote_listeners:
+        try:
+            listener(action, current, previous)
+        except Exception:
+            logger.exception("remote advertisement listener %r failed", listener)
+
+
+def notify_remote_reset(db: Session) -> None:
+    for listener in _reset_listeners:
+        try:
+            listener(db)
+        except Exception:
+            logger.exception("remote reset listener %r failed", listener)
+
+
+def notify_remote_invalidation(keys: List[str]) -> None:
+    for listener in _invalidation_listeners:
+        try:
+            listener(keys)
+        except Exception:
+            logger.exception("remote invalidation listener %r failed", listener)
@@ -0,0 +1,228 @@
+# ingest.py
+import csv
+import io
+import json
+from typing import AsyncIterator, List, Tuple
+
+from fastapi import APIRouter, Depends, Request
+from pydantic import ValidationError
+from sqlalchemy import insert, text
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from database import get_db
+from models.models import Advertisement
+from .auth import get_current_user
+from .gazetteer import with_coordinates
+from .hooks import notify_advertisement_change
+from .instrumentation import InstrumentedRoute
+from .owner_feed import update_owner_counts
+from .schemas import AdvertisementBase, Principal
+from .serialization import ADVERTISEMENT_COLUMNS, ADVERTISEMENT_FIELDS, row_snapshot
+from .stats import update_advertisement_stats
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+INGEST_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+INGEST_FIELDS = ("title", "description", "type", "category", "price", "location", "latitude", "longitude", "owner_id")
+
+# Промежуточная таблица живет в соединении, строки очищаются при каждом коммите
+_CREATE_STAGING = (
+    "CREATE TEMP TABLE IF NOT EXISTS advertisements_ingest ("
+    "title varchar, description varchar, type varchar, category varchar, "
+    "price numeric(12, 2), location varchar, latitude double precision, longitude double precision, owner_id integer"
+    ") ON COMMIT DELETE ROWS"
+)
+_COPY_STAGING = f"COPY advertisements_ingest ({', '.join(INGEST_FIELDS)}) FROM STDIN WITH (FORMAT csv)"
+_MOVE_STAGING = (
+    f"INSERT INTO advertisements ({', '.join(INGEST_FIELDS)}) "
+    f"SELECT {', '.join(INGEST_FIELDS)} FROM advertisements_ingest "
+    f"RETURNING {', '.join(ADVERTISEMENT_FIELDS)}"
+)
+
+
+class IngestReport:
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+
+    def fail(self, line: int, errors) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "errors": errors})
+
+    def as_dict(self) -> dict:
+        return {
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+async def _iter_lines(request: Request) -> AsyncIterator[Tuple[int, str]]:
+    pending = b""
+    number = 0
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            number += 1
+            yield number, line.decode("utf-8-sig" if number == 1 else "utf-8", errors="replace").rstrip("\r")
+    if pending:
+        yield number + 1, pending.decode("utf-8-sig" if number == 0 else "utf-8", errors="replace").rstrip("\r")
+
+
+async def _iter_ndjson(request: Request) -> AsyncIterator[Tuple[int, object]]:
+    async for number, line in _iter_lines(request):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as error:
+            yield number, error
+
+
+# Запись CSV закончена, когда число кавычек в ней четное: так поля с переводами строк
+# внутри кавычек собираются из нескольких физических строк
+async def _iter_csv(request: Request) -> AsyncIterator[Tuple[int, object]]:
+    header = None
+    record, start = "", 0
+    async for number, line in _iter_lines(request):
+        record = f"{record}\n{line}" if record else line
+        start = start or number
+        if record.count('"') % 2:
+            continue
+        if record.strip():
+            values = next(csv.reader([record]))
+            if header is None:
+                header = values
+            else:
+                yield start, dict(zip(header, values))
+        record, start = "", 0
+    if record:
+        yield start, ValueError("незакрытая кавычка в CSV")
+
+
+def _validation_errors(error: Exception) -> list:
+    if isinstance(error, ValidationError):
+        return [
+            {"field": ".".join(map(str, item["loc"])), "message": item["msg"]}
+            for item in error.errors(include_url=False)
+        ]
+    return [{"field": None, "message": str(error)}]
+
+
+# В COPY CSV пустое поле без кавычек - NULL, "" - пустая строка. csv.writer пишет оба как пустое
+# поле, поэтому строки всегда в кавычках, а None - пустое поле (как NULL у executemany)
+def _csv_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+
+def _copy_batch(db: Session, rows: List[dict]) -> List[dict]:
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(",".join(_csv_value(row[field]) for field in INGEST_FIELDS) + "\n")
+    buffer.seek(0)
+    connection = db.connection()
+    connection.exec_driver_sql(_CREATE_STAGING)
+    dbapi_error = connection.dialect.loaded_dbapi.Error
+    with connection.connection.cursor() as cursor:
+        try:
+            cursor.copy_expert(_COPY_STAGING, buffer)
+        except dbapi_error as error:
+            # Ошибка сырого курсора - в исключения SQLAlchemy, как у остальных запросов пакета
+            raise DBAPIError.instance(_COPY_STAGING, None, error, dbapi_error) from error
+    return [row_snapshot(row) for row in connection.execute(text(_MOVE_STAGING))]
+
+
+def _executemany_batch(db: Session, rows: List[dict]) -> List[dict]:
+    result = db.execute(insert(Advertisement).returning(*ADVERTISEMENT_COLUMNS), rows)
+    return [row_snapshot(row) for row in result]
+
+
+# Postgres - COPY через промежуточную таблицу, остальные диалекты - executemany
+def insert_batch(db: Session, rows: List[dict]) -> List[dict]:
+    rows = [with_coordinates(row) for row in rows]
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            snapshots = _copy_batch(db, rows)
+        else:
+            snapshots = _executemany_batch(db, rows)
+        update_owner_counts(db, (snapshot["owner_id"] for snapshot in snapshots))
+        update_advertisement_stats(db, ((snapshot, None) for snapshot in snapshots))
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+    return snapshots
+
+
+def _error_message(error: SQLAlchemyError) -> list:
+    return [{"field": None, "message": str(getattr(error, "orig", None) or error)}]
+
+
+# Пакет, отвергнутый базой из-за данных (ограничения, переполнение числа), делится пополам, пока
+# ошибка не сведется к конкретным строкам: остальные строки пакета загружаются, в отчет попадают
+# только виноватые. Прочие ошибки (соединение, таймаут) валят эти строки целиком
+def insert_rows(db: Session, rows: List[dict], lines: List[int], report: IngestReport) -> List[dict]:
+    try:
+        return insert_batch(db, rows)
+    except (DataError, IntegrityError) as error:
+        if len(rows) == 1:
+            report.fail(lines[0], _error_message(error))
+            return []
+    except SQLAlchemyError as error:
+        for line in lines:
+            report.fail(line, _error_message(error))
+        return []
+    middle = len(rows) // 2
+    return (insert_rows(db, rows[:middle], lines[:middle], report)
+            + insert_rows(db, rows[middle:], lines[middle:], report))
+
+
+#МАССОВАЯ ЗАГРУЗКА ОБЬЯВЛЕНИЙ .. NDJSON ИЛИ CSV (Content-Type: text/csv), ТРЕБУЕТСЯ ТОКЕН
+#НЕВАЛИДНЫЕ СТРОКИ ПОПАДАЮТ В ОТЧЕТ, ОСТАЛЬНЫЕ ЗАГРУЖАЮТСЯ
+@router.post("/advertisements/bulk/")
+async def ingest_advertisements(
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    content_type = request.headers.get("content-type", "")
+    records = _iter_csv(request) if content_type.startswith("text/csv") else _iter_ndjson(request)
+    report = IngestReport()
+    batch: List[dict] = []
+    lines: List[int] = []
+
+    async def flush():
+        snapshots = await run_in_threadpool(insert_rows, db, batch, lines, report)
+        report.inserted += len(snapshots)
+        for snapshot in snapshots:
+            notify_advertisement_change("created", snapshot)
+
+    async for line, record in records:
+        try:
+            if isinstance(record, Exception):
+                raise record
+            if not isinstance(record, dict):
+                raise ValueError("ожидается обьект")
+            advertisement = AdvertisementBase.model_validate(record)
+        except (ValidationError, ValueError) as error:
+            report.fail(line, _validation_errors(error))
+            continue
+        batch.append({**advertisement.model_dump(), "owner_id": current_user.id})
+        lines.append(line)
+        if len(batch) >= INGEST_BATCH_SIZE:
+            await flush()
+            batch, lines = [], []
+    if batch:
+        await flush()
+    return report.as_dict()
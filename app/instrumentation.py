@@ -0,0 +1,210 @@
+# instrumentation.py
+import functools
+import inspect
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from config import settings
+from .metrics import COUNT_BUCKETS, registry
+
+logger = logging.getLogger("app.instrumentation")
+
+UNMATCHED_ROUTE = "unmatched"
+
+request_duration = registry.histogram(
+    "http_request_duration_seconds", "Время обработки запроса, включая отдачу тела", ("method", "route"))
+request_queries = registry.histogram(
+    "db_queries_per_request", "Число SQL-запросов на запрос", ("method", "route"), buckets=COUNT_BUCKETS)
+request_query_time = registry.histogram(
+    "db_query_seconds_per_request", "Суммарное время SQL-запросов на запрос", ("method", "route"))
+request_pool_wait = registry.histogram(
+    "db_pool_wait_seconds_per_request", "Суммарное ожидание соединения из пула на запрос", ("method", "route"))
+request_serialization = registry.histogram(
+    "response_serialization_seconds", "Валидация и сериализация ответа после эндпоинта", ("method", "route"))
+
+
+class RequestStats:
+    def __init__(self, method: str):
+        self.method = method
+        self.route = UNMATCHED_ROUTE
+        self.queries = 0
+        self.query_time = 0.0
+        self.pool_wait = 0.0
+        self.serialization = 0.0
+        self.endpoint_finished: Optional[float] = None
+        self.statements: Counter = Counter()
+
+
+# Обьект статистики общий для запроса: контекст копируется в пул потоков
+# и в greenlet асинхронного движка, но ссылается на тот же RequestStats
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def record_query(statement: str, elapsed: float) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_time += elapsed
+        stats.statements[statement] += 1
+    if settings.APP_ENV == "dev" and elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        route = stats.route if stats is not None else "-"
+        logger.warning("медленный запрос %.1f ms [%s]\n%s", elapsed * 1000, route, statement)
+
+
+def record_pool_wait(elapsed: float) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.pool_wait += elapsed
+
+
+def instrument_engine(engine) -> None:
+    # Для AsyncEngine события вешаются на его sync_engine
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        record_query(statement, time.perf_counter() - conn.info["query_started"].pop())
+
+
+pool_checkout = registry.histogram(
+    "db_pool_checkout_seconds", "Ожидание соединения из пула", ("pool",))
+_pool_timeouts: Counter = Counter()
+# Движки по имени пула (pool_logging_name): насыщенность читается из engine.pool при рендеринге,
+# поэтому метрики переживают engine.dispose(), который пересоздает пул
+_engines: Dict[str, object] = {}
+
+
+def register_pool(name: str, engine) -> None:
+    _engines[name] = engine
+
+
+def _pool_gauge(read):
+    return lambda: {(name,): read(engine.pool) for name, engine in _engines.items()
+                    if isinstance(engine.pool, QueuePool)}
+
+
+registry.gauge("db_pool_size", "Постоянный размер пула", _pool_gauge(lambda pool: pool.size()), ("pool",))
+registry.gauge("db_pool_checked_out", "Соединения, выданные из пула", _pool_gauge(lambda pool: pool.checkedout()), ("pool",))
+registry.gauge("db_pool_overflow", "Соединения сверх pool_size (отрицательное - еще не открытые)",
+               _pool_gauge(lambda pool: pool.overflow()), ("pool",))
+registry.gauge("db_pool_saturation", "Доля занятых соединений от pool_size + max_overflow",
+               _pool_gauge(lambda pool: pool.checkedout() / max(pool.size() + pool._max_overflow, 1)), ("pool",))
+registry.counter("db_pool_timeouts_total", "Запросы, не дождавшиеся соединения за pool_timeout",
+                 lambda: {(name,): _pool_timeouts[name] for name in _engines}, ("pool",))
+
+
+# Ожидание в connect() включает и открытие нового соединения, если пул еще не заполнен
+class _TimedCheckout:
+    def connect(self):
+        name = getattr(self, "logging_name", None) or "default"
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            _pool_timeouts[name] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            pool_checkout.labels(name).observe(elapsed)
+            record_pool_wait(elapsed)
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def _timed_endpoint(endpoint):
+    def finished():
+        stats = _current.get()
+        if stats is not None:
+            stats.endpoint_finished = time.perf_counter()
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                finished()
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                finished()
+    return wrapper
+
+
+class InstrumentedRoute(APIRoute):
+    # Эндпоинт помечает время своего завершения; все, что обработчик FastAPI делает
+    # после него (response_model, jsonable_encoder, рендер JSON), считается сериализацией
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        route = self.path_format
+
+        async def instrumented_handler(request):
+            stats = _current.get()
+            if stats is not None:
+                stats.route = route
+            response = await handler(request)
+            if stats is not None and stats.endpoint_finished is not None:
+                stats.serialization = time.perf_counter() - stats.endpoint_finished
+            return response
+
+        return instrumented_handler
+
+
+def _report_n_plus_one(stats: RequestStats) -> None:
+    for statement, count in stats.statements.items():
+        if count >= settings.N_PLUS_ONE_THRESHOLD:
+            logger.warning("возможный N+1: %d одинаковых запросов [%s %s]\n%s",
+                           count, stats.method, stats.route, statement)
+
+
+class InstrumentationMiddleware:
+    # Чистый ASGI: в отличие от BaseHTTPMiddleware не буферизует потоковые ответы
+    # и учитывает запросы, выполненные при отдаче тела StreamingResponse
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats(scope["method"])
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+            labels = (stats.method, stats.route)
+            request_duration.labels(*labels).observe(time.perf_counter() - started)
+            request_queries.labels(*labels).observe(stats.queries)
+            request_query_time.labels(*labels).observe(stats.query_time)
+            request_pool_wait.labels(*labels).observe(stats.pool_wait)
+            request_serialization.labels(*labels).observe(stats.serialization)
+            if settings.APP_ENV == "dev":
+                _report_n_plus_one(stats)
@@ -0,0 +1,32 @@
+# locks.py
+# Фоновые задачи, которые должен выполнять один процесс из всех воркеров и контейнеров
+import zlib
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+
+def lock_key(name: str) -> int:
+    return zlib.crc32(name.encode())
+
+
+# Сессионная advisory-блокировка Postgres на отдельном соединении: держится, пока открыт блок,
+# и снимается сервером сама, если процесс умер. Не получили - yield False, ждать не нужно.
+# На других СУБД (SQLite в бенчмарках) процесс один, блокировка считается взятой
+@contextmanager
+def advisory_lock(bind: Engine, name: str) -> Iterator[bool]:
+    if bind.dialect.name != "postgresql":
+        yield True
+        return
+    key = lock_key(name)
+    with bind.connect() as connection:
+        acquired = connection.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": key})
+        connection.commit()
+        try:
+            yield acquired
+        finally:
+            if acquired and not connection.closed:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+                connection.commit()
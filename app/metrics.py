@@ -0,0 +1,130 @@
+# metrics.py
+import bisect
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+# Границы корзин в секундах, как у prometheus_client по умолчанию
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative, total = [], 0
+            for count in self.counts:
+                total += count
+                cumulative.append(total)
+            return {
+                "buckets": dict(zip([*map(_format, self.buckets), "+Inf"], cumulative)),
+                "sum": self.sum,
+                "count": self.count,
+            }
+
+
+class HistogramFamily:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._children: Dict[Tuple[str, ...], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str) -> Histogram:
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, Histogram(self.buckets))
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, child in sorted(self._children.items()):
+            labels = list(zip(self.labelnames, values))
+            snapshot = child.snapshot()
+            for bound, count in snapshot["buckets"].items():
+                lines.append(f"{self.name}_bucket{_labels(labels + [('le', bound)])} {count}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_format(snapshot['sum'])}")
+            lines.append(f"{self.name}_count{_labels(labels)} {snapshot['count']}")
+        return lines
+
+
+# Значение снимается в момент рендеринга: функция возвращает число или {значения меток: число}
+GaugeValue = Union[float, Dict[Tuple[str, ...], float]]
+
+
+class CallbackMetric:
+    def __init__(self, name: str, help: str, kind: str, labelnames: Sequence[str],
+                 callback: Callable[[], GaugeValue]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        value = self.callback()
+        if not isinstance(value, dict):
+            value = {(): value}
+        for values, number in sorted(value.items()):
+            lines.append(f"{self.name}{_labels(list(zip(self.labelnames, values)))} {_format(number)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> HistogramFamily:
+        return self._metrics.setdefault(name, HistogramFamily(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, callback: Callable[[], GaugeValue],
+              labelnames: Sequence[str] = ()) -> CallbackMetric:
+        return self._metrics.setdefault(name, CallbackMetric(name, help, "gauge", labelnames, callback))
+
+    # Счетчики, которые модули и так ведут у себя (hits, rejected): значение читается при рендеринге
+    def counter(self, name: str, help: str, callback: Callable[[], GaugeValue],
+                labelnames: Sequence[str] = ()) -> CallbackMetric:
+        return self._metrics.setdefault(name, CallbackMetric(name, help, "counter", labelnames, callback))
+
+    # Текстовый формат экспозиции Prometheus 0.0.4
+    def render(self) -> str:
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+
+def _format(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() and abs(value) < 1e15 else repr(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+registry = Registry()
@@ -0,0 +1,72 @@
+# owner_feed.py
+from collections import Counter
+from typing import Iterable, List, Optional
+
+from sqlalchemy import event, select, true, update
+
+from models.models import Advertisement, User
+from .pagination import apply_keyset, encode_cursor
+from .serialization import ADVERTISEMENT_COLUMNS, row_snapshot
+
+
+# Одна выборка: строка пользователя (существует ли он и его счетчик) LEFT JOIN страница его обьявлений.
+# Страница - подзапрос по индексу (owner_id, created_at, id), снаружи сортируется только limit + 1 строк
+def build_owner_feed_statement(user_id: int, cursor: Optional[str], limit: int):
+    page = apply_keyset(select(*ADVERTISEMENT_COLUMNS).where(Advertisement.owner_id == user_id), cursor)
+    page = page.limit(limit + 1).subquery()
+    return (
+        select(User.advertisement_count, *page.c)
+        .select_from(User)
+        .outerjoin(page, true())
+        .where(User.id == user_id)
+        .order_by(page.c.created_at.desc(), page.c.id.desc())
+    )
+
+
+# None - пользователя нет; иначе страница в виде, пригодном для кэша чтения
+def owner_feed_page(rows: Iterable, limit: int) -> Optional[dict]:
+    rows = list(rows)
+    if not rows:
+        return None
+    items: List[dict] = [row_snapshot(row[1:]) for row in rows if row.id is not None]
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return {"items": items, "next_cursor": next_cursor, "count": rows[0].advertisement_count}
+
+
+def owner_feed_headers(page: dict) -> dict:
+    headers = {"X-Total-Count": str(page["count"])}
+    if page["next_cursor"] is not None:
+        headers["X-Next-Cursor"] = page["next_cursor"]
+    return headers
+
+
+def owner_count_statement(owner_id: int, delta: int):
+    return (
+        update(User.__table__)
+        .where(User.__table__.c.id == owner_id)
+        .values(advertisement_count=User.__table__.c.advertisement_count + delta)
+    )
+
+
+# Массовая загрузка идет мимо ORM-событий: счетчики обновляются одним UPDATE на владельца в пачке
+def update_owner_counts(connection, owner_ids: Iterable[Optional[int]], sign: int = 1) -> None:
+    for owner_id, count in Counter(owner_ids).items():
+        if owner_id is not None:
+            connection.execute(owner_count_statement(owner_id, sign * count))
+
+
+# Счетчик меняется в той же транзакции, что и сама вставка/удаление обьявления
+@event.listens_for(Advertisement, "after_insert")
+def _count_created(mapper, connection, target):
+    if target.owner_id is not None:
+        connection.execute(owner_count_statement(target.owner_id, 1))
+
+
+@event.listens_for(Advertisement, "after_delete")
+def _count_deleted(mapper, connection, target):
+    if target.owner_id is not None:
+        connection.execute(owner_count_statement(target.owner_id, -1))
@@ -0,0 +1,98 @@
+# pagination.py
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+from models.models import Advertisement
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+# Курсор непрозрачен для клиента: это base64 от пары (created_at, id) последней выданной строки
+def encode_cursor(created_at: datetime, advertisement_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), advertisement_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, advertisement_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(advertisement_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+# Фильтры по равенству, общие для всех списков обьявлений
+def apply_filters(statement, category: Optional[str] = None, type: Optional[str] = None,
+                  location: Optional[str] = None, owner_id: Optional[int] = None):
+    if category is not None:
+        statement = statement.where(Advertisement.category == category)
+    if type is not None:
+        statement = statement.where(Advertisement.type == type)
+    if location is not None:
+        statement = statement.where(Advertisement.location == location)
+    if owner_id is not None:
+        statement = statement.where(Advertisement.owner_id == owner_id)
+    return statement
+
+
+# Keyset-пагинация: от новых к старым по (created_at, id), без OFFSET
+def apply_keyset(statement, cursor: Optional[str] = None):
+    if cursor is not None:
+        created_at, advertisement_id = decode_cursor(cursor)
+        statement = statement.where(
+            tuple_(Advertisement.created_at, Advertisement.id) < tuple_(created_at, advertisement_id),
+            # Избыточное условие для планировщика: по сравнению кортежей партиции не отсекаются
+            Advertisement.created_at <= created_at,
+        )
+    return statement.order_by(Advertisement.created_at.desc(), Advertisement.id.desc())
+
+
+# Курсор для сортировки по цене: пара (price, id), цена передается строкой без потери точности
+def encode_price_cursor(price: Decimal, advertisement_id: int) -> str:
+    raw = json.dumps([str(price), advertisement_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_price_cursor(cursor: str) -> Tuple[Decimal, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        price, advertisement_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return Decimal(price), int(advertisement_id)
+    except (ValueError, TypeError, InvalidOperation):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+# Строки без цены в сортировку по цене не попадают
+def apply_price_keyset(statement, cursor: Optional[str] = None, descending: bool = False):
+    statement = statement.where(Advertisement.price.isnot(None))
+    key = tuple_(Advertisement.price, Advertisement.id)
+    if cursor is not None:
+        price, advertisement_id = decode_price_cursor(cursor)
+        bound = tuple_(price, advertisement_id)
+        statement = statement.where(key < bound if descending else key > bound)
+    if descending:
+        return statement.order_by(Advertisement.price.desc(), Advertisement.id.desc())
+    return statement.order_by(Advertisement.price.asc(), Advertisement.id.asc())
+
+
+# Курсор поиска ближайших: пара (расстояние в км, id); float в JSON переживает круговой путь без потерь
+def encode_distance_cursor(distance: float, advertisement_id: int) -> str:
+    raw = json.dumps([distance, advertisement_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_distance_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        distance, advertisement_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(distance), int(advertisement_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
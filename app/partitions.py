@@ -0,0 +1,248 @@
+# partitions.py
+# Обслуживание секционированной таблицы advertisements (миграция a6c1e4f8b327): помесячные
+# партиции заранее, устаревшие - отключаются и по желанию выгружаются в архив.
+#
+#   python -m app.partitions --months-ahead 3 --retention-months 12 --expired archive
+import argparse
+import gzip
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from config import settings
+from database import engine
+from .events import publish_reset
+from .locks import advisory_lock
+from .stats import stats_reconciler
+
+logger = logging.getLogger(__name__)
+
+PARENT = "advertisements"
+DEFAULT_PARTITION = "advertisements_default"
+# Advisory-блокировка: обслуживание (DDL партиций) идет в одном процессе
+MAINTENANCE_LOCK = "partition_maintenance"
+# Колонки без генерируемой search_vector - для переноса и выгрузки строк
+COLUMNS = (
+    "id, title, description, owner_id, type, category, price, location, latitude, longitude, created_at, updated_at"
+)
+
+_BOUND_RE = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+class Partition(NamedTuple):
+    name: str
+    start: Optional[datetime]  # None - MINVALUE (партиция legacy)
+    end: Optional[datetime]
+
+
+def month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value: datetime) -> datetime:
+    return month_start(month_start(value) + timedelta(days=32))
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    value = month_start(value)
+    for _ in range(abs(months)):
+        value = next_month(value) if months > 0 else month_start(value - timedelta(days=1))
+    return value
+
+
+def partition_name(start: datetime) -> str:
+    return f"{PARENT}_p{start:%Y_%m}"
+
+
+def _parse_bound(value: str) -> Optional[datetime]:
+    if value == "MINVALUE" or value == "MAXVALUE":
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+def list_partitions(conn: Connection) -> List[Partition]:
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = CAST(:parent AS regclass)"
+    ), {"parent": PARENT})
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND_RE.search(bound)
+        if match is None:  # DEFAULT
+            continue
+        partitions.append(Partition(name, _parse_bound(match.group(1)), _parse_bound(match.group(2))))
+    return sorted(partitions, key=lambda partition: partition.end or datetime.max)
+
+
+def _covered(partitions: List[Partition], start: datetime) -> bool:
+    return any(
+        (partition.start is None or partition.start <= start) and (partition.end is None or start < partition.end)
+        for partition in partitions
+    )
+
+
+def _create_partition(conn: Connection, start: datetime, end: datetime) -> None:
+    name = partition_name(start)
+    bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    stray = conn.execute(text(
+        f"SELECT count(*) FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end"
+    ), {"start": start, "end": end}).scalar()
+    if not stray:
+        conn.execute(text(f"CREATE TABLE {name} PARTITION OF {PARENT} FOR VALUES {bounds}"))
+        return
+    # Партицию не создали вовремя и строки легли в DEFAULT: переносим их в новую таблицу
+    # и только потом подключаем ее (иначе CREATE ... PARTITION OF упадет на проверке DEFAULT)
+    logger.warning("moving %d rows from %s to %s", stray, DEFAULT_PARTITION, name)
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING STORAGE)"))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end "
+        f"RETURNING {COLUMNS}) INSERT INTO {name} ({COLUMNS}) SELECT {COLUMNS} FROM moved"
+    ), {"start": start, "end": end})
+    conn.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+
+
+# Партиции на текущий и months_ahead следующих месяцев; уже существующие не трогаются
+def ensure_future_partitions(conn: Connection, months_ahead: int, now: Optional[datetime] = None) -> List[str]:
+    partitions = list_partitions(conn)
+    start = month_start(now or datetime.now())
+    created = []
+    for _ in range(months_ahead + 1):
+        end = next_month(start)
+        if not _covered(partitions, start):
+            _create_partition(conn, start, end)
+            created.append(partition_name(start))
+        start = end
+    return created
+
+
+def expired_partitions(conn: Connection, retention_months: int, now: Optional[datetime] = None) -> List[Partition]:
+    cutoff = add_months(now or datetime.now(), -retention_months)
+    return [partition for partition in list_partitions(conn) if partition.end is not None and partition.end <= cutoff]
+
+
+# Отключение партиции вместе с ее вкладом в счетчики обьявлений владельцев - одной транзакцией
+def detach_partition(conn: Connection, partition: Partition) -> None:
+    conn.execute(text(
+        f"UPDATE users SET advertisement_count = users.advertisement_count - expired.total "
+        f"FROM (SELECT owner_id, count(*) AS total FROM {partition.name} GROUP BY owner_id) AS expired "
+        f"WHERE expired.owner_id = users.id"
+    ))
+    conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {partition.name}"))
+
+
+# Архив - CSV в gzip с заголовком, колонки как у выгрузки; таблица удаляется только после записи файла
+def archive_table(name: str, archive_dir: str) -> str:
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    raw = engine.raw_connection()
+    try:
+        with gzip.open(path + ".tmp", "wb") as file, raw.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY (SELECT {COLUMNS} FROM {name} ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER)", file
+            )
+        raw.commit()
+    finally:
+        raw.close()
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def maintain(months_ahead: int, retention_months: int, expired: str, archive_dir: str, dry_run: bool = False) -> dict:
+    report = {"created": [], "expired": [], "archived": []}
+    with engine.begin() as conn:
+        if dry_run:
+            report["expired"] = [p.name for p in expired_partitions(conn, retention_months)] if retention_months else []
+            return report
+        report["created"] = ensure_future_partitions(conn, months_ahead)
+    if not retention_months:
+        return report
+    with engine.connect() as conn:
+        candidates = expired_partitions(conn, retention_months)
+    for partition in candidates:
+        with engine.begin() as conn:
+            detach_partition(conn, partition)
+        report["expired"].append(partition.name)
+        if expired == "archive":
+            report["archived"].append(archive_table(partition.name, archive_dir))
+        if expired in ("archive", "drop"):
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE {partition.name}"))
+    if candidates:
+        # Агрегаты статистики по отключенным строкам исправляет сверка, индексы и кэши в памяти
+        # воркеров (поиск, сетка ближайших, подсказки) строятся заново - хуки этих строк не видели
+        report["stats_groups_fixed"] = stats_reconciler.run_exclusive()
+        publish_reset()
+    return report
+
+
+class PartitionMaintainer:
+    # Включается PARTITION_MAINTENANCE_SECONDS. Поток есть в каждом воркере (после форка gunicorn),
+    # обслуживает один: DDL партиций идет под advisory-блокировкой, остальные проход пропускают
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def run_once(self) -> Optional[dict]:
+        with advisory_lock(engine, MAINTENANCE_LOCK) as acquired:
+            if not acquired:
+                return None
+            report = maintain(settings.PARTITION_MONTHS_AHEAD, settings.PARTITION_RETENTION_MONTHS,
+                              settings.PARTITION_EXPIRED_ACTION, settings.PARTITION_ARCHIVE_DIR)
+        if report["created"] or report["expired"]:
+            logger.info("partition maintenance: %s", report)
+        return report
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("partition maintenance failed")
+            if self._stopped.wait(self.interval):
+                return
+
+    # Секционирована только таблица в Postgres; interval <= 0 - только python -m app.partitions
+    def start(self) -> None:
+        if self.interval <= 0 or engine.dialect.name != "postgresql":
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="partition-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+partition_maintainer = PartitionMaintainer(settings.PARTITION_MAINTENANCE_SECONDS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание партиций advertisements")
+    parser.add_argument("--months-ahead", type=int, default=settings.PARTITION_MONTHS_AHEAD)
+    parser.add_argument("--retention-months", type=int, default=settings.PARTITION_RETENTION_MONTHS,
+                        help="0 - хранить все")
+    parser.add_argument("--expired", choices=("detach", "archive", "drop"), default=settings.PARTITION_EXPIRED_ACTION,
+                        help="detach - оставить отдельной таблицей, archive - выгрузить в CSV.gz и удалить")
+    parser.add_argument("--archive-dir", default=settings.PARTITION_ARCHIVE_DIR)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    with advisory_lock(engine, MAINTENANCE_LOCK) as acquired:
+        if not acquired:
+            logger.warning("partition maintenance is already running in another process")
+            return
+        report = maintain(args.months_ahead, args.retention_months, args.expired, args.archive_dir, args.dry_run)
+    logger.info("partition maintenance: %s", report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# read_cache.py
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import event
+
+from config import settings
+from models.models import User
+from .cache import CacheBackend, MemoryCacheBackend, create_cache_backend, register_cache
+from .events import publish_invalidation
+from .hooks import on_advertisement_change, on_remote_advertisement_change, on_remote_invalidation, on_remote_reset
+
+
+def advertisement_key(advertisement_id: int) -> str:
+    return f"ad:{advertisement_id}"
+
+
+def user_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def user_advertisements_key(user_id: int) -> str:
+    return f"user_ads:{user_id}"
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+        # Ключ сбросили, пока значение грузилось - результат не кладем в кэш
+        self.invalidated = False
+
+
+class ReadThroughCache:
+    # Кэш со сквозным чтением: при промахе значение грузит ровно один запрос,
+    # остальные конкурентные запросы по тому же ключу ждут его результат
+    def __init__(self, backend: CacheBackend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._async_flights: Dict[str, "asyncio.Future"] = {}
+        self._async_invalidated: set = set()
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return loader()
+        value = self.backend.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = loader()
+            if flight.value is not None and not flight.invalidated:
+                self.backend.set(key, flight.value)
+            return flight.value
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def get_or_load_async(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await loader()
+        value = self.backend.get(key)
+        if value is not None:
+            return value
+        future = self._async_flights.get(key)
+        while future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Отменили ведущий запрос, а не этот: загрузчик ведущего работает с его сессией,
+                # поэтому значение грузит заново этот запрос (или ждет того, кто начал раньше)
+                if not future.cancelled():
+                    raise
+            future = self._async_flights.get(key)
+        future = self._async_flights[key] = asyncio.get_running_loop().create_future()
+        self._async_invalidated.discard(key)
+        try:
+            value = await loader()
+            if value is not None and key not in self._async_invalidated:
+                self.backend.set(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as error:
+            future.set_exception(error)
+            # Исключение уже передано ожидающим; без этого asyncio ругается на непрочитанное исключение
+            future.exception()
+            raise
+        finally:
+            del self._async_flights[key]
+            self._async_invalidated.discard(key)
+
+    def invalidate(self, *keys: str) -> None:
+        for key in keys:
+            self.backend.delete(key)
+            with self._lock:
+                flight = self._flights.get(key)
+                if flight is not None:
+                    flight.invalidated = True
+            if key in self._async_flights:
+                self._async_invalidated.add(key)
+
+
+# Промах кэша грузится с основной базы: строка с отстающей реплики легла бы в кэш на READ_CACHE_TTL
+# и вернула бы то, что сброс кэша только что убрал. С выключенным кэшем чтение остается на реплике.
+# Сессии создаются лениво, соединение берет только та, по которой пошел запрос
+def fill_session(read_db, primary_db):
+    return primary_db if read_cache.enabled else read_db
+
+
+read_cache = ReadThroughCache(
+    register_cache("read", create_cache_backend("read", settings.READ_CACHE_SIZE, settings.READ_CACHE_TTL)),
+    enabled=settings.READ_CACHE_ENABLED,
+)
+
+
+@on_advertisement_change
+def _invalidate_advertisement(action: str, current: Optional[dict], previous: Optional[dict]) -> None:
+    keys = set()
+    for snapshot in (current, previous):
+        if snapshot is not None:
+            keys.add(advertisement_key(snapshot["id"]))
+            keys.add(user_advertisements_key(snapshot["owner_id"]))
+            # В профиле пользователя есть счетчик его обьявлений
+            keys.add(user_key(snapshot["owner_id"]))
+    read_cache.invalidate(*keys)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    keys = (user_key(target.id), user_advertisements_key(target.id))
+    read_cache.invalidate(*keys)
+    if isinstance(read_cache.backend, MemoryCacheBackend):
+        publish_invalidation(*keys)
+
+
+# Кэш в памяти у каждого воркера свой: записи других воркеров сбрасывают его через ленту событий.
+# Redis общий, его уже сбросил записавший процесс
+if isinstance(read_cache.backend, MemoryCacheBackend):
+    on_remote_advertisement_change(_invalidate_advertisement)
+    on_remote_invalidation(lambda keys: read_cache.invalidate(*keys))
+    on_remote_reset(lambda db: read_cache.backend.clear())
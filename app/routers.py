@@ -1,85 +1,56 @@
 # routers.py
-from urllib.request import Request
-from fastapi import APIRouter, Depends, HTTPException, Header, status
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, status
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from flask import app
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from database import SessionLocal, get_db
-from .schemas import TokenData, UserBase, UserCreate, UserLogin, Token, AdvertisementBase
+from database import get_db, get_primary_read_db, get_read_db
+from .schemas import AdvertisementFilterPage, AdvertisementNearbyPage, AdvertisementOut, AdvertisementStatsGroup, Principal, UserBase, UserCreate, UserLogin, UserOut, Token, AdvertisementBase
 from models.models import User, Advertisement
-from passlib.context import CryptContext
-from jose import JWTError, jwt
-from datetime import datetime, timedelta
-from typing import Optional, List
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from dotenv import load_dotenv
-import os
+from .auth import ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token, get_current_user
+from .filters import SORTS, AdvertisementFilters, build_facets_statement, build_items_statement, facets_from_rows, paginate
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, apply_filters, apply_keyset, encode_cursor
+from .serialization import ADVERTISEMENT_COLUMNS, advertisement_to_dict, rows_to_dicts, user_to_dict
+from .streaming import stream_ndjson
+from .search import search_backend
+from .geo import MAX_DISTANCE_KM, nearby_page, resolve_point
+from .hooks import notify_advertisement_change
+from .read_cache import advertisement_key, fill_session, read_cache, user_advertisements_key, user_key
+from .hashing import password_hasher
+from .instrumentation import InstrumentedRoute
+from .owner_feed import build_owner_feed_statement, owner_feed_headers, owner_feed_page
+from .stats import STAT_DIMENSIONS, build_stats_statement, stats_from_rows
+from .compression import index_page
+from .conditional import advertisements_etag, conditional_json, last_modified
+from .write_batcher import WriteOperation, run_write
+from datetime import timedelta
+from decimal import Decimal
+from typing import Literal, Optional, List
+from fastapi.security import OAuth2PasswordRequestForm
 
 # Инициализация нового экземпляра APIRouter
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 
-# Инициализация CryptContext и OAuth2PasswordBearer
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
-# JWT
-load_dotenv()
-
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
-
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Не удалось проверить учетные данные",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise credentials_exception
-    return user
 
 def authenticate_user(db: Session, username: str, password: str):
     user = db.query(User).filter(User.username == username).first()
     if not user:
         return False
-    if not pwd_context.verify(password, user.hashed_password):
+    valid, new_hash = password_hasher.verify_and_update_sync(password, user.hashed_password)
+    if not valid:
         return False
+    # Стоимость хэширования изменилась - перехэшируем пароль при успешном входе
+    if new_hash is not None:
+        user.hashed_password = new_hash
+        db.commit()
     return user
 
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
 #РЕГИСТРАЦИЯ ПОЛЬЗОВАТЕЛЯ
 @router.post("/sign-up", response_model=UserBase)
 def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = password_hasher.hash_sync(user.password)
     db_user = User(username=user.username, hashed_password=hashed_password, email=user.email)
     db.add(db_user)
     db.commit()
@@ -105,83 +76,85 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
 
 #ДОБАВИТЬ ОБЬЯВЛЕНИЕ .. ТРЕБУЕТСЯ ТОКЕН
 @router.post("/advertisements/", response_model=AdvertisementBase)
-def create_advertisement(advertisement: AdvertisementBase, token: str = Header(None), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Неавторизованный доступ",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
-    user = db.query(User).filter(User.username == token_data.username).first()
-    if user is None:
-        raise credentials_exception
-    db_advertisement = Advertisement(
-        title=advertisement.title, 
-        description=advertisement.description, 
-        type=advertisement.type,  # Новое поле типа
-        category=advertisement.category,  # Новое поле категории
-        price=advertisement.price,  # Новое поле цены
-        location=advertisement.location,  # Новое поле локации
-        owner_id=user.id
-        )
-    db.add(db_advertisement)
-    db.commit()
-    db.refresh(db_advertisement)
-    return db_advertisement
+def create_advertisement(
+    advertisement: AdvertisementBase,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    result = run_write(db, WriteOperation("created", current_user.id, values=advertisement.model_dump()))
+    notify_advertisement_change(result.action, result.current, result.previous)
+    return result.current
 
-#HOME PAGE
+#HOME PAGE .. ИЗ ПАМЯТИ, УЖЕ СЖАТАЯ
 @router.get("/")
-def main():
-    return FileResponse("templates/index.html")
+def main(request: Request):
+    return index_page.response(request)
 
 
 #УДАЛЕНИЕ ОБЬЯВЛЕНИЯ .. УДАЛИТЬ ОБЬЯВЛЕНИЕ МОЖЕТ ТОЛЬКО СОЗДАТЕЛЬ
 @router.delete("/advertisements/{advertisement_id}")
 def delete_advertisement(
     advertisement_id: int,
-    token: str = Header(..., description="Authorization token"),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    current_user = get_current_user(token, db)
-    advertisement = db.query(Advertisement).filter(Advertisement.id == advertisement_id).first()
-    if advertisement is None:
-        raise HTTPException(status_code=404, detail="Объявление не найдено")
-    
-    if advertisement.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="У вас нет прав на удаление этого объявления")
-    
-    db.delete(advertisement)
-    db.commit()
+    result = run_write(db, WriteOperation("deleted", current_user.id, advertisement_id))
+    notify_advertisement_change(result.action, result.current, result.previous)
     return {"detail": "Объявление успешно удалено"}
 
 #ПОИСК ПОЛЬЗОВАТЕЛЯ
-@router.get("/users/{user_id}")
-def read_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+@router.get("/users/{user_id}", response_model=UserOut)
+def read_user(user_id: int, db: Session = Depends(get_read_db), primary: Session = Depends(get_primary_read_db)):
+    def load():
+        user = fill_session(db, primary).query(User).filter(User.id == user_id).first()
+        return user_to_dict(user) if user is not None else None
+
+    user = read_cache.get_or_load(user_key(user_id), load)
     if user is None:
         raise HTTPException(status_code=404, detail="Пользователь  не найден")
     return user
 
 #ПОИСК КОНКРЕТНОГО ОБЬЯВЛЕНИЯ ПО ID
-@router.get("/advertisements/{advertisement_id}")
-def read_advertisement(advertisement_id: int, db: Session = Depends(get_db)):
-    advertisement = db.query(Advertisement).filter(Advertisement.id == advertisement_id).first()
+@router.get("/advertisements/{advertisement_id}", response_model=AdvertisementOut)
+def read_advertisement(advertisement_id: int, request: Request, db: Session = Depends(get_read_db),
+                       primary: Session = Depends(get_primary_read_db)):
+    def load():
+        advertisement = fill_session(db, primary).query(Advertisement).filter(Advertisement.id == advertisement_id).first()
+        return advertisement_to_dict(advertisement) if advertisement is not None else None
+
+    advertisement = read_cache.get_or_load(advertisement_key(advertisement_id), load)
     if advertisement is None:
         raise HTTPException(status_code=404, detail="Обьявление не найдено")
-    return advertisement
+    return conditional_json(request, advertisement, advertisements_etag([advertisement]), last_modified(advertisement))
 
-#ПОЛУЧИТЬ СПИСОК ВСЕХ ОБЬЯВЛЕНИЙ
-@router.get("/advertisements/")
-def read_advertisements(db: Session = Depends(get_db)):
-    advertisements = db.query(Advertisement).all()
-    return advertisements
+#ПОЛУЧИТЬ СПИСОК ОБЬЯВЛЕНИЙ .. KEYSET-ПАГИНАЦИЯ, КУРСОР СЛЕДУЮЩЕЙ СТРАНИЦЫ В ЗАГОЛОВКЕ X-Next-Cursor
+#stream=true ОТДАЕТ ВСЕ ОСТАВШИЕСЯ СТРОКИ В NDJSON ЧЕРЕЗ СЕРВЕРНЫЙ КУРСОР (limit ИГНОРИРУЕТСЯ)
+@router.get("/advertisements/", response_model=List[AdvertisementOut])
+def read_advertisements(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    type: Optional[str] = None,
+    location: Optional[str] = None,
+    owner_id: Optional[int] = None,
+    stream: bool = False,
+    db: Session = Depends(get_read_db)
+):
+    if stream:
+        statement = select(*ADVERTISEMENT_COLUMNS)
+        statement = apply_filters(statement, category, type, location, owner_id)
+        statement = apply_keyset(statement, cursor)
+        return StreamingResponse(stream_ndjson(statement), media_type="application/x-ndjson")
+
+    statement = apply_filters(select(*ADVERTISEMENT_COLUMNS), category, type, location, owner_id)
+    rows = db.execute(apply_keyset(statement, cursor).limit(limit + 1)).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1].created_at, rows[-1].id)
+    items = rows_to_dicts(rows)
+    return conditional_json(request, items, advertisements_etag(items, headers.get("X-Next-Cursor")), headers=headers)
 
 
 #РЕДАКТИРОВАНИЕ ОБЬЯВЛЕНИЙ .. РЕДАКТИРОВАТЬ МОЖЕТ ТОЛЬКО СОЗДАТЕЛЬ .. ТРЕБУЕТСЯ ТОКЕН
@@ -189,41 +162,104 @@ def read_advertisements(db: Session = Depends(get_db)):
 def update_advertisement(
     advertisement_id: int,
     updated_advertisement: AdvertisementBase,
-    token: str = Header(..., description="Authorization token"),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    current_user = get_current_user(token, db)
-    advertisement = db.query(Advertisement).filter(Advertisement.id == advertisement_id).first()
-    if advertisement is None:
-        raise HTTPException(status_code=404, detail="Объявление не найдено")
-    
-    if advertisement.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="У вас нет прав на редактирование этого объявления")
-    
-    advertisement.title = updated_advertisement.title
-    advertisement.description = updated_advertisement.description
-    advertisement.type = updated_advertisement.type  # Новое поле типа
-    advertisement.category = updated_advertisement.category  # Новое поле категории
-    advertisement.price = updated_advertisement.price  # Новое поле цены
-    advertisement.location = updated_advertisement.location
-    db.commit()
-    db.refresh(advertisement)
-    return advertisement
+    operation = WriteOperation("updated", current_user.id, advertisement_id, updated_advertisement.model_dump())
+    result = run_write(db, operation)
+    notify_advertisement_change(result.action, result.current, result.previous)
+    return result.current
 
 
-# ПОИСК ОБЬЯВЛЕНИЙ КОНКРЕТНОГО ПОЛЬЗОВАТЕЛЯ
-@router.get("/users/{user_id}/advertisements/")
-def read_user_advertisements(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
+# ПОИСК ОБЬЯВЛЕНИЙ КОНКРЕТНОГО ПОЛЬЗОВАТЕЛЯ .. KEYSET-ПАГИНАЦИЯ, ВСЕГО ОБЬЯВЛЕНИЙ В ЗАГОЛОВКЕ X-Total-Count
+@router.get("/users/{user_id}/advertisements/", response_model=List[AdvertisementOut])
+def read_user_advertisements(
+    user_id: int,
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    primary: Session = Depends(get_primary_read_db)
+):
+    def load(session: Session):
+        return owner_feed_page(session.execute(build_owner_feed_statement(user_id, cursor, limit)), limit)
+
+    # В кэше только первая страница стандартного размера - ее сбрасывают хуки записи
+    if cursor is None and limit == DEFAULT_PAGE_SIZE:
+        page = read_cache.get_or_load(user_advertisements_key(user_id), lambda: load(fill_session(db, primary)))
+    else:
+        page = load(db)
+    if page is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
-    advertisements = db.query(Advertisement).filter(Advertisement.owner_id == user_id).all()
-    return advertisements
+    headers = owner_feed_headers(page)
+    etag = advertisements_etag(page["items"], page["count"], page["next_cursor"])
+    return conditional_json(request, page["items"], etag, headers=headers)
 
 
-#ПОИСК ОБЬЯВЛЕНИЯ ПО КЛЮЧЕВЫМ СЛОВАМ
-@router.get("/advertisements/search/")
-def search_advertisements(query: str, db: Session = Depends(get_db)):
-    search = f"%{query}%"
-    advertisements = db.query(Advertisement).filter(Advertisement.title.ilike(search)).all()
-    return advertisements
+#ПОИСК ОБЬЯВЛЕНИЯ ПО КЛЮЧЕВЫМ СЛОВАМ .. ПО ЗАГОЛОВКУ И ОПИСАНИЮ, С РАНЖИРОВАНИЕМ И ПОИСКОМ С ОПЕЧАТКАМИ
+@router.get("/advertisements/search/", response_model=List[AdvertisementOut])
+def search_advertisements(
+    request: Request,
+    query: str = Query(..., min_length=1),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_read_db)
+):
+    rows = search_backend.search(db, query, limit=limit, offset=offset)
+    items = rows_to_dicts(rows)
+    return conditional_json(request, items, advertisements_etag(items))
+
+
+#ПОИСК БЛИЖАЙШИХ ОБЬЯВЛЕНИЙ .. К ТОЧКЕ lat/lon ИЛИ К НАСЕЛЕННОМУ ПУНКТУ near, В РАДИУСЕ radius_km ИЛИ k БЛИЖАЙШИХ
+#С ФИЛЬТРОМ ПО КАТЕГОРИИ/ТИПУ, СТРАНИЦЫ ПО ВОЗРАСТАНИЮ РАССТОЯНИЯ (КУРСОР next_cursor)
+@router.get("/advertisements/nearby/", response_model=AdvertisementNearbyPage)
+def nearby_advertisements(
+    request: Request,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    near: Optional[str] = Query(None, min_length=1),
+    radius_km: Optional[float] = Query(None, gt=0, le=MAX_DISTANCE_KM),
+    category: Optional[str] = None,
+    type: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    point = resolve_point(lat, lon, near)
+    page = nearby_page(db, point, limit, cursor, radius_km, category, type)
+    return conditional_json(request, page, advertisements_etag(page["items"], page["next_cursor"]))
+
+
+#ФИЛЬТР ОБЬЯВЛЕНИЙ .. КАТЕГОРИЯ/ТИП/ЛОКАЦИЯ/ДИАПАЗОН ЦЕН, СОРТИРОВКА И СЧЕТЧИКИ ПО КАЖДОМУ ИЗМЕРЕНИЮ
+@router.get("/advertisements/filter/", response_model=AdvertisementFilterPage)
+def filter_advertisements(
+    category: Optional[str] = None,
+    type: Optional[str] = None,
+    location: Optional[str] = None,
+    price_min: Optional[Decimal] = Query(None, ge=0),
+    price_max: Optional[Decimal] = Query(None, ge=0),
+    sort: Literal[SORTS] = "newest",
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    filters = AdvertisementFilters(category, type, location, price_min, price_max)
+    advertisements = list(db.scalars(build_items_statement(filters, sort, cursor, limit + 1)))
+    facets = facets_from_rows(db.execute(build_facets_statement(filters)))
+    advertisements, next_cursor = paginate(advertisements, sort, limit)
+    return {"items": advertisements, "facets": facets, "next_cursor": next_cursor}
+
+
+#СТАТИСТИКА ПО КАТЕГОРИЯМ/ТИПАМ/ЛОКАЦИЯМ .. ЧИСЛО ОБЬЯВЛЕНИЙ И ЦЕНЫ, ИЗ ТАБЛИЦЫ АГРЕГАТОВ (O(ЧИСЛА ГРУПП))
+#group_by=category&group_by=location - РАЗБИВКА ПО НЕСКОЛЬКИМ ИЗМЕРЕНИЯМ
+@router.get("/advertisements/stats/", response_model=List[AdvertisementStatsGroup])
+def advertisement_stats(
+    group_by: List[Literal[STAT_DIMENSIONS]] = Query(["category"]),
+    category: Optional[str] = None,
+    type: Optional[str] = None,
+    location: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    group_by = list(dict.fromkeys(group_by))
+    rows = db.execute(build_stats_statement(group_by, category, type, location))
+    return stats_from_rows(rows, group_by)
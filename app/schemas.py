@@ -1,10 +1,18 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, PlainSerializer
+from datetime import datetime
+from decimal import Decimal
+from typing import Annotated, Dict, List, Optional
 
 class UserBase(BaseModel):
     username: str
     email: str
 
+# Публичное представление пользователя: hashed_password сюда не попадает
+class UserOut(UserBase):
+    id: int
+    created_at: Optional[datetime] = None
+    advertisement_count: int = 0
+
 class UserCreate(UserBase):
     password: str
 
@@ -19,24 +27,70 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
 
+# Аутентифицированный пользователь без пароля - то, что хранится в кэше авторизации
+class Principal(BaseModel):
+    id: int
+    username: str
+
+# Цена хранится в NUMERIC(12, 2), в JSON отдается числом
+Price = Annotated[Decimal, Field(ge=0, max_digits=12, decimal_places=2), PlainSerializer(float, return_type=float, when_used="json")]
+
 class AdvertisementBase(BaseModel):
     title: str
     description: str
     type: str  # Новое поле типа
     category: str  # Новое поле категории
-    price: str  # Новое поле цены
+    price: Price  # Новое поле цены
     location: str  # Новое поле локации
 
+# Колонки, добавленные миграцией ec6b78ddb33f, в старых строках могут быть NULL
 class AdvertisementOut(BaseModel):
     id: int
     title: str
     description: str
-    type: str  # Новое поле типа
-    category: str  # Новое поле категории
-    price: str  # Новое поле цены
-    location: str  # Новое поле локации
+    type: Optional[str] = None  # Новое поле типа
+    category: Optional[str] = None  # Новое поле категории
+    price: Optional[Price] = None  # Новое поле цены
+    location: Optional[str] = None  # Новое поле локации
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     owner_id: int
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
-        
\ No newline at end of file
+
+class PriceFacet(BaseModel):
+    count: int
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+class AdvertisementFacets(BaseModel):
+    category: Dict[str, int]
+    type: Dict[str, int]
+    location: Dict[str, int]
+    price: PriceFacet
+
+class AdvertisementFilterPage(BaseModel):
+    items: List[AdvertisementOut]
+    facets: AdvertisementFacets
+    next_cursor: Optional[str] = None
+
+# Результат поиска ближайших: расстояние до точки запроса в км
+class AdvertisementNearby(AdvertisementOut):
+    distance_km: float
+
+class AdvertisementNearbyPage(BaseModel):
+    items: List[AdvertisementNearby]
+    next_cursor: Optional[str] = None
+
+# Строка статистики: заполнены только измерения из group_by
+class AdvertisementStatsGroup(BaseModel):
+    category: Optional[str] = None
+    type: Optional[str] = None
+    location: Optional[str] = None
+    count: int
+    avg_price: Optional[float] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
@@ -0,0 +1,207 @@
+# search.py
+import math
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, literal, literal_column, or_, select
+from sqlalchemy.orm import Session
+
+from config import settings
+from models.models import Advertisement
+from .hooks import on_advertisement_change, on_remote_advertisement_change, on_remote_reset
+from .serialization import ADVERTISEMENT_COLUMNS
+
+# Конфигурация полнотекстового поиска Postgres, должна совпадать с миграцией
+TS_CONFIG = "russian"
+# Веса полей как у ts_rank по умолчанию: title -> A, description -> B
+TITLE_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+# Порог похожести для поиска с опечатками (pg_trgm по умолчанию тоже 0.3)
+SIMILARITY_THRESHOLD = 0.3
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return _TOKEN_RE.findall(text.lower().replace("ё", "е"))
+
+
+def trigrams(term: str) -> Set[str]:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _load_ordered(db: Session, ids: List[int]) -> List[tuple]:
+    if not ids:
+        return []
+    by_id = {row.id: row for row in db.execute(select(*ADVERTISEMENT_COLUMNS).where(Advertisement.id.in_(ids)))}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+class SearchBackend:
+    # Результат - строки из ADVERTISEMENT_COLUMNS в порядке релевантности
+    def search(self, db: Session, query: str, limit: int, offset: int = 0) -> List[tuple]:
+        raise NotImplementedError
+
+    # Хуки записи: бэкенды с собственным индексом обновляют его после коммита
+    def index(self, advertisement_id: int, title: Optional[str], description: Optional[str]) -> None:
+        pass
+
+    def remove(self, advertisement_id: int) -> None:
+        pass
+
+    def rebuild(self, db: Session) -> None:
+        pass
+
+
+class PostgresSearchBackend(SearchBackend):
+    # search_vector - генерируемая колонка из миграции, в ORM-модели она не описана
+    search_vector = literal_column("advertisements.search_vector")
+
+    def search(self, db: Session, query: str, limit: int, offset: int = 0) -> List[tuple]:
+        ts_query = func.plainto_tsquery(TS_CONFIG, query)
+        matches = self.search_vector.op("@@")(ts_query)
+        rows = db.execute(
+            select(*ADVERTISEMENT_COLUMNS)
+            .where(matches)
+            .order_by(func.ts_rank_cd(self.search_vector, ts_query).desc(), Advertisement.id.desc())
+            .offset(offset)
+            .limit(limit)
+        ).all()
+        # EXISTS по таблице: exists().where(...) без FROM Postgres не примет
+        if rows or db.execute(select(select(Advertisement.id).where(matches).exists())).scalar():
+            return rows
+        # Ничего не нашлось по словам - ищем по триграммам (опечатки, части слов) в заголовке и описании,
+        # как и полнотекстовый поиск; каждое условие <% идет по своему GIN-индексу, OR склеивает их BitmapOr
+        similarity = func.greatest(
+            func.word_similarity(query, Advertisement.title),
+            DESCRIPTION_WEIGHT * func.word_similarity(query, Advertisement.description),
+        )
+        return db.execute(
+            select(*ADVERTISEMENT_COLUMNS)
+            .where(or_(literal(query).op("<%")(Advertisement.title), literal(query).op("<%")(Advertisement.description)))
+            .order_by(similarity.desc(), Advertisement.id.desc())
+            .offset(offset)
+            .limit(limit)
+        ).all()
+
+
+class InMemorySearchBackend(SearchBackend):
+    # Инвертированный индекс в памяти процесса: для тестов и окружений без Postgres
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._documents: Dict[int, Set[str]] = {}
+        self._trigrams: Dict[str, Set[str]] = defaultdict(set)
+
+    def _add(self, advertisement_id: int, title: Optional[str], description: Optional[str]) -> None:
+        weights: Dict[str, float] = defaultdict(float)
+        for term in tokenize(title):
+            weights[term] += TITLE_WEIGHT
+        for term in tokenize(description):
+            weights[term] += DESCRIPTION_WEIGHT
+        for term, weight in weights.items():
+            if term not in self._postings:
+                for gram in trigrams(term):
+                    self._trigrams[gram].add(term)
+            self._postings[term][advertisement_id] = weight
+        self._documents[advertisement_id] = set(weights)
+
+    def _discard(self, advertisement_id: int) -> None:
+        for term in self._documents.pop(advertisement_id, ()):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(advertisement_id, None)
+            if not postings:
+                del self._postings[term]
+                for gram in trigrams(term):
+                    self._trigrams[gram].discard(term)
+
+    def index(self, advertisement_id: int, title: Optional[str], description: Optional[str]) -> None:
+        with self._lock:
+            self._discard(advertisement_id)
+            self._add(advertisement_id, title, description)
+
+    def remove(self, advertisement_id: int) -> None:
+        with self._lock:
+            self._discard(advertisement_id)
+
+    def rebuild(self, db: Session) -> None:
+        statement = select(Advertisement.id, Advertisement.title, Advertisement.description)
+        rows = db.execute(statement.execution_options(yield_per=1000))
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self._trigrams.clear()
+            for advertisement_id, title, description in rows:
+                self._add(advertisement_id, title, description)
+
+    def _similar_terms(self, term: str) -> Iterable[str]:
+        grams = trigrams(term)
+        candidates: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for candidate in self._trigrams.get(gram, ()):
+                candidates[candidate] += 1
+        for candidate, shared in candidates.items():
+            union = len(grams) + len(trigrams(candidate)) - shared
+            if shared / union >= SIMILARITY_THRESHOLD:
+                yield candidate
+
+    def _score(self, terms: Iterable[str], require_all: bool) -> List[Tuple[float, int]]:
+        total = max(len(self._documents), 1)
+        scores: Dict[int, float] = defaultdict(float)
+        hits: Dict[int, int] = defaultdict(int)
+        terms = list(terms)
+        for term in terms:
+            postings = self._postings.get(term, {})
+            idf = math.log(1 + total / (len(postings) or 1))
+            for advertisement_id, weight in postings.items():
+                scores[advertisement_id] += weight * idf
+                hits[advertisement_id] += 1
+        return [
+            (score, advertisement_id)
+            for advertisement_id, score in scores.items()
+            if not require_all or hits[advertisement_id] == len(terms)
+        ]
+
+    def search(self, db: Session, query: str, limit: int, offset: int = 0) -> List[tuple]:
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            ranked = self._score(terms, require_all=True)
+            if not ranked:
+                fuzzy = {similar for term in terms for similar in self._similar_terms(term)}
+                ranked = self._score(fuzzy, require_all=False)
+        ranked.sort(reverse=True)
+        ids = [advertisement_id for _, advertisement_id in ranked[offset:offset + limit]]
+        return _load_ordered(db, ids)
+
+
+def _create_backend() -> SearchBackend:
+    if settings.SEARCH_BACKEND == "memory":
+        return InMemorySearchBackend()
+    if settings.SEARCH_BACKEND == "postgres":
+        return PostgresSearchBackend()
+    raise ValueError(f"Unknown SEARCH_BACKEND: {settings.SEARCH_BACKEND}")
+
+
+search_backend = _create_backend()
+
+
+# Индекс в памяти есть у каждого воркера: чужие записи приходят из ленты событий
+@on_advertisement_change
+@on_remote_advertisement_change
+def _update_search_index(action: str, current: Optional[dict], previous: Optional[dict]) -> None:
+    if current is None:
+        search_backend.remove(previous["id"])
+    else:
+        search_backend.index(current["id"], current["title"], current["description"])
+
+
+on_remote_reset(search_backend.rebuild)
@@ -0,0 +1,78 @@
+# serialization.py
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Iterable, Optional
+
+import orjson
+from fastapi.responses import Response
+
+from models.models import Advertisement, User
+
+# Колонки, которые отдаются наружу при выдаче без ORM-обьектов
+ADVERTISEMENT_COLUMNS = (
+    Advertisement.id,
+    Advertisement.title,
+    Advertisement.description,
+    Advertisement.type,
+    Advertisement.category,
+    Advertisement.price,
+    Advertisement.location,
+    Advertisement.latitude,
+    Advertisement.longitude,
+    Advertisement.owner_id,
+    Advertisement.created_at,
+    Advertisement.updated_at,
+)
+ADVERTISEMENT_FIELDS = tuple(column.key for column in ADVERTISEMENT_COLUMNS)
+
+# Публичные поля пользователя - без hashed_password
+USER_FIELDS = ("id", "username", "email", "created_at", "advertisement_count")
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def row_to_dict(row) -> dict:
+    return dict(zip(ADVERTISEMENT_FIELDS, row))
+
+
+# Снимок обьявления из простых типов: годится для кэша, хуков и JSON
+def row_snapshot(row) -> dict:
+    data = row_to_dict(row)
+    data["created_at"] = _isoformat(data["created_at"])
+    data["updated_at"] = _isoformat(data["updated_at"])
+    if data["price"] is not None:
+        data["price"] = float(data["price"])
+    return data
+
+
+def advertisement_to_dict(advertisement: Advertisement) -> dict:
+    return row_snapshot(getattr(advertisement, field) for field in ADVERTISEMENT_FIELDS)
+
+
+def user_to_dict(user: User) -> dict:
+    data = {field: getattr(user, field) for field in USER_FIELDS}
+    data["created_at"] = _isoformat(data["created_at"])
+    return data
+
+
+# Быстрый путь для списков: строки-кортежи из select(*ADVERTISEMENT_COLUMNS) сразу в JSON
+# через orjson, без ORM-обьектов и jsonable_encoder. Формат совпадает с AdvertisementOut
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=json_default)
+
+
+def rows_to_dicts(rows: Iterable) -> list:
+    return [dict(zip(ADVERTISEMENT_FIELDS, row)) for row in rows]
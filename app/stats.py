@@ -0,0 +1,292 @@
+# stats.py
+import logging
+import threading
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, case, delete, event, func, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from models.models import Advertisement, AdvertisementStats
+from .locks import advisory_lock
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+STAT_DIMENSIONS = ("category", "type", "location")
+
+GroupKey = Tuple[str, str, str]
+CENT = Decimal("0.01")
+
+
+def _group_key(snapshot: dict) -> GroupKey:
+    return tuple(snapshot.get(dimension) or "" for dimension in STAT_DIMENSIONS)
+
+
+def _price(snapshot: dict) -> Optional[Decimal]:
+    price = snapshot.get("price")
+    # В снимках цена - float, в агрегатах - NUMERIC: переводим через строку без двоичного хвоста
+    return Decimal(str(price)).quantize(CENT) if price is not None else None
+
+
+class _GroupDelta:
+    def __init__(self):
+        self.count = 0
+        self.price_count = 0
+        self.price_sum = Decimal(0)
+        self.added_min: Optional[Decimal] = None
+        self.added_max: Optional[Decimal] = None
+        self.removed_min: Optional[Decimal] = None
+        self.removed_max: Optional[Decimal] = None
+
+    def add(self, price: Optional[Decimal], sign: int) -> None:
+        self.count += sign
+        if price is None:
+            return
+        self.price_count += sign
+        self.price_sum += sign * price
+        if sign > 0:
+            self.added_min = price if self.added_min is None else min(self.added_min, price)
+            self.added_max = price if self.added_max is None else max(self.added_max, price)
+        else:
+            self.removed_min = price if self.removed_min is None else min(self.removed_min, price)
+            self.removed_max = price if self.removed_max is None else max(self.removed_max, price)
+
+
+def _group_filter(table, key: GroupKey):
+    conditions = []
+    for dimension, value in zip(STAT_DIMENSIONS, key):
+        column = getattr(table, dimension)
+        conditions.append(column == value if value else or_(column.is_(None), column == ""))
+    return and_(*conditions)
+
+
+# ON CONFLICT есть у обоих используемых диалектов, но в SQLAlchemy это разные конструкции.
+# Сюда приходит и Session (маршруты, загрузка), и Connection (ORM-события)
+def _insert(connection):
+    dialect = connection.dialect if hasattr(connection, "dialect") else connection.get_bind().dialect
+    return (postgresql if dialect.name == "postgresql" else sqlite).insert(AdvertisementStats)
+
+
+def _upsert(connection, values: dict):
+    statement = _insert(connection).values(**values)
+    stats, excluded = AdvertisementStats, statement.excluded
+
+    def least_or_greatest(current, new, pick_new):
+        return case((new.is_(None), current), (current.is_(None), new), (pick_new, new), else_=current)
+
+    return statement.on_conflict_do_update(
+        index_elements=list(STAT_DIMENSIONS),
+        set_={
+            "count": stats.count + excluded.count,
+            "price_count": stats.price_count + excluded.price_count,
+            "price_sum": stats.price_sum + excluded.price_sum,
+            "price_min": least_or_greatest(stats.price_min, excluded.price_min, excluded.price_min < stats.price_min),
+            "price_max": least_or_greatest(stats.price_max, excluded.price_max, excluded.price_max > stats.price_max),
+        },
+    )
+
+
+# Изменения - пары (после, до) в виде снимков обьявления; вызывается в транзакции записи, до коммита.
+# Минимум/максимум пересчитываются по группе, только если удалена крайняя цена
+def update_advertisement_stats(connection, changes: Iterable[Tuple[Optional[dict], Optional[dict]]]) -> None:
+    deltas: Dict[GroupKey, _GroupDelta] = {}
+    for current, previous in changes:
+        if current is not None and previous is not None \
+                and _group_key(current) == _group_key(previous) and _price(current) == _price(previous):
+            continue
+        for snapshot, sign in ((current, 1), (previous, -1)):
+            if snapshot is not None:
+                deltas.setdefault(_group_key(snapshot), _GroupDelta()).add(_price(snapshot), sign)
+    # Группы всегда в одном порядке: конкурентные пачки не блокируют друг друга крест-накрест
+    for key in sorted(deltas):
+        delta = deltas[key]
+        connection.execute(_upsert(connection, {
+            **dict(zip(STAT_DIMENSIONS, key)),
+            "count": delta.count,
+            "price_count": delta.price_count,
+            "price_sum": delta.price_sum,
+            "price_min": delta.added_min,
+            "price_max": delta.added_max,
+        }))
+        if delta.removed_min is not None:
+            connection.execute(_refresh_extremes(key, delta.removed_min, delta.removed_max))
+
+
+def _refresh_extremes(key: GroupKey, removed_min: Decimal, removed_max: Decimal):
+    in_group = _group_filter(Advertisement, key)
+    stats = AdvertisementStats
+    return (
+        update(stats)
+        .where(*(getattr(stats, dimension) == value for dimension, value in zip(STAT_DIMENSIONS, key)))
+        .where(or_(stats.price_min >= removed_min, stats.price_max <= removed_max))
+        .values(
+            price_min=select(func.min(Advertisement.price)).where(in_group).scalar_subquery(),
+            price_max=select(func.max(Advertisement.price)).where(in_group).scalar_subquery(),
+        )
+    )
+
+
+# ORM-вставки и удаления (не через write_batcher) - в той же транзакции, как счетчики владельцев
+@event.listens_for(Advertisement, "after_insert")
+def _stats_created(mapper, connection, target):
+    update_advertisement_stats(connection, [(_target_snapshot(target), None)])
+
+
+@event.listens_for(Advertisement, "after_delete")
+def _stats_deleted(mapper, connection, target):
+    update_advertisement_stats(connection, [(None, _target_snapshot(target))])
+
+
+def _target_snapshot(target: Advertisement) -> dict:
+    return {field: getattr(target, field) for field in (*STAT_DIMENSIONS, "price")}
+
+
+def build_stats_statement(group_by: Sequence[str], category: Optional[str] = None,
+                          type: Optional[str] = None, location: Optional[str] = None):
+    stats = AdvertisementStats
+    dimensions = [getattr(stats, dimension) for dimension in group_by]
+    statement = select(
+        *dimensions,
+        func.sum(stats.count).label("count"),
+        func.sum(stats.price_count).label("price_count"),
+        func.sum(stats.price_sum).label("price_sum"),
+        func.min(stats.price_min).label("price_min"),
+        func.max(stats.price_max).label("price_max"),
+    ).where(stats.count > 0)
+    for dimension, value in (("category", category), ("type", type), ("location", location)):
+        if value is not None:
+            statement = statement.where(getattr(stats, dimension) == value)
+    return statement.group_by(*dimensions).order_by(*dimensions)
+
+
+def _as_float(value) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def stats_from_rows(rows, group_by: Sequence[str]) -> List[dict]:
+    result = []
+    for row in rows:
+        item = {dimension: getattr(row, dimension) or None for dimension in group_by}
+        item.update(
+            count=row.count,
+            avg_price=_as_float(row.price_sum / row.price_count) if row.price_count else None,
+            min_price=_as_float(row.price_min),
+            max_price=_as_float(row.price_max),
+        )
+        result.append(item)
+    return result
+
+
+def _actual_stats_statement():
+    keys = [func.coalesce(getattr(Advertisement, dimension), "").label(dimension) for dimension in STAT_DIMENSIONS]
+    return select(
+        *keys,
+        func.count().label("count"),
+        func.count(Advertisement.price).label("price_count"),
+        func.coalesce(func.sum(Advertisement.price), 0).label("price_sum"),
+        func.min(Advertisement.price).label("price_min"),
+        func.max(Advertisement.price).label("price_max"),
+    ).group_by(*keys)
+
+
+# Advisory-блокировка: сверку ведет один процесс
+RECONCILE_LOCK = "stats_reconciler"
+
+_STAT_VALUES = ("count", "price_count", "price_sum", "price_min", "price_max")
+
+
+# 100 и 100.00 - одна и та же цена
+def _values(row) -> tuple:
+    return tuple(
+        value.quantize(CENT) if isinstance(value, Decimal) else value
+        for value in (getattr(row, name) for name in _STAT_VALUES)
+    )
+
+
+# Исправляет одну группу: строка агрегата блокируется, поэтому конкурентные записи в эту группу
+# либо уже закоммичены и видны в пересчете, либо применят свою дельту поверх после нас
+def reconcile_group(session: Session, key: GroupKey) -> None:
+    group = dict(zip(STAT_DIMENSIONS, key))
+    stats = AdvertisementStats
+    session.execute(_insert(session).values(**group).on_conflict_do_nothing(index_elements=list(STAT_DIMENSIONS)))
+    in_stats = and_(*(getattr(stats, dimension) == value for dimension, value in group.items()))
+    session.execute(select(stats.count).where(in_stats).with_for_update())
+    actual = session.execute(
+        _actual_stats_statement().where(_group_filter(Advertisement, key))
+    ).first()
+    if actual is None:
+        session.execute(delete(stats).where(in_stats))
+    else:
+        session.execute(update(stats).where(in_stats).values(**dict(zip(_STAT_VALUES, _values(actual)))))
+    session.commit()
+
+
+# Полный пересчет агрегатов сравнивается с таблицей; разошедшиеся группы исправляются по одной.
+# Расхождения возможны от записей мимо приложения (ручной SQL, старые версии кода)
+def find_drift(session: Session) -> List[GroupKey]:
+    actual = {tuple(row[:3]): _values(row) for row in session.execute(_actual_stats_statement())}
+    stored = {tuple(row[:3]): _values(row) for row in session.execute(
+        select(*(getattr(AdvertisementStats, name) for name in (*STAT_DIMENSIONS, *_STAT_VALUES)))
+    )}
+    session.rollback()
+    return sorted(key for key in actual.keys() | stored.keys() if actual.get(key) != stored.get(key))
+
+
+class StatsReconciler:
+    def __init__(self, session_factory, interval: float):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.corrected = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def run_once(self) -> int:
+        with self.session_factory() as session:
+            drifted = find_drift(session)
+            for key in drifted:
+                reconcile_group(session, key)
+        if drifted:
+            logger.warning("advertisement stats drift fixed in %d groups", len(drifted))
+        self.corrected += len(drifted)
+        return len(drifted)
+
+    # Сверяет один процесс на всю БД - тот, кто держит advisory-блокировку, пока жив; потоки
+    # остальных воркеров раз в interval пробуют ее взять и ждут, не повторяя полный пересчет
+    # Разовая сверка вне расписания (после отключения партиций) под той же блокировкой. Сверку ведет
+    # другой процесс - он и исправит агрегаты на следующем проходе, тогда возвращается None
+    def run_exclusive(self) -> Optional[int]:
+        with advisory_lock(self.session_factory.kw["bind"], RECONCILE_LOCK) as acquired:
+            return self.run_once() if acquired else None
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                with advisory_lock(self.session_factory.kw["bind"], RECONCILE_LOCK) as leader:
+                    if not leader:
+                        continue
+                    self.run_once()
+                    while not self._stopped.wait(self.interval):
+                        self.run_once()
+            except Exception:
+                logger.exception("advertisement stats reconciliation failed")
+
+    # Поток запускается при старте воркера (после форка gunicorn); interval <= 0 - только вручную
+    def start(self) -> None:
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="stats-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+stats_reconciler = StatsReconciler(SessionLocal, settings.STATS_RECONCILE_SECONDS)
+
+registry.counter("advertisement_stats_drift_total", "Группы статистики, исправленные сверкой",
+                 lambda: stats_reconciler.corrected)
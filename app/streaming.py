@@ -0,0 +1,122 @@
+# streaming.py
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, Iterator, Sequence
+
+from database import async_read_session, read_session
+from .serialization import ADVERTISEMENT_FIELDS, json_default
+
+STREAM_CHUNK_SIZE = 1000
+
+
+# Сессия открывается внутри генератора: зависимость get_db закрывается раньше,
+# чем StreamingResponse начнет отдавать тело ответа. Выгрузки читают с реплики
+def iter_chunks(statement, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Sequence[tuple]]:
+    db = read_session()
+    try:
+        result = db.execute(
+            statement.execution_options(stream_results=True, yield_per=chunk_size)
+        )
+        for partition in result.partitions(chunk_size):
+            yield partition
+    finally:
+        db.close()
+
+
+# Асинхронный вариант: AsyncSession.stream() держит серверный курсор asyncpg
+async def iter_chunks_async(statement, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[Sequence[tuple]]:
+    async with async_read_session() as db:
+        result = await db.stream(statement.execution_options(yield_per=chunk_size))
+        async for partition in result.partitions(chunk_size):
+            yield partition
+
+
+class NdjsonEncoder:
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def __init__(self, fields: Sequence[str] = ADVERTISEMENT_FIELDS):
+        self.fields = fields
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows) -> bytes:
+        lines = [
+            json.dumps(dict(zip(self.fields, row)), default=json_default, ensure_ascii=False)
+            for row in rows
+        ]
+        return ("\n".join(lines) + "\n").encode() if lines else b""
+
+
+class CsvEncoder:
+    media_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self, fields: Sequence[str] = ADVERTISEMENT_FIELDS):
+        self.fields = fields
+
+    def _write(self, rows) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows)
+        return buffer.getvalue().encode()
+
+    def header(self) -> bytes:
+        return self._write([self.fields])
+
+    def encode(self, rows) -> bytes:
+        return self._write(rows)
+
+
+ENCODERS = {"ndjson": NdjsonEncoder, "csv": CsvEncoder}
+
+
+# wbits=31 - формат gzip; компрессор один на весь поток, поэтому на выходе цельный gzip-файл
+class _Gzip:
+    def __init__(self, enabled: bool):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if enabled else None
+
+    def feed(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) if self._compressor else data
+
+    def finish(self) -> bytes:
+        return self._compressor.flush() if self._compressor else b""
+
+
+def stream_rows(statement, encoder, gzip: bool = False, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    compressor = _Gzip(gzip)
+    data = compressor.feed(encoder.header())
+    if data:
+        yield data
+    for chunk in iter_chunks(statement, chunk_size):
+        data = compressor.feed(encoder.encode(chunk))
+        if data:
+            yield data
+    data = compressor.finish()
+    if data:
+        yield data
+
+
+async def stream_rows_async(statement, encoder, gzip: bool = False,
+                            chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    compressor = _Gzip(gzip)
+    data = compressor.feed(encoder.header())
+    if data:
+        yield data
+    async for chunk in iter_chunks_async(statement, chunk_size):
+        data = compressor.feed(encoder.encode(chunk))
+        if data:
+            yield data
+    data = compressor.finish()
+    if data:
+        yield data
+
+
+def stream_ndjson(statement, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    return stream_rows(statement, NdjsonEncoder(), chunk_size=chunk_size)
+
+
+def stream_ndjson_async(statement, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    return stream_rows_async(statement, NdjsonEncoder(), chunk_size=chunk_size)
@@ -0,0 +1,201 @@
+# write_batcher.py
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, NamedTuple, Optional, Tuple, Union
+
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from models.models import Advertisement
+from .gazetteer import with_coordinates
+from .metrics import COUNT_BUCKETS, registry
+from .owner_feed import update_owner_counts
+from .serialization import ADVERTISEMENT_COLUMNS, row_snapshot
+from .stats import update_advertisement_stats
+
+batch_size = registry.histogram(
+    "write_batch_size", "Операций записи в одной транзакции группового коммита", buckets=COUNT_BUCKETS).labels()
+batch_flush_time = registry.histogram(
+    "write_batch_flush_seconds", "Время записи и коммита одной пачки").labels()
+
+
+class WriteOperation(NamedTuple):
+    action: str  # created / updated / deleted - те же действия, что у хуков записи
+    owner_id: int
+    advertisement_id: Optional[int] = None
+    values: Optional[dict] = None
+
+
+# Снимки после и до изменения - ровно то, что ждет notify_advertisement_change
+class WriteResult(NamedTuple):
+    action: str
+    current: Optional[dict]
+    previous: Optional[dict]
+
+
+Outcome = Union[WriteResult, HTTPException]
+
+
+def _load_for_change(session: Session, operation: WriteOperation) -> dict:
+    row = session.execute(
+        select(*ADVERTISEMENT_COLUMNS).where(Advertisement.id == operation.advertisement_id).with_for_update()
+    ).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Объявление не найдено")
+    if row.owner_id != operation.owner_id:
+        verb = "редактирование" if operation.action == "updated" else "удаление"
+        raise HTTPException(status_code=403, detail=f"У вас нет прав на {verb} этого объявления")
+    return row_snapshot(row)
+
+
+def _apply_change(session: Session, operation: WriteOperation) -> WriteResult:
+    previous = _load_for_change(session, operation)
+    if operation.action == "deleted":
+        session.execute(delete(Advertisement).where(Advertisement.id == operation.advertisement_id))
+        return WriteResult("deleted", None, previous)
+    row = session.execute(
+        update(Advertisement)
+        .where(Advertisement.id == operation.advertisement_id)
+        .values(**with_coordinates(operation.values))
+        .returning(*ADVERTISEMENT_COLUMNS)
+    ).one()
+    return WriteResult("updated", row_snapshot(row), previous)
+
+
+# Выполняет операции в текущей транзакции сессии, коммит - за вызывающим. Все создания идут
+# одним INSERT ... RETURNING, сгенерированные id/created_at возвращаются без refresh().
+# Ошибки прав/отсутствия строки относятся к своей операции и не мешают остальным
+def apply_operations(session: Session, operations: List[WriteOperation]) -> List[Outcome]:
+    outcomes: List[Optional[Outcome]] = [None] * len(operations)
+    creates = [i for i, operation in enumerate(operations) if operation.action == "created"]
+    if creates:
+        rows = session.execute(
+            insert(Advertisement).returning(*ADVERTISEMENT_COLUMNS, sort_by_parameter_order=True),
+            [{**with_coordinates(operations[i].values), "owner_id": operations[i].owner_id} for i in creates],
+        ).all()
+        for i, row in zip(creates, rows):
+            outcomes[i] = WriteResult("created", row_snapshot(row), None)
+    for i, operation in enumerate(operations):
+        if operation.action != "created":
+            try:
+                outcomes[i] = _apply_change(session, operation)
+            except HTTPException as error:
+                outcomes[i] = error
+    # Core-запросы идут мимо ORM-событий, поэтому счетчики владельцев и статистика обновляются здесь
+    done = [outcome for outcome in outcomes if isinstance(outcome, WriteResult)]
+    update_owner_counts(session, (result.current["owner_id"] for result in done if result.action == "created"))
+    update_owner_counts(session, (result.previous["owner_id"] for result in done if result.action == "deleted"), -1)
+    update_advertisement_stats(session, ((result.current, result.previous) for result in done))
+    return outcomes
+
+
+def _unwrap(outcome: Outcome) -> WriteResult:
+    if isinstance(outcome, HTTPException):
+        raise outcome
+    return outcome
+
+
+class WriteBatcher:
+    # Групповой коммит: конкурентные операции копятся не дольше window секунд или до max_batch
+    # штук и записываются одной транзакцией в отдельном потоке. Каждый вызывающий получает
+    # свой результат или свою ошибку
+    def __init__(self, session_factory: Callable[[], Session], enabled: bool, window: float, max_batch: int):
+        self.session_factory = session_factory
+        self.enabled = enabled
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Tuple[WriteOperation, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # Поток запускается лениво: gunicorn форкает воркеры после импорта приложения
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, operation: WriteOperation) -> Future:
+        self._ensure_thread()
+        future: Future = Future()
+        self._queue.put((operation, future))
+        return future
+
+    def _collect(self) -> List[Tuple[WriteOperation, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            self._flush(batch)
+            batch_size.observe(len(batch))
+            batch_flush_time.observe(time.perf_counter() - started)
+
+    def _commit(self, operations: List[WriteOperation]) -> List[Outcome]:
+        with self.session_factory() as session:
+            outcomes = apply_operations(session, operations)
+            session.commit()
+            return outcomes
+
+    def _flush(self, batch: List[Tuple[WriteOperation, Future]]) -> None:
+        operations = [operation for operation, _ in batch]
+        try:
+            outcomes = self._commit(operations)
+        except Exception:
+            # Откатилась вся пачка: повторяем по одной, чтобы ошибка досталась только своей операции
+            outcomes = []
+            for operation in operations:
+                try:
+                    outcomes.extend(self._commit([operation]))
+                except Exception as error:
+                    outcomes.append(error)
+        for (_, future), outcome in zip(batch, outcomes):
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+
+write_batcher = WriteBatcher(
+    SessionLocal,
+    enabled=settings.WRITE_BATCHING,
+    window=settings.WRITE_BATCH_WINDOW_MS / 1000,
+    max_batch=settings.WRITE_BATCH_MAX,
+)
+
+
+# Точки входа для маршрутов: без группового коммита операция идет в сессии запроса
+def run_write(db: Session, operation: WriteOperation) -> WriteResult:
+    if write_batcher.enabled:
+        return _unwrap(write_batcher.submit(operation).result())
+    outcome = apply_operations(db, [operation])[0]
+    if isinstance(outcome, WriteResult):
+        db.commit()
+    return _unwrap(outcome)
+
+
+async def run_write_async(db: AsyncSession, operation: WriteOperation) -> WriteResult:
+    if write_batcher.enabled:
+        return _unwrap(await asyncio.wrap_future(write_batcher.submit(operation)))
+    outcome = await db.run_sync(lambda session: apply_operations(session, [operation])[0])
+    if isinstance(outcome, WriteResult):
+        await db.commit()
+    return _unwrap(outcome)
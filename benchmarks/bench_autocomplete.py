@@ -0,0 +1,88 @@
+# bench_autocomplete.py
+# Задержка подсказок (PrefixIndex.complete) на синтетических заголовках: словарь из --vocabulary
+# псевдослов с распределением Ципфа, префиксы длиной 1..6 по случайным терминам индекса.
+# Отдельно - стоимость инкрементального обновления (создание обьявления) и пересборки.
+#
+#   python benchmarks/bench_autocomplete.py --titles 50000 --vocabulary 30000
+import argparse
+import json
+import random
+import time
+
+from bench_routes import percentile
+from harness import Harness  # noqa: F401  (настраивает окружение до импорта app)
+from app.autocomplete import PrefixIndex, suggest, autocomplete_index
+
+LETTERS = "абвгдежзийклмнопрстуфхцчшщыэюя"
+
+
+def make_vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(LETTERS) for _ in range(rng.randint(3, 12))))
+    return sorted(words)
+
+
+def make_titles(rng, vocabulary, count):
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    return [" ".join(rng.choices(vocabulary, weights, k=rng.randint(2, 6))) for _ in range(count)]
+
+
+def timed(fn, samples):
+    latencies = []
+    for sample in samples:
+        started = time.perf_counter()
+        fn(sample)
+        latencies.append(time.perf_counter() - started)
+    return {"p50_us": percentile(latencies, 0.50) * 1e6, "p99_us": percentile(latencies, 0.99) * 1e6,
+            "max_us": max(latencies) * 1e6}
+
+
+def interleaved(index, titles, prefixes):
+    latencies = []
+    for title, prefix in zip(titles, prefixes):
+        index.update(None, title)
+        started = time.perf_counter()
+        index.complete(prefix, 10)
+        latencies.append(time.perf_counter() - started)
+    return {"p50_us": percentile(latencies, 0.50) * 1e6, "p99_us": percentile(latencies, 0.99) * 1e6,
+            "max_us": max(latencies) * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--titles", type=int, default=50000)
+    parser.add_argument("--vocabulary", type=int, default=30000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--max-terms", type=int, default=200000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    vocabulary = make_vocabulary(rng, args.vocabulary)
+    titles = make_titles(rng, vocabulary, args.titles)
+
+    index = PrefixIndex(args.max_terms)
+    started = time.perf_counter()
+    index.rebuild(titles)
+    rebuild_seconds = time.perf_counter() - started
+
+    terms = rng.sample(vocabulary, min(len(vocabulary), args.queries))
+    prefixes = [term[:rng.randint(1, min(6, len(term)))] for term in rng.choices(terms, k=args.queries)]
+    new_titles = make_titles(rng, vocabulary, args.queries)
+
+    autocomplete_index.rebuild(titles)
+    report = {
+        "titles": args.titles,
+        "terms": len(index),
+        "rebuild_ms": rebuild_seconds * 1000,
+        "complete": timed(lambda prefix: index.complete(prefix, 10), prefixes),
+        "suggest": timed(lambda prefix: suggest(f"купить {prefix}", 10), prefixes),
+        "update": timed(lambda title: index.update(None, title), new_titles),
+        # Запись перед каждым запросом сбрасывает закэшированные топы коротких префиксов - худший случай
+        "complete_interleaved": interleaved(index, new_titles, prefixes),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
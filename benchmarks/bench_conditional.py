@@ -0,0 +1,56 @@
+# bench_conditional.py
+# Трафик и время ответа для повторного читателя списка и главной страницы:
+#   identity     - без сжатия
+#   gzip / br    - сжатие CompressionMiddleware (br - если установлен Brotli)
+#   not_modified - повторный запрос с If-None-Match: 304 без тела и без сериализации
+#
+#   python benchmarks/bench_conditional.py --ads 20000 --page 100 --repeat 200
+import argparse
+import json
+import time
+
+from bench_routes import percentile
+from harness import Harness
+from app.compression import brotli
+
+
+def measure(client, path, headers, repeat):
+    latencies, downloaded, status = [], 0, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - started)
+        downloaded = response.num_bytes_downloaded
+        status = response.status_code
+    return {
+        "status": status,
+        "bytes": downloaded,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ads", type=int, default=20000)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    harness = Harness()
+    harness.seed(100, args.ads)
+    client = harness.client
+
+    report = {}
+    for path in (f"/advertisements/?limit={args.page}", "/"):
+        etag = client.get(path).headers["etag"]
+        variants = {"identity": {"Accept-Encoding": "identity"}, "gzip": {"Accept-Encoding": "gzip"}}
+        if brotli is not None:
+            variants["br"] = {"Accept-Encoding": "br"}
+        variants["not_modified"] = {"Accept-Encoding": "gzip", "If-None-Match": etag}
+        report[path] = {name: measure(client, path, headers, args.repeat) for name, headers in variants.items()}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# bench_db_mode.py
+# Сравнение DB_MODE=sync и DB_MODE=async под gunicorn + UvicornWorker (как в Dockerfile)
+# при фиксированном числе воркеров: пропускная способность и p50/p99 задержки.
+#
+#   python benchmarks/bench_db_mode.py --workers 2 --concurrency 64 --duration 20
+#
+# БД берется из .env, в ней должны быть обьявления.
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+PATHS = (
+    "/advertisements/?limit=20",
+    "/advertisements/search/?query=test&limit=20",
+)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def start_server(mode, workers, port):
+    env = dict(os.environ, DB_MODE=mode)
+    command = [
+        "gunicorn", "main:app",
+        "--workers", str(workers),
+        "--worker-class", "uvicorn.workers.UvicornWorker",
+        f"--bind=127.0.0.1:{port}",
+    ]
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(base_url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get("/")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not start")
+
+
+async def drive(base_url, concurrency, duration):
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        async def worker(n):
+            nonlocal errors
+            i = n
+            while time.monotonic() < deadline:
+                path = PATHS[i % len(PATHS)]
+                i += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code >= 500:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / duration,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--modes", default="sync,async")
+    args = parser.parse_args()
+
+    results = {}
+    base_url = f"http://127.0.0.1:{args.port}"
+    for mode in args.modes.split(","):
+        server = start_server(mode, args.workers, args.port)
+        try:
+            asyncio.run(wait_ready(base_url))
+            results[mode] = asyncio.run(drive(base_url, args.concurrency, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{mode:>5}: {json.dumps(results[mode])}", file=sys.stderr)
+
+    print(json.dumps({"workers": args.workers, "concurrency": args.concurrency, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# bench_geo.py
+# Поиск ближайших на --points обьявлениях: сетка GridGeoBackend против полного перебора.
+# Обьявления раскиданы по --places синтетическим пунктам с распределением Ципфа (координаты из
+# справочника у обьявлений одного пункта совпадают); --places 0 - у каждого свои координаты.
+# Результаты сетки сверяются с перебором на тех же запросах.
+#
+#   python benchmarks/bench_geo.py --points 1000000 --places 20000
+import argparse
+import heapq
+import json
+import random
+import time
+
+from bench_routes import percentile
+from harness import CATEGORIES, TYPES  # noqa: F401  (настраивает окружение до импорта app)
+from app.geo import GridGeoBackend, haversine_km
+
+# Примерные границы заселенной части России
+SOUTH, NORTH, WEST, EAST = 42.0, 70.0, 20.0, 180.0
+
+
+def make_points(rng, count, places):
+    if places:
+        sites = [(rng.uniform(SOUTH, NORTH), rng.uniform(WEST, EAST)) for _ in range(places)]
+        coordinates = rng.choices(sites, [1 / (rank + 1) for rank in range(places)], k=count)
+    else:
+        coordinates = [(rng.uniform(SOUTH, NORTH), rng.uniform(WEST, EAST)) for _ in range(count)]
+    return [
+        (advertisement_id, latitude, longitude, rng.choice(CATEGORIES), rng.choice(TYPES))
+        for advertisement_id, (latitude, longitude) in enumerate(coordinates, start=1)
+    ]
+
+
+def scan(points, latitude, longitude, limit, after=None, radius_km=None, category=None):
+    ranked = (
+        (haversine_km(latitude, longitude, point_latitude, point_longitude), advertisement_id)
+        for advertisement_id, point_latitude, point_longitude, point_category, _ in points
+        if category is None or point_category == category
+    )
+    ranked = (item for item in ranked if (radius_km is None or item[0] <= radius_km) and (after is None or item > after))
+    return heapq.nsmallest(limit, ranked)
+
+
+def timed(fn, queries):
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(fn(*query))
+        latencies.append(time.perf_counter() - started)
+    return {"p50_ms": percentile(latencies, 0.50) * 1000, "p99_ms": percentile(latencies, 0.99) * 1000}, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=1000000)
+    parser.add_argument("--places", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--scan-queries", type=int, default=10)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--radius-km", type=float, default=100)
+    parser.add_argument("--cell-degrees", type=float, default=0.5)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    points = make_points(rng, args.points, args.places)
+    index = GridGeoBackend(args.cell_degrees)
+    started = time.perf_counter()
+    index.load(points)
+    load_seconds = time.perf_counter() - started
+
+    centers = [(rng.uniform(SOUTH, NORTH), rng.uniform(WEST, EAST)) for _ in range(args.queries)]
+    variants = {
+        "nearest": {"limit": args.k},
+        "nearest_category": {"limit": args.k, "category": CATEGORIES[0]},
+        "radius": {"limit": 50, "radius_km": args.radius_km},
+    }
+    report = {"points": args.points, "sites": len(index._sites), "cells": len(index._cells),
+              "load_ms": load_seconds * 1000}
+    for name, options in variants.items():
+        index_stats, index_results = timed(
+            lambda latitude, longitude: index.nearest(None, latitude, longitude, **options), centers)
+        scan_stats, scan_results = timed(
+            lambda latitude, longitude: scan(points, latitude, longitude, **options), centers[:args.scan_queries])
+        report[name] = {
+            "index": index_stats,
+            "scan": scan_stats,
+            "mismatches": sum(a != b for a, b in zip(index_results, scan_results)),
+        }
+
+    # Вторая страница: курсор - последняя пара (расстояние, id) первой
+    pages = [(latitude, longitude, index.nearest(None, latitude, longitude, args.k)[-1]) for latitude, longitude in centers]
+    index_stats, index_results = timed(lambda latitude, longitude, after: index.nearest(
+        None, latitude, longitude, args.k, after), pages)
+    scan_stats, scan_results = timed(lambda latitude, longitude, after: scan(
+        points, latitude, longitude, args.k, after), pages[:args.scan_queries])
+    report["next_page"] = {"index": index_stats, "scan": scan_stats,
+                           "mismatches": sum(a != b for a, b in zip(index_results, scan_results))}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
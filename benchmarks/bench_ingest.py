@@ -0,0 +1,72 @@
+# bench_ingest.py
+# Пропускная способность массовой загрузки (строк/сек) через POST /advertisements/bulk/.
+# По умолчанию SQLite в памяти (executemany), --url postgresql://... проверяет путь через COPY.
+#
+#   python benchmarks/bench_ingest.py --rows 50000 --format ndjson
+import argparse
+import csv
+import io
+import json
+import random
+import time
+
+from harness import CATEGORIES, LOCATIONS, TYPES, WORDS, Harness
+from app.auth import create_access_token
+
+
+def make_rows(count, seed=7):
+    rng = random.Random(seed)
+    for i in range(count):
+        yield {
+            "title": " ".join(rng.sample(WORDS, 2)),
+            "description": " ".join(rng.choices(WORDS, k=8)),
+            "type": rng.choice(TYPES),
+            "category": rng.choice(CATEGORIES),
+            # Каждая сотая строка невалидна - проверяем, что отчет об ошибках не ломает загрузку
+            "price": "бесплатно" if i % 100 == 99 else str(rng.randint(100, 100000)),
+            "location": rng.choice(LOCATIONS),
+        }
+
+
+def encode(rows, fmt):
+    if fmt == "ndjson":
+        return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode()
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=["title", "description", "type", "category", "price", "location"])
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    parser.add_argument("--url", default="sqlite://")
+    args = parser.parse_args()
+
+    harness = Harness(args.url)
+    harness.seed(users=1, advertisements=0)
+    token = create_access_token({"sub": "user1"})
+    body = encode(make_rows(args.rows), args.format)
+    content_type = "text/csv" if args.format == "csv" else "application/x-ndjson"
+
+    started = time.perf_counter()
+    response = harness.client.post(
+        "/advertisements/bulk/", content=body, headers={"token": token, "content-type": content_type}
+    )
+    elapsed = time.perf_counter() - started
+    report = response.json()
+    print(json.dumps({
+        "format": args.format,
+        "rows": args.rows,
+        "inserted": report["inserted"],
+        "failed": report["failed"],
+        "seconds": elapsed,
+        "rows_per_sec": args.rows / elapsed,
+        "queries": harness.queries.count,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
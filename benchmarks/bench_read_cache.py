@@ -0,0 +1,59 @@
+# bench_read_cache.py
+# Количество SQL-запросов на 1000 чтений (обьявление, пользователь, обьявления пользователя)
+# с выключенным и включенным кэшем чтения.
+#
+#   python benchmarks/bench_read_cache.py --ads 5000 --users 200 --reads 1000
+import argparse
+import json
+import random
+import time
+
+from harness import Harness
+from app.read_cache import read_cache
+
+
+def run(harness, paths, enabled):
+    read_cache.enabled = enabled
+    read_cache.backend.clear()
+    harness.queries.reset()
+    started = time.perf_counter()
+    for path in paths:
+        harness.client.get(path)
+    elapsed = time.perf_counter() - started
+    return {
+        "queries": harness.queries.count,
+        "queries_per_1k_reads": harness.queries.count * 1000 / len(paths),
+        "reads_per_sec": len(paths) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ads", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=1000)
+    args = parser.parse_args()
+
+    harness = Harness()
+    harness.seed(args.users, args.ads)
+
+    # Популярные обьявления читают чаще остальных - распределение Парето
+    rng = random.Random(1)
+    paths = []
+    for _ in range(args.reads):
+        kind = rng.random()
+        ad_id = min(int(rng.paretovariate(1.2)), args.ads)
+        user_id = min(int(rng.paretovariate(1.2)), args.users)
+        if kind < 0.7:
+            paths.append(f"/advertisements/{ad_id}")
+        elif kind < 0.9:
+            paths.append(f"/users/{user_id}")
+        else:
+            paths.append(f"/users/{user_id}/advertisements/")
+
+    results = {"without_cache": run(harness, paths, False), "with_cache": run(harness, paths, True)}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# bench_serialization.py
+# Процессорное время на 1000 строк для выдачи списка обьявлений:
+#   orm       - ORM-обьекты + jsonable_encoder + json.dumps (прежний путь без response_model)
+#   fast      - строки-кортежи из select(*ADVERTISEMENT_COLUMNS) + orjson (FastJSONResponse)
+#   endpoint  - GET /advertisements/?limit=<page> целиком через TestClient
+#
+#   python benchmarks/bench_serialization.py --ads 20000 --page 500 --repeat 20
+import argparse
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+
+from harness import Harness
+from app.serialization import ADVERTISEMENT_COLUMNS, FastJSONResponse, rows_to_dicts
+from models.models import Advertisement
+
+
+def orm_path(db, page):
+    advertisements = db.query(Advertisement).order_by(Advertisement.id).limit(page).all()
+    body = json.dumps(jsonable_encoder(advertisements), ensure_ascii=False, separators=(",", ":")).encode()
+    db.expunge_all()
+    return body
+
+
+def fast_path(db, page):
+    rows = db.execute(select(*ADVERTISEMENT_COLUMNS).order_by(Advertisement.id).limit(page)).all()
+    return FastJSONResponse(rows_to_dicts(rows)).body
+
+
+def cpu_per_1k_rows(fn, rows, repeat):
+    fn()  # прогрев
+    started = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - started) * 1000 / repeat / rows * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ads", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--page", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    harness = Harness()
+    harness.seed(args.users, args.ads)
+    page = min(args.page, args.ads)
+
+    with harness.Session() as db:
+        results = {
+            "orm_ms_per_1k_rows": cpu_per_1k_rows(lambda: orm_path(db, page), page, args.repeat),
+            "fast_ms_per_1k_rows": cpu_per_1k_rows(lambda: fast_path(db, page), page, args.repeat),
+        }
+    results["endpoint_ms_per_1k_rows"] = cpu_per_1k_rows(
+        lambda: harness.client.get(f"/advertisements/?limit={page}"), page, args.repeat)
+    results["speedup"] = results["orm_ms_per_1k_rows"] / results["fast_ms_per_1k_rows"]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
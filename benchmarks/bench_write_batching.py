@@ -0,0 +1,75 @@
+# bench_write_batching.py
+# Пропускная способность записи (POST /advertisements/) при разных окнах группового коммита.
+# Окно 0 - групповой коммит выключен, каждая запись коммитится в своей транзакции.
+# По умолчанию файл SQLite с настоящим пулом (коммит = fsync); --url - локальный Postgres.
+#
+#   python benchmarks/bench_write_batching.py --clients 64 --writes 3000 --windows 0,1,2,5,10
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+import httpx
+
+from bench_routes import percentile, random_advertisement
+from harness import Harness
+from app.auth import create_access_token
+from app.write_batcher import write_batcher
+
+
+async def drive(app, clients: int, writes: int, headers: dict, rng) -> list:
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    remaining = iter(range(writes))
+    results = []
+
+    async def client_loop(client):
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await client.post("/advertisements/", json=random_advertisement(rng), headers=headers)
+            results.append((response.status_code, time.perf_counter() - started))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await asyncio.gather(*(client_loop(client) for _ in range(clients)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--writes", type=int, default=3000)
+    parser.add_argument("--windows", default="0,1,2,5,10", help="окна в мс через запятую")
+    parser.add_argument("--max-batch", type=int, default=100)
+    parser.add_argument("--pool-size", type=int, default=20)
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'writes.db')}"
+    harness = Harness(url, pool_size=args.pool_size)
+    harness.seed(10, 0)
+    headers = {"token": create_access_token({"sub": "user1"})}
+    rng = random.Random(1)
+
+    report = {}
+    for window_ms in (float(window) for window in args.windows.split(",")):
+        write_batcher.enabled = window_ms > 0
+        write_batcher.window = window_ms / 1000
+        write_batcher.max_batch = args.max_batch
+        started = time.perf_counter()
+        results = asyncio.run(drive(harness.app, args.clients, args.writes, headers, rng))
+        elapsed = time.perf_counter() - started
+        latencies = [latency for status, latency in results if status == 200]
+        report[f"window_{window_ms:g}ms"] = {
+            "writes_per_sec": len(latencies) / elapsed,
+            "errors": sum(1 for status, _ in results if status != 200),
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+        }
+        print(f"window {window_ms:>5g} ms: {report[f'window_{window_ms:g}ms']}")
+    print(json.dumps({"database": harness.engine.dialect.name, "clients": args.clients, "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# check_search.py
+# Проверка поиска PostgresSearchBackend на Postgres из .env: совпадение по словам, переход к поиску
+# по триграммам, когда полнотекстовый поиск ничего не нашел, и пустая страница за концом выдачи
+# (без перехода). Строки вставляются в транзакции, которая в конце откатывается.
+#
+#   python benchmarks/check_search.py
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import Session
+
+from database import engine
+from app.search import PostgresSearchBackend
+from models.models import Advertisement, User
+
+TITLES = ("Велосипед горный зеленоглазый", "Диван угловой зеленоглазый", "Шкаф-купе зеркальный")
+
+
+def main() -> int:
+    backend = PostgresSearchBackend()
+    failures = 0
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            db = Session(bind=connection, join_transaction_mode="create_savepoint")
+            owner = User(username="check_search", email="check_search@example.com", hashed_password="-")
+            db.add(owner)
+            db.flush()
+            ids = {}
+            for title in TITLES:
+                advertisement = Advertisement(title=title, description="проверка поиска", type="sell",
+                                              category="check", price=1, location="Барнаул", owner_id=owner.id)
+                db.add(advertisement)
+                db.flush()
+                ids[title] = advertisement.id
+
+            # (метка, запрос, offset, ожидаемые id в выдаче)
+            checks = (
+                ("full text", "зеленоглазый", 0, {ids[TITLES[0]], ids[TITLES[1]]}),
+                ("typo -> trigram", "зеленоглазй", 0, {ids[TITLES[0]], ids[TITLES[1]]}),
+                ("part of word -> trigram", "зеркальн", 0, {ids[TITLES[2]]}),
+                ("page past the end", "зеленоглазый", 1000, set()),
+            )
+            for label, query, offset, expected in checks:
+                found = {row.id for row in backend.search(db, query, 50, offset)}
+                ok = expected <= found if expected else not found
+                failures += not ok
+                print(f"{'ok  ' if ok else 'FAIL'} {label:<24} {query!r} offset={offset} -> {len(found)} rows")
+        finally:
+            transaction.rollback()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+# compare.py
+# Сравнение двух результатов bench_routes.py: изменение p50/p99, rps и числа запросов к БД.
+# Код возврата 1, если какой-то маршрут стал медленнее порога или делает больше SQL-запросов.
+#
+#   python benchmarks/compare.py benchmarks/results/<old>.json benchmarks/results/<new>.json --threshold 0.1
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def change(old, new):
+    return (new - old) / old if old else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="допустимый рост p99, доля")
+    args = parser.parse_args()
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    print(f"{baseline['meta']['commit']} -> {candidate['meta']['commit']}")
+    print(f"{'route':<45} {'p50 ms':>16} {'p99 ms':>16} {'rps':>9} {'q/req':>11}")
+    regressions = []
+    for route, new in candidate["routes"].items():
+        old = baseline["routes"].get(route)
+        if old is None:
+            print(f"{route:<45} (новый маршрут)")
+            continue
+        p99_change = change(old["p99_ms"], new["p99_ms"])
+        print(f"{route:<45} {old['p50_ms']:7.2f} -> {new['p50_ms']:6.2f} "
+              f"{old['p99_ms']:7.2f} -> {new['p99_ms']:6.2f} {change(old['rps'], new['rps']):+8.1%} "
+              f"{old['queries_per_request']:4.1f} -> {new['queries_per_request']:4.1f}")
+        if p99_change > args.threshold:
+            regressions.append(f"{route}: p99 {p99_change:+.1%}")
+        if new["queries_per_request"] > old["queries_per_request"]:
+            regressions.append(f"{route}: SQL-запросов {old['queries_per_request']:.1f} -> {new['queries_per_request']:.1f}")
+
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# harness.py
+# Общая обвязка бенчмарков: приложение в режиме DB_MODE=sync поверх SQLite в памяти
+# вместо Postgres, счетчик SQL-запросов и заполнение тестовыми данными.
+import os
+import random
+import sys
+from typing import Optional
+
+os.environ.setdefault("DB_MODE", "sync")
+os.environ.setdefault("SEARCH_BACKEND", "memory")
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ.setdefault("EVENTS_BACKEND", "memory")
+os.environ.setdefault("GEO_BACKEND", "memory")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+
+import database
+from main import app as fastapi_app
+from models.models import Advertisement, Base, User
+from app import streaming
+from app.autocomplete import rebuild_autocomplete
+from app.geo import geo_backend
+from app.search import search_backend
+from app.stats import stats_reconciler
+from app.write_batcher import write_batcher
+
+CATEGORIES = ("auto", "realty", "electronics", "clothes", "services")
+TYPES = ("sell", "buy", "rent")
+LOCATIONS = ("Барнаул", "Новосибирск", "Томск", "Бийск", "Москва")
+WORDS = ("велосипед", "диван", "телефон", "квартира", "ноутбук", "куртка", "ремонт", "машина", "стол", "шкаф")
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def reset(self) -> None:
+        self.count = 0
+
+
+class Harness:
+    # pool_size - настоящий пул вместо одного общего соединения (нужен файл SQLite, а не память)
+    def __init__(self, url: str = "sqlite://", pool_size: Optional[int] = None, pool_timeout: float = 30):
+        if pool_size is not None:
+            self.engine = create_engine(url, connect_args={"check_same_thread": False} if url.startswith("sqlite") else {},
+                                        poolclass=QueuePool, pool_size=pool_size, max_overflow=0,
+                                        pool_timeout=pool_timeout)
+        elif url.startswith("sqlite"):
+            self.engine = create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        else:
+            self.engine = create_engine(url)
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine, autoflush=False)
+        self.queries = QueryCounter(self.engine)
+
+        def override_get_db():
+            db = self.Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        fastapi_app.dependency_overrides[database.get_db] = override_get_db
+        fastapi_app.dependency_overrides[database.get_read_db] = override_get_db
+        fastapi_app.dependency_overrides[database.get_primary_read_db] = override_get_db
+        # Потоковые выдачи открывают сессию сами, минуя зависимости
+        streaming.read_session = self.Session
+        write_batcher.session_factory = self.Session
+        stats_reconciler.session_factory = self.Session
+        self.app = fastapi_app
+        self.client = TestClient(fastapi_app)
+
+    def seed(self, users: int, advertisements: int, seed: int = 42) -> None:
+        rng = random.Random(seed)
+        with self.Session() as db:
+            db.add_all(
+                User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="x")
+                for i in range(1, users + 1)
+            )
+            db.flush()
+            for start in range(0, advertisements, 5000):
+                db.add_all(
+                    Advertisement(
+                        title=" ".join(rng.sample(WORDS, 2)),
+                        description=" ".join(rng.choices(WORDS, k=8)),
+                        type=rng.choice(TYPES),
+                        category=rng.choice(CATEGORIES),
+                        price=rng.randint(100, 100000),
+                        location=rng.choice(LOCATIONS),
+                        owner_id=rng.randint(1, users),
+                    )
+                    for _ in range(start, min(start + 5000, advertisements))
+                )
+                db.flush()
+            db.commit()
+            search_backend.rebuild(db)
+            geo_backend.rebuild(db)
+            rebuild_autocomplete(db)
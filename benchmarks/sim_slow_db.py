@@ -0,0 +1,107 @@
+# sim_slow_db.py
+# Имитация медленной БД под всплеском нагрузки. Каждый SQL-запрос занимает одно из --capacity
+# "ядер" БД на --service-ms, пул приложения - --pool-size соединений, клиентов - --clients.
+# Прогон без контроля допуска и с ним (app/admission.py): у принятых запросов с контролем
+# задержка ограничена, лишние получают быстрый 503 вместо таймаута пула (500).
+#
+#   python benchmarks/sim_slow_db.py --clients 200 --duration 10
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+
+import httpx
+from sqlalchemy import event
+
+from bench_routes import percentile
+from harness import Harness
+from app.admission import AdaptiveLimiter, SharedBudget, admission
+from config import settings
+
+
+def slow_database(engine, capacity: int, service_time: float) -> None:
+    cores = threading.BoundedSemaphore(capacity)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _occupy_core(conn, cursor, statement, parameters, context, executemany):
+        with cores:
+            time.sleep(service_time)
+
+
+# Общий бюджет классов - как в приложении, размер пула (здесь --pool-size)
+def reset_admission(enabled: bool, pool_size: int) -> None:
+    admission.enabled = enabled
+    admission.budget = SharedBudget(pool_size)
+    for name, limiter in list(admission.limiters.items()):
+        admission.limiters[name] = AdaptiveLimiter(
+            name, settings.ADMISSION_INITIAL_LIMIT, settings.ADMISSION_MIN_LIMIT,
+            settings.ADMISSION_MAX_LIMIT, settings.ADMISSION_LATENCY_TOLERANCE, budget=admission.budget,
+        )
+
+
+async def load(app, clients: int, duration: float, path: str) -> list:
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    results = []
+    deadline = time.perf_counter() + duration
+
+    async def client_loop(client):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.get(path)
+            results.append((response.status_code, time.perf_counter() - started))
+            if response.status_code == 503:
+                # Клиент уважает Retry-After не полностью - иначе всплеск просто растянется
+                await asyncio.sleep(0.05)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await asyncio.gather(*(client_loop(client) for _ in range(clients)))
+    return results
+
+
+def summarize(results: list, duration: float) -> dict:
+    admitted = [latency for status, latency in results if status == 200]
+    rejected = [latency for status, latency in results if status == 503]
+    return {
+        "requests": len(results),
+        "ok": len(admitted),
+        "ok_per_sec": len(admitted) / duration,
+        "rejected_503": len(rejected),
+        "errors": sum(1 for status, _ in results if status not in (200, 503)),
+        "ok_p50_ms": percentile(admitted, 0.50) * 1000,
+        "ok_p99_ms": percentile(admitted, 0.99) * 1000,
+        "ok_max_ms": max(admitted, default=0.0) * 1000,
+        "rejected_p99_ms": percentile(rejected, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--pool-timeout", type=float, default=2.0)
+    parser.add_argument("--capacity", type=int, default=4)
+    parser.add_argument("--service-ms", type=float, default=5.0)
+    parser.add_argument("--ads", type=int, default=2000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "slow.db")
+    harness = Harness(f"sqlite:///{path}", pool_size=args.pool_size, pool_timeout=args.pool_timeout)
+    harness.seed(50, args.ads)
+    slow_database(harness.engine, args.capacity, args.service_ms / 1000)
+
+    report = {}
+    for mode, enabled in (("without_admission", False), ("with_admission", True)):
+        reset_admission(enabled, args.pool_size)
+        results = asyncio.run(load(harness.app, args.clients, args.duration, "/advertisements/?limit=20"))
+        report[mode] = summarize(results, args.duration)
+        if enabled:
+            report[mode]["final_limits"] = admission.stats()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
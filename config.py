@@ -11,6 +11,54 @@ class Settings:
     POSTGRES_HOST: str
     POSTGRES_PORT: int
     POSTGRES_DB: str
+    SEARCH_BACKEND: str
+    DB_MODE: str
+    CACHE_BACKEND: str
+    CACHE_URL: str
+    AUTH_CACHE_TTL: float
+    AUTH_CACHE_SIZE: int
+    HASH_WORKERS: int
+    HASH_MAX_PENDING: int
+    BCRYPT_ROUNDS: int
+    READ_CACHE_ENABLED: bool
+    READ_CACHE_SIZE: int
+    READ_CACHE_TTL: float
+    APP_ENV: str
+    SLOW_QUERY_MS: float
+    N_PLUS_ONE_THRESHOLD: int
+    DB_POOL_SIZE: int
+    DB_MAX_OVERFLOW: int
+    DB_POOL_TIMEOUT: float
+    DB_POOL_RECYCLE: int
+    DB_POOL_PRE_PING: bool
+    POSTGRES_REPLICA_HOSTS: list
+    POSTGRES_REPLICA_URLS: list
+    POSTGRES_REPLICA_URLSA: list
+    READ_YOUR_WRITES_SECONDS: float
+    ADMISSION_ENABLED: bool
+    ADMISSION_INITIAL_LIMIT: float
+    ADMISSION_TOTAL_LIMIT: int
+    ADMISSION_MIN_LIMIT: float
+    ADMISSION_MAX_LIMIT: float
+    ADMISSION_LATENCY_TOLERANCE: float
+    WRITE_BATCHING: bool
+    WRITE_BATCH_WINDOW_MS: float
+    WRITE_BATCH_MAX: int
+    EVENTS_BACKEND: str
+    EVENTS_BUFFER_SIZE: int
+    STATS_RECONCILE_SECONDS: float
+    COMPRESSION_MIN_SIZE: int
+    COMPRESSION_GZIP_LEVEL: int
+    COMPRESSION_BROTLI_QUALITY: int
+    AUTOCOMPLETE_MAX_TERMS: int
+    PARTITION_MONTHS_AHEAD: int
+    PARTITION_RETENTION_MONTHS: int
+    PARTITION_EXPIRED_ACTION: str
+    PARTITION_ARCHIVE_DIR: str
+    PARTITION_MAINTENANCE_SECONDS: float
+    GAZETTEER_PATH: str
+    GEO_BACKEND: str
+    GEO_CELL_DEGREES: float
 
 load_dotenv()
 
@@ -20,6 +68,85 @@ settings.POSTGRES_PASSWORD = os.environ.get('POSTGRES_PASSWORD')
 settings.POSTGRES_USER = os.environ.get('POSTGRES_USER')
 settings.POSTGRES_DB = os.environ.get('POSTGRES_DB')
 settings.POSTGRES_HOST = os.environ.get('POSTGRES_HOST')
+# postgres - полнотекстовый индекс в БД, memory - инвертированный индекс в памяти процесса
+settings.SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'postgres')
+# async - маршруты на AsyncSession/asyncpg, sync - прежний стек на psycopg2 в пуле потоков
+settings.DB_MODE = os.environ.get('DB_MODE', 'async')
+# memory - кэш в памяти процесса, redis - общий для всех воркеров (нужен пакет redis)
+settings.CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+settings.CACHE_URL = os.environ.get('CACHE_URL', 'redis://localhost:6379/0')
+settings.AUTH_CACHE_TTL = float(os.environ.get('AUTH_CACHE_TTL', 60))
+settings.AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', 10000))
+# Пул процессов для bcrypt: число процессов, предел очереди и стоимость хэша
+settings.HASH_WORKERS = int(os.environ.get('HASH_WORKERS', 2))
+settings.HASH_MAX_PENDING = int(os.environ.get('HASH_MAX_PENDING', 32))
+settings.BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+# Кэш чтения обьявлений и пользователей (бэкенд тот же, что CACHE_BACKEND)
+settings.READ_CACHE_ENABLED = os.environ.get('READ_CACHE_ENABLED', 'true').lower() == 'true'
+settings.READ_CACHE_SIZE = int(os.environ.get('READ_CACHE_SIZE', 50000))
+settings.READ_CACHE_TTL = float(os.environ.get('READ_CACHE_TTL', 300))
+# dev - в лог пишутся медленные запросы и повторы одного запроса (N+1) вместе с SQL
+settings.APP_ENV = os.environ.get('APP_ENV', 'prod')
+settings.SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+settings.N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+# Пул соединений на каждый движок (основной и каждая реплика, sync и async отдельно)
+settings.DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+settings.DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+settings.DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+settings.DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+settings.DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+# Реплики для чтения через запятую: host или host:port, пользователь и база как у основной
+settings.POSTGRES_REPLICA_HOSTS = [host.strip() for host in os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(',') if host.strip()]
+# После записи клиент читает с основной базы столько секунд (обходит отставание реплик)
+settings.READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', 5))
+# Адаптивный предел одновременных запросов на класс маршрутов (auth/reads/writes/search) в воркере;
+# начальный предел по умолчанию - сколько соединений может выдать пул
+settings.ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+settings.ADMISSION_INITIAL_LIMIT = float(os.environ.get('ADMISSION_INITIAL_LIMIT', settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW))
+# Общий для всех классов предел одновременных запросов воркера - по умолчанию тоже размер пула:
+# классы вместе не принимают больше, чем пул выдаст соединений. 0 - без общего предела
+settings.ADMISSION_TOTAL_LIMIT = int(os.environ.get('ADMISSION_TOTAL_LIMIT', settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW))
+settings.ADMISSION_MIN_LIMIT = float(os.environ.get('ADMISSION_MIN_LIMIT', 2))
+settings.ADMISSION_MAX_LIMIT = float(os.environ.get('ADMISSION_MAX_LIMIT', 200))
+settings.ADMISSION_LATENCY_TOLERANCE = float(os.environ.get('ADMISSION_LATENCY_TOLERANCE', 2.0))
+# Групповой коммит создания/изменения/удаления обьявлений: пачка пишется раз в окно или по заполнении
+settings.WRITE_BATCHING = os.environ.get('WRITE_BATCHING', 'false').lower() == 'true'
+settings.WRITE_BATCH_WINDOW_MS = float(os.environ.get('WRITE_BATCH_WINDOW_MS', 5))
+settings.WRITE_BATCH_MAX = int(os.environ.get('WRITE_BATCH_MAX', 100))
+
+# Лента изменений: postgres - LISTEN/NOTIFY между процессами, memory - только внутри процесса
+settings.EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND', 'postgres')
+# Сколько последних событий хранится для возобновления по Last-Event-ID
+settings.EVENTS_BUFFER_SIZE = int(os.environ.get('EVENTS_BUFFER_SIZE', 10000))
+
+# Период сверки таблицы статистики с обьявлениями; 0 - фоновая сверка выключена
+settings.STATS_RECONCILE_SECONDS = float(os.environ.get('STATS_RECONCILE_SECONDS', 300))
+
+# Сжатие ответов: меньше порога (байт) не сжимаем - заголовки и CPU дороже выигрыша
+settings.COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+settings.COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+# Уровни brotli выше 5 слишком медленные для сжатия на лету
+settings.COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))
+
+# Предел размера индекса подсказок (терминов); ~100 байт на термин
+settings.AUTOCOMPLETE_MAX_TERMS = int(os.environ.get('AUTOCOMPLETE_MAX_TERMS', 200000))
+
+# Обслуживание партиций advertisements (python -m app.partitions): сколько месяцев создавать
+# заранее, сколько хранить (0 - без срока) и что делать с устаревшими: detach/archive/drop
+settings.PARTITION_MONTHS_AHEAD = int(os.environ.get('PARTITION_MONTHS_AHEAD', 3))
+settings.PARTITION_RETENTION_MONTHS = int(os.environ.get('PARTITION_RETENTION_MONTHS', 0))
+settings.PARTITION_EXPIRED_ACTION = os.environ.get('PARTITION_EXPIRED_ACTION', 'archive')
+settings.PARTITION_ARCHIVE_DIR = os.environ.get('PARTITION_ARCHIVE_DIR', 'archive')
+# То же обслуживание в фоне приложения: при старте и затем с этим периодом. По умолчанию 0 -
+# выключено, партиции создает python -m app.partitions при старте контейнера и из cron
+settings.PARTITION_MAINTENANCE_SECONDS = float(os.environ.get('PARTITION_MAINTENANCE_SECONDS', 0))
+
+# Справочник населенных пунктов для геокодирования location (CSV: name,latitude,longitude,aliases)
+settings.GAZETTEER_PATH = os.environ.get('GAZETTEER_PATH', 'data/gazetteer.csv')
+# Поиск ближайших: postgres - индекс (latitude, longitude) в БД, memory - сетка в памяти процесса
+settings.GEO_BACKEND = os.environ.get('GEO_BACKEND', 'postgres')
+# Размер ячейки сетки в градусах (0.5 - около 55 км по широте)
+settings.GEO_CELL_DEGREES = float(os.environ.get('GEO_CELL_DEGREES', 0.5))
 
 settings.POSTGRES_DATABASE_URLS = f"postgresql:" \
                                  f"//{settings.POSTGRES_USER}:" \
@@ -33,4 +160,10 @@ settings.POSTGRES_DATABASE_URLA = f"postgresql+asyncpg:" \
                                  f"{settings.POSTGRES_PASSWORD}" \
                                  f"@{settings.POSTGRES_HOST}:" \
                                  f"{settings.POSTGRES_PORT}" \
-                                 f"/{settings.POSTGRES_DB}"
\ No newline at end of file
+                                 f"/{settings.POSTGRES_DB}"
+
+settings.POSTGRES_REPLICA_URLS = [
+    f"postgresql://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{host}/{settings.POSTGRES_DB}"
+    for host in (h if ":" in h else f"{h}:{settings.POSTGRES_PORT}" for h in settings.POSTGRES_REPLICA_HOSTS)
+]
+settings.POSTGRES_REPLICA_URLSA = [url.replace("postgresql:", "postgresql+asyncpg:", 1) for url in settings.POSTGRES_REPLICA_URLS]
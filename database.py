@@ -1,7 +1,14 @@
+import itertools
+import time
+
+from fastapi import Request, Response
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
+from config import settings
+from app.instrumentation import InstrumentedAsyncQueuePool, InstrumentedQueuePool, instrument_engine, register_pool
 import os
 
 # Загрузка переменных окружения из файла .env
@@ -21,15 +28,127 @@ DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST
 if DATABASE_URL is None:
     raise ValueError("DATABASE_URL is not set in the .env file.")
 
-engine = create_engine(DATABASE_URL)
+
+def _pool_options(name: str) -> dict:
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        # Имя пула - метка в метриках насыщенности (см. app/instrumentation.py)
+        "pool_logging_name": name,
+    }
+
+
+# Единственное место, где создаются движки: настройки пула берутся из config.Settings
+def create_db_engine(url: str, name: str):
+    db_engine = create_engine(url, poolclass=InstrumentedQueuePool, **_pool_options(name))
+    instrument_engine(db_engine)
+    register_pool(name, db_engine)
+    return db_engine
+
+
+def create_async_db_engine(url: str, name: str):
+    db_engine = create_async_engine(url, poolclass=InstrumentedAsyncQueuePool, **_pool_options(name))
+    instrument_engine(db_engine.sync_engine)
+    register_pool(name, db_engine.sync_engine)
+    return db_engine
+
+
+engine = create_db_engine(DATABASE_URL, "primary")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронный движок на asyncpg (URL собирается в config.py)
+# expire_on_commit=False: после коммита атрибуты нельзя лениво подгрузить в async-режиме
+async_engine = create_async_db_engine(settings.POSTGRES_DATABASE_URLA, "primary_async")
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+# Реплики для чтения; без POSTGRES_REPLICA_HOSTS чтение идет с основной базы
+replica_engines = [
+    create_db_engine(url, f"replica{i}") for i, url in enumerate(settings.POSTGRES_REPLICA_URLS)
+]
+async_replica_engines = [
+    create_async_db_engine(url, f"replica{i}_async") for i, url in enumerate(settings.POSTGRES_REPLICA_URLSA)
+]
+_read_sessionmakers = itertools.cycle([
+    sessionmaker(autocommit=False, autoflush=False, bind=replica) for replica in replica_engines
+] or [SessionLocal])
+_async_read_sessionmakers = itertools.cycle([
+    async_sessionmaker(bind=replica, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    for replica in async_replica_engines
+] or [AsyncSessionLocal])
+
 Base = declarative_base()
 
-# Функция для получения базы данных
-def get_db():
+
+# Сессия только для чтения: реплики по кругу
+def read_session():
+    return next(_read_sessionmakers)()
+
+
+def async_read_session():
+    return next(_async_read_sessionmakers)()
+
+
+# Read-your-writes: после записи клиент получает куку, и до ее истечения
+# его чтения идут на основную базу, а не на отстающую реплику
+STICKY_COOKIE = "db_primary_until"
+
+
+def _stick_to_primary(response: Response) -> None:
+    if replica_engines or async_replica_engines:
+        until = time.time() + settings.READ_YOUR_WRITES_SECONDS
+        response.set_cookie(STICKY_COOKIE, f"{until:.3f}", max_age=int(settings.READ_YOUR_WRITES_SECONDS) + 1,
+                            httponly=True, samesite="lax")
+
+
+def _is_sticky(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+# Функция для получения базы данных (основная база: запись и чтение сразу после записи)
+def get_db(response: Response):
+    _stick_to_primary(response)
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Сессия для GET-маршрутов: реплика, если клиент недавно ничего не записывал
+def get_read_db(request: Request):
+    db = SessionLocal() if _is_sticky(request) else read_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Основная база для чтения без куки read-your-writes: промахи кэша чтения (app/read_cache.py)
+def get_primary_read_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Асинхронная версия get_db
+async def get_async_db(response: Response):
+    _stick_to_primary(response)
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Асинхронная версия get_read_db
+async def get_async_read_db(request: Request):
+    async with (AsyncSessionLocal() if _is_sticky(request) else async_read_session()) as db:
+        yield db
+
+# Асинхронная версия get_primary_read_db
+async def get_async_primary_read_db():
+    async with AsyncSessionLocal() as db:
+        yield db
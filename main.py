@@ -1,7 +1,7 @@
 from fastapi import FastAPI, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from models.models import User, Advertisement
-from database import SessionLocal, get_db
+from database import SessionLocal, async_engine, async_replica_engines
 from pydantic import BaseModel
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
@@ -9,7 +9,23 @@ from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional, List
 from fastapi import FastAPI
-from app.routers import router
+from app.routers import router as sync_router
+from app.async_routers import router as async_router
+from app.ingest import router as ingest_router
+from app.export import router as export_router
+from app.events import broker as events_broker, router as events_router
+from app.partitions import partition_maintainer
+from app.stats import stats_reconciler
+from app.autocomplete import rebuild_autocomplete, router as autocomplete_router
+from config import settings
+from app.search import search_backend
+from app.geo import geo_backend
+from app.hashing import password_hasher
+from app.admission import AdmissionMiddleware
+from app.compression import CompressionMiddleware
+from app.instrumentation import InstrumentationMiddleware, InstrumentedRoute
+from app.metrics import registry
+from fastapi.responses import PlainTextResponse
 
 app = FastAPI(
     title="Web-сервис доски обьявлений",
@@ -20,7 +36,85 @@ app = FastAPI(
     redoc_url=None
 )
 
-app.include_router(router)
+# Сжатие gzip/br - внутренний слой, его время попадает в метрики запроса
+app.add_middleware(CompressionMiddleware)
+# Число и время SQL-запросов, ожидание пула и сериализация по каждому маршруту
+app.add_middleware(InstrumentationMiddleware)
+app.router.route_class = InstrumentedRoute
+# Внешний слой: лишние запросы отклоняются с 503 до маршрутизации и очереди за пулом
+app.add_middleware(AdmissionMiddleware)
+
+# DB_MODE=sync оставляет прежние синхронные маршруты как запасной вариант
+app.include_router(async_router if settings.DB_MODE == "async" else sync_router)
+app.include_router(ingest_router)
+app.include_router(export_router)
+app.include_router(events_router)
+app.include_router(autocomplete_router)
+
+
+#МЕТРИКИ В ТЕКСТОВОМ ФОРМАТЕ PROMETHEUS
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.on_event("startup")
+def start_events_broker():
+    # Слушатель LISTEN - один на процесс воркера, запускается после форка. Брокер на Postgres
+    # сам строит индексы в памяти сразу после LISTEN, до приема запросов
+    events_broker.start()
+
+
+@app.on_event("startup")
+def build_search_index():
+    if events_broker.rebuilds_on_listen:
+        return
+    # Для бэкендов в памяти (поиск, сетка ближайших) индексы строятся из БД при старте процесса
+    db = SessionLocal()
+    try:
+        search_backend.rebuild(db)
+        geo_backend.rebuild(db)
+        # Индекс подсказок живет только в памяти и строится при старте в любом режиме
+        rebuild_autocomplete(db)
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+def stop_events_broker():
+    events_broker.stop()
+
+
+@app.on_event("startup")
+def start_stats_reconciler():
+    stats_reconciler.start()
+
+
+@app.on_event("shutdown")
+def stop_stats_reconciler():
+    stats_reconciler.stop()
+
+
+@app.on_event("startup")
+def start_partition_maintenance():
+    # Только с PARTITION_MAINTENANCE_SECONDS > 0; иначе партиции создает python -m app.partitions
+    partition_maintainer.start()
+
+
+@app.on_event("shutdown")
+def stop_partition_maintenance():
+    partition_maintainer.stop()
+
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    for db_engine in (async_engine, *async_replica_engines):
+        await db_engine.dispose()
+
+
+@app.on_event("shutdown")
+def shutdown_password_hasher():
+    password_hasher.shutdown()
 
 if __name__ == "__main__":
     import uvicorn
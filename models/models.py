@@ -1,5 +1,5 @@
 # models/models.py
-from sqlalchemy import Column, Integer, String, DateTime, func
+from sqlalchemy import Column, Float, ForeignKey, Integer, Numeric, String, DateTime, Index, func
 from sqlalchemy.ext.declarative import declarative_base
 
 
@@ -13,6 +13,8 @@ class User(Base):
     hashed_password = Column(String)
     email = Column(String, unique=True, index=True)
     created_at = Column(DateTime, server_default=func.now())
+    # Счетчик обьявлений ведется при создании/удалении (app/owner_feed.py), без COUNT(*)
+    advertisement_count = Column(Integer, nullable=False, default=0, server_default="0")
 
 class Advertisement(Base):
     __tablename__ = "advertisements"
@@ -20,9 +22,47 @@ class Advertisement(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     description = Column(String)
-    owner_id = Column(Integer)
+    owner_id = Column(Integer, ForeignKey("users.id", name="fk_advertisements_owner_id_users"))
     type = Column(String)  # Новое поле типа
     category = Column(String)  # Новое поле категории
-    price = Column(String)  # Новое поле цены
+    price = Column(Numeric(12, 2))  # Новое поле цены
+    # Строка цены, которую не удалось разобрать при переводе в число (b41f6d2c9e07); NULL - цена разобрана
+    price_raw = Column(String)
     location = Column(String)  # Новое поле локации
-    created_at = Column(DateTime, server_default=func.now())
\ No newline at end of file
+    # Координаты location по справочнику населенных пунктов (app/gazetteer.py); NULL - пункт не найден
+    latitude = Column(Float)
+    longitude = Column(Float)
+    # NOT NULL - на created_at держится keyset-курсор (app/pagination.py)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    # Время последнего изменения - Last-Modified и ETag для условных GET (app/conditional.py)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # Индекс под keyset-пагинацию списка обьявлений
+        Index("ix_advertisements_created_at_id", "created_at", "id"),
+        # Лента обьявлений владельца: равенство по owner_id + keyset по (created_at, id)
+        Index("ix_advertisements_owner_id_created_at_id", "owner_id", "created_at", "id"),
+        # Индексы под фасетный фильтр: равенство по измерениям + диапазон/сортировка по цене
+        Index("ix_advertisements_category_price", "category", "price"),
+        Index("ix_advertisements_category_location_price", "category", "location", "price"),
+        Index("ix_advertisements_location_price", "location", "price"),
+        Index("ix_advertisements_type_category", "type", "category"),
+        # Поиск ближайших: диапазон по широте внутри описанного прямоугольника (app/geo.py)
+        Index("ix_advertisements_latitude_longitude", "latitude", "longitude"),
+    )
+
+
+# Агрегаты по группам (категория, тип, локация), ведутся при записи обьявлений (app/stats.py).
+# Отсутствующее значение измерения хранится как '' - ключ группы должен быть NOT NULL для upsert
+class AdvertisementStats(Base):
+    __tablename__ = "advertisement_stats"
+
+    category = Column(String, primary_key=True)
+    type = Column(String, primary_key=True)
+    location = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Цена есть не у всех обьявлений: среднее = price_sum / price_count
+    price_count = Column(Integer, nullable=False, default=0, server_default="0")
+    price_sum = Column(Numeric(20, 2), nullable=False, default=0, server_default="0")
+    price_min = Column(Numeric(12, 2))
+    price_max = Column(Numeric(12, 2))